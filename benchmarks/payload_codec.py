@@ -0,0 +1,81 @@
+"""
+Сравнение кодеков payload записи: JSON и компактный бинарный формат.
+
+Запуск из корня репозитория:
+    python -m benchmarks.payload_codec [--entries N] [--rounds N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from src.core.vault.encryption_service import (
+    AESGCMEncryptionService,
+    BinaryPayloadCodec,
+    JsonPayloadCodec,
+)
+
+def build_payloads(count: int) -> list[dict]:
+    service = AESGCMEncryptionService()
+    payloads = []
+
+    for i in range(count):
+        payloads.append(
+            service._build_payload(
+                {
+                    "title": f"Service {i}",
+                    "username": f"user{i}@example.com",
+                    "password": f"Str0ng-Passw0rd-{i:06d}!",
+                    "url": f"https://service{i}.example.com/login",
+                    "notes": "" if i % 4 else f"recovery codes: {i:08d} {i * 7:08d}",
+                    "category": ("Work", "Personal", "Finance")[i % 3],
+                    "tags": ["imported", f"group{i % 10}"],
+                    "created_at": "2024-05-01T12:00:00+00:00",
+                }
+            )
+        )
+
+    return payloads
+
+def run(codec, payloads: list[dict], rounds: int) -> tuple[float, float, int]:
+    encoded = [codec.encode(payload) for payload in payloads]
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for payload in payloads:
+            codec.encode(payload)
+    encode_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for data in encoded:
+            codec.decode(data)
+    decode_time = time.perf_counter() - started
+
+    return encode_time, decode_time, sum(len(data) for data in encoded)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = build_payloads(args.entries)
+    operations = args.entries * args.rounds
+
+    print(f"{args.entries} entries x {args.rounds} rounds")
+    print(f"{'codec':<8} {'encode/s':>12} {'decode/s':>12} {'avg size':>10}")
+
+    for name, codec in (("json", JsonPayloadCodec()), ("binary", BinaryPayloadCodec())):
+        encode_time, decode_time, total_size = run(codec, payloads, args.rounds)
+
+        print(
+            f"{name:<8} "
+            f"{operations / encode_time:>12,.0f} "
+            f"{operations / decode_time:>12,.0f} "
+            f"{total_size / args.entries:>10.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
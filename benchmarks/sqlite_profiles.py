@@ -0,0 +1,123 @@
+"""
+Скорость записи и чтения хранилища с профилями соединения SQLite
+(durable, balanced, bulk-import).
+
+Для каждого профиля создаётся хранилище из N записей: пакетная запись
+порциями по --batch записей, затем отдельные записи с commit на каждую,
+полное чтение списка (заголовки) и случайные get_entry(). Профиль
+bulk-import пишет внутри Database.bulk_import(), время checkpoint
+включено в пакетную запись.
+
+Запуск из корня репозитория:
+    python -m benchmarks.sqlite_profiles [--entries N] [--batch N] [--single N] [--reads N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from src.core.crypto.key_derivation import Argon2Settings
+from src.core.key_manager import KeyManager
+from src.core.vault.entry_manager import EntryManager
+from src.database.db import BULK_IMPORT_PROFILE, CONNECTION_PROFILES, Database
+
+PASSWORD = "BenchmarkPassword123!"
+
+def build_entries(start: int, count: int) -> list[dict]:
+    return [
+        {
+            "title": f"Service {i}",
+            "username": f"user{i}@example.com",
+            "password": f"Str0ng-Passw0rd-{i:06d}!",
+            "url": f"https://service{i}.example.com/login",
+            "notes": "" if i % 4 else f"recovery codes: {i:08d} {i * 7:08d}",
+            "tags": ["imported", f"group{i % 10}"],
+        }
+        for i in range(start, start + count)
+    ]
+
+def run(path: Path, profile: str, args: argparse.Namespace) -> dict[str, float]:
+    db = Database(path, profile=profile)
+    db.connect()
+
+    # разблокировка не измеряется: дешёвые параметры KDF
+    key_manager = KeyManager(argon2_settings=Argon2Settings(time_cost=1, memory_cost=8192))
+    key_manager.unlock_with_password(db, PASSWORD)
+    entry_manager = EntryManager(db=db, key_manager=key_manager)
+
+    bulk = db.bulk_import() if profile == BULK_IMPORT_PROFILE.name else nullcontext()
+
+    started = time.perf_counter()
+    with bulk:
+        for start in range(0, args.entries, args.batch):
+            entry_manager.create_entries(
+                build_entries(start, min(args.batch, args.entries - start))
+            )
+    batch_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for entry in build_entries(args.entries, args.single):
+        entry_manager.create_entry(entry)
+    single_time = time.perf_counter() - started
+
+    # кэш расшифрованных записей не должен влиять на чтение
+    entry_manager.entry_cache.clear()
+
+    started = time.perf_counter()
+    ids = [entry["id"] for entry in entry_manager.iter_entries_metadata()]
+    list_time = time.perf_counter() - started
+
+    sample = random.Random(0).sample(ids, min(args.reads, len(ids)))
+
+    started = time.perf_counter()
+    for entry_id in sample:
+        entry_manager.get_entry(entry_id)
+    get_time = time.perf_counter() - started
+
+    entry_manager.close()
+    key_manager.lock()
+    db.close()
+
+    return {
+        "batch": args.entries / batch_time,
+        "single": args.single / single_time,
+        "list": len(ids) / list_time,
+        "get": len(sample) / get_time,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--single", type=int, default=500)
+    parser.add_argument("--reads", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(
+        f"{args.entries} entries, batches of {args.batch}, "
+        f"{args.single} single writes, {args.reads} random reads"
+    )
+    print(
+        f"{'profile':<12} {'batch w/s':>12} {'single w/s':>12} "
+        f"{'list r/s':>12} {'get r/s':>12}"
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in CONNECTION_PROFILES:
+            result = run(Path(directory) / f"{name}.db", name, args)
+
+            print(
+                f"{name:<12} "
+                f"{result['batch']:>12,.0f} "
+                f"{result['single']:>12,.0f} "
+                f"{result['list']:>12,.0f} "
+                f"{result['get']:>12,.0f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Время разблокировки хранилища: старая схема (Argon2id + PBKDF2)
+последовательно и параллельно, и один проход Argon2id + HKDF.
+
+Запуск из корня репозитория:
+    python -m benchmarks.unlock [--rounds N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+
+from src.core.key_manager import KeyManager
+from src.database.db import Database
+
+PASSWORD = "BenchmarkPassword123!"
+
+def create_vault(path: Path, legacy: bool) -> Database:
+    db = Database(path)
+    db.connect()
+    key_manager = KeyManager()
+
+    if legacy:
+        db.execute(
+            "INSERT INTO key_store (key_type, salt, hash, params) VALUES (?, ?, ?, ?);",
+            (
+                "master",
+                key_manager.generate_salt(),
+                key_manager.create_auth_hash(PASSWORD).hash,
+                key_manager._build_key_params(),
+            ),
+        )
+
+    key_manager.unlock_with_password(db, PASSWORD)
+    return db
+
+def run(db: Database, key_manager: KeyManager, rounds: int) -> tuple[float, float]:
+    totals = []
+    kdf = []
+
+    for _ in range(rounds):
+        key_manager.unlock_with_password(db, PASSWORD)
+        totals.append(key_manager.last_unlock_timing.total_ms)
+        kdf.append(key_manager.last_unlock_timing.kdf_ms)
+        key_manager.lock()
+
+    return sum(totals) / rounds, sum(kdf) / rounds
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_db = create_vault(Path(directory) / "legacy.db", legacy=True)
+        hkdf_db = create_vault(Path(directory) / "hkdf.db", legacy=False)
+
+        cases = (
+            ("legacy sequential", legacy_db, KeyManager(concurrent_unlock=False)),
+            ("legacy concurrent", legacy_db, KeyManager(concurrent_unlock=True)),
+            ("argon2id+hkdf", hkdf_db, KeyManager()),
+        )
+
+        print(f"{args.rounds} unlocks per case")
+        print(f"{'case':<20} {'unlock ms':>10} {'kdf ms':>10}")
+
+        for name, db, key_manager in cases:
+            total_ms, kdf_ms = run(db, key_manager, args.rounds)
+            print(f"{name:<20} {total_ms:>10.1f} {kdf_ms:>10.1f}")
+
+        legacy_db.close()
+        hkdf_db.close()
+
+if __name__ == "__main__":
+    main()
@@ -13,17 +13,23 @@ class Environment(str, Enum):
 
 @dataclass(frozen=True)
 class EncryptionSettings:
-    scheme: str = "XOR_PLACEHOLDER"   # Sprint 1 placeholder
+    scheme: str = "auto"              # шифр из cipher_suites или "auto" (замер)
     kdf: str = "PLACEHOLDER_KDF"      # Sprint 1 placeholder
     kdf_params: dict | None = None    # future-ready
 
 
+@dataclass(frozen=True)
+class DatabaseSettings:
+    profile: str = "balanced"         # durable | balanced | bulk-import
+
+
 @dataclass(frozen=True)
 class AppConfig:
     env: Environment
     db_path: Path
     encryption: EncryptionSettings
     user_prefs: dict
+    database: DatabaseSettings = DatabaseSettings()
 
 
 class ConfigManager:
@@ -44,14 +50,24 @@ class ConfigManager:
         db_path = Path(os.getenv("CRYPTOSAFE_DB_PATH", str(default_db))).expanduser().resolve()
 
         enc = EncryptionSettings(
-            scheme=os.getenv("CRYPTOSAFE_ENC_SCHEME", "XOR_PLACEHOLDER"),
+            scheme=os.getenv("CRYPTOSAFE_ENC_SCHEME", "auto"),
             kdf=os.getenv("CRYPTOSAFE_KDF", "PLACEHOLDER_KDF"),
             kdf_params=None,
         )
 
+        database = DatabaseSettings(
+            profile=os.getenv("CRYPTOSAFE_DB_PROFILE", "balanced"),
+        )
+
         prefs = {
             "language": os.getenv("CRYPTOSAFE_LANG", "en"),
             "theme": os.getenv("CRYPTOSAFE_THEME", "system"),
         }
 
-        return AppConfig(env=self._env, db_path=db_path, encryption=enc, user_prefs=prefs)
\ No newline at end of file
+        return AppConfig(
+            env=self._env,
+            db_path=db_path,
+            encryption=enc,
+            user_prefs=prefs,
+            database=database,
+        )
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Реестр AEAD-шифров для данных хранилища.
+
+Каждый шифр получает постоянный id (1 байт), который записывается
+в заголовок шифртекста: записи, зашифрованные разными шифрами, могут
+лежать в одном хранилище. id нельзя менять или переиспользовать.
+
+Режим AUTO_CIPHER_SUITE выбирает самый быстрый шифр на этой машине:
+без AES-NI ChaCha20-Poly1305 расшифровывает в разы быстрее AES-GCM.
+
+Запуск замера из командной строки:
+
+    python -m src.core.crypto.cipher_suites
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+AES_256_GCM = "AES-256-GCM"
+CHACHA20_POLY1305 = "CHACHA20-POLY1305"
+AES_256_GCM_SIV = "AES-256-GCM-SIV"
+
+AUTO_CIPHER_SUITE = "auto"
+DEFAULT_CIPHER_SUITE = AES_256_GCM
+
+BENCHMARK_PAYLOAD_SIZE = 64 * 1024
+BENCHMARK_ROUNDS = 32
+
+@dataclass(frozen=True)
+class CipherSuite:
+    suite_id: int
+    name: str
+    factory: Callable[[bytes], Any]
+    key_size: int = 32
+    nonce_size: int = 12
+    tag_size: int = 16
+
+    def create(self, key: bytes | memoryview) -> Any:
+        return self.factory(key)
+
+_SUITES_BY_NAME: dict[str, CipherSuite] = {}
+_SUITES_BY_ID: dict[int, CipherSuite] = {}
+
+def register_cipher_suite(suite: CipherSuite) -> None:
+    if not 0 < suite.suite_id < 256:
+        raise ValueError("Cipher suite id must fit in one byte.")
+
+    if suite.name == AUTO_CIPHER_SUITE:
+        raise ValueError("Cipher suite name is reserved.")
+
+    existing = _SUITES_BY_ID.get(suite.suite_id)
+
+    if existing is not None and existing.name != suite.name:
+        raise ValueError(f"Cipher suite id {suite.suite_id} is already registered.")
+
+    _SUITES_BY_NAME[suite.name] = suite
+    _SUITES_BY_ID[suite.suite_id] = suite
+
+def get_cipher_suite(name: str) -> CipherSuite:
+    suite = _SUITES_BY_NAME.get(name.upper())
+
+    if suite is None:
+        raise ValueError(f"Unknown cipher suite: {name}")
+
+    return suite
+
+def get_cipher_suite_by_id(suite_id: int) -> CipherSuite | None:
+    return _SUITES_BY_ID.get(suite_id)
+
+def available_cipher_suites() -> list[str]:
+    return [suite.name for suite in sorted(_SUITES_BY_ID.values(), key=lambda s: s.suite_id)]
+
+def benchmark_cipher_suites(
+        payload_size: int = BENCHMARK_PAYLOAD_SIZE,
+        rounds: int = BENCHMARK_ROUNDS,
+) -> dict[str, float]:
+    """Скорость расшифровки каждого шифра в МБ/с на payload_size байт."""
+
+    payload = os.urandom(payload_size)
+    results = {}
+
+    for name in available_cipher_suites():
+        suite = _SUITES_BY_NAME[name]
+        cipher = suite.create(os.urandom(suite.key_size))
+        nonce = os.urandom(suite.nonce_size)
+        sealed = cipher.encrypt(nonce, payload, None)
+
+        # первый вызов прогревает шифр и не учитывается
+        cipher.decrypt(nonce, sealed, None)
+
+        started = time.perf_counter()
+
+        for _ in range(rounds):
+            cipher.decrypt(nonce, sealed, None)
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        results[name] = payload_size * rounds / elapsed / 1_000_000
+
+    return results
+
+def select_cipher_suite(**kwargs: Any) -> str:
+    """Самый быстрый на этой машине шифр (по benchmark_cipher_suites)."""
+
+    results = benchmark_cipher_suites(**kwargs)
+    return max(results, key=results.get)
+
+def resolve_cipher_suite(name: str | None) -> str:
+    """Имя шифра из настроек: AUTO_CIPHER_SUITE заменяется результатом замера."""
+
+    if not name:
+        return DEFAULT_CIPHER_SUITE
+
+    if name.lower() == AUTO_CIPHER_SUITE:
+        return select_cipher_suite()
+
+    return get_cipher_suite(name).name
+
+def _gcm_siv_supported() -> bool:
+    # AES-GCM-SIV есть в cryptography >= 42 и требует поддержки в OpenSSL
+    try:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCMSIV
+
+        AESGCMSIV(bytes(32)).encrypt(bytes(12), b"", None)
+        return True
+    except Exception:
+        return False
+
+register_cipher_suite(CipherSuite(1, AES_256_GCM, AESGCM))
+register_cipher_suite(CipherSuite(2, CHACHA20_POLY1305, ChaCha20Poly1305))
+
+if _gcm_siv_supported():
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCMSIV
+
+    register_cipher_suite(CipherSuite(3, AES_256_GCM_SIV, AESGCMSIV))
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark AEAD cipher suites on this machine.")
+    parser.add_argument("--size-kib", type=int, default=BENCHMARK_PAYLOAD_SIZE // 1024)
+    parser.add_argument("--rounds", type=int, default=BENCHMARK_ROUNDS)
+    args = parser.parse_args(argv)
+
+    results = benchmark_cipher_suites(args.size_kib * 1024, args.rounds)
+
+    for name, speed in sorted(results.items(), key=lambda item: -item[1]):
+        print(f"{name:<20} {speed:>10.1f} MB/s")
+
+    print(f"auto -> {max(results, key=results.get)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Подбор параметров KDF под конкретную машину.
+
+Запуск из командной строки:
+
+    python -m src.core.crypto.kdf_calibration --target-ms 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from src.core.crypto.key_derivation import (
+    Argon2Settings,
+    KeyDerivationService,
+    PBKDF2Settings,
+)
+
+DEFAULT_TARGET_MS = 500
+
+# нижние границы не дают калибровке на слабой машине выбрать
+# параметры слабее рекомендуемого минимума
+MIN_ARGON2_MEMORY_KIB = 19 * 1024
+MAX_ARGON2_MEMORY_KIB = 1024 * 1024
+START_ARGON2_MEMORY_KIB = 64 * 1024
+MAX_ARGON2_TIME_COST = 10
+MAX_ARGON2_PARALLELISM = 8
+
+MIN_PBKDF2_ITERATIONS = 100_000
+MAX_PBKDF2_ITERATIONS = 10_000_000
+PBKDF2_SAMPLE_ITERATIONS = 20_000
+
+_CALIBRATION_PASSWORD = "kdf-calibration-password"
+
+@dataclass(frozen=True)
+class KdfProfile:
+    argon2: Argon2Settings
+    pbkdf2: PBKDF2Settings
+    target_ms: int
+    argon2_ms: float
+    pbkdf2_ms: float
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "KdfProfile":
+        try:
+            return cls(
+                argon2=Argon2Settings(**data["argon2"]),
+                pbkdf2=PBKDF2Settings(**data["pbkdf2"]),
+                target_ms=int(data["target_ms"]),
+                argon2_ms=float(data["argon2_ms"]),
+                pbkdf2_ms=float(data["pbkdf2_ms"]),
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            raise ValueError("Invalid KDF profile.") from exc
+
+class KdfCalibrator:
+    """
+    Замеряет Argon2id и PBKDF2 на текущей машине и выбирает самые
+    стойкие параметры, укладывающиеся в целевое время разблокировки.
+
+    Для Argon2id сначала подбирается объём памяти (удвоением от 64 MiB
+    или уменьшением вдвое, если машина не успевает), затем число
+    проходов. Параллелизм равен числу ядер, но не больше
+    MAX_ARGON2_PARALLELISM. Число итераций PBKDF2 масштабируется
+    линейно по одному замеру. Каждый KDF калибруется на целевое время
+    отдельно.
+    """
+
+    def __init__(
+            self,
+            target_ms: int = DEFAULT_TARGET_MS,
+            max_memory_kib: int = MAX_ARGON2_MEMORY_KIB,
+            cpu_count: int | None = None,
+    ) -> None:
+        if target_ms <= 0:
+            raise ValueError("Target time must be positive.")
+
+        self.target_ms = target_ms
+        self.max_memory_kib = max(MIN_ARGON2_MEMORY_KIB, max_memory_kib)
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self._salt = os.urandom(16)
+
+    def calibrate(self, include_pbkdf2: bool = True) -> KdfProfile:
+        # PBKDF2 нужен только хранилищам старой схемы; новое хранилище
+        # (argon2id_hkdf_sha256) делает один проход Argon2id
+        argon2, argon2_ms = self.calibrate_argon2()
+
+        if include_pbkdf2:
+            pbkdf2, pbkdf2_ms = self.calibrate_pbkdf2()
+        else:
+            pbkdf2, pbkdf2_ms = PBKDF2Settings(), 0.0
+
+        return KdfProfile(
+            argon2=argon2,
+            pbkdf2=pbkdf2,
+            target_ms=self.target_ms,
+            argon2_ms=argon2_ms,
+            pbkdf2_ms=pbkdf2_ms,
+        )
+
+    def calibrate_argon2(self) -> tuple[Argon2Settings, float]:
+        target = self.target_ms
+        parallelism = max(1, min(self.cpu_count, MAX_ARGON2_PARALLELISM))
+        memory = min(START_ARGON2_MEMORY_KIB, self.max_memory_kib)
+        time_cost = 1
+
+        elapsed = self._measure_argon2(Argon2Settings(time_cost, memory, parallelism))
+
+        while elapsed > target and memory > MIN_ARGON2_MEMORY_KIB:
+            memory = max(MIN_ARGON2_MEMORY_KIB, memory // 2)
+            elapsed = self._measure_argon2(Argon2Settings(time_cost, memory, parallelism))
+
+        while memory * 2 <= self.max_memory_kib and elapsed * 2 <= target:
+            memory *= 2
+            elapsed = self._measure_argon2(Argon2Settings(time_cost, memory, parallelism))
+
+        # время Argon2id растёт линейно с числом проходов
+        while (
+                time_cost < MAX_ARGON2_TIME_COST
+                and elapsed * (time_cost + 1) / time_cost <= target
+        ):
+            time_cost += 1
+            elapsed = self._measure_argon2(Argon2Settings(time_cost, memory, parallelism))
+
+        return Argon2Settings(time_cost, memory, parallelism), elapsed
+
+    def calibrate_pbkdf2(self) -> tuple[PBKDF2Settings, float]:
+        elapsed = self._measure_pbkdf2(PBKDF2_SAMPLE_ITERATIONS)
+        per_iteration = max(elapsed, 1e-6) / PBKDF2_SAMPLE_ITERATIONS
+
+        iterations = int(self.target_ms / per_iteration) // 1000 * 1000
+        iterations = min(MAX_PBKDF2_ITERATIONS, max(MIN_PBKDF2_ITERATIONS, iterations))
+
+        return PBKDF2Settings(iterations=iterations), iterations * per_iteration
+
+    def _measure_argon2(self, settings: Argon2Settings) -> float:
+        service = KeyDerivationService(argon2_settings=settings)
+
+        started = time.perf_counter()
+        service.derive_master_secret(_CALIBRATION_PASSWORD, self._salt)
+        return (time.perf_counter() - started) * 1000
+
+    def _measure_pbkdf2(self, iterations: int) -> float:
+        service = KeyDerivationService(
+            pbkdf2_settings=PBKDF2Settings(iterations=iterations),
+        )
+
+        started = time.perf_counter()
+        service.derive_encryption_key(_CALIBRATION_PASSWORD, self._salt)
+        return (time.perf_counter() - started) * 1000
+
+def calibrate_kdf(
+        target_ms: int = DEFAULT_TARGET_MS,
+        include_pbkdf2: bool = True,
+        **kwargs: Any,
+) -> KdfProfile:
+    return KdfCalibrator(target_ms=target_ms, **kwargs).calibrate(include_pbkdf2)
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Calibrate KDF parameters for this machine.")
+    parser.add_argument("--target-ms", type=int, default=DEFAULT_TARGET_MS)
+    parser.add_argument("--max-memory-mib", type=int, default=MAX_ARGON2_MEMORY_KIB // 1024)
+    parser.add_argument("--output", help="write the profile as JSON to this file")
+    args = parser.parse_args(argv)
+
+    profile = calibrate_kdf(
+        target_ms=args.target_ms,
+        max_memory_kib=args.max_memory_mib * 1024,
+    )
+    text = json.dumps(profile.to_dict(), indent=2)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ import re
 from dataclasses import dataclass
 from argon2 import PasswordHasher, Type
 from argon2.exceptions import VerifyMismatchError, VerificationError, InvalidHashError
+from argon2.low_level import hash_secret_raw
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from hashlib import pbkdf2_hmac
 
 # Password Policy
@@ -100,6 +103,31 @@ class PBKDF2Settings:
 
 # Key Derivation
 
+# Метки HKDF для разделения общего секрета Argon2id на независимые ключи.
+AUTH_KEY_INFO = b"vault-master-auth-verifier"
+ENCRYPTION_KEY_INFO = b"vault-master-key-encryption-key"
+MASTER_KEY_LEN = 32
+
+SUBKEY_LEN = 32
+
+@dataclass(frozen=True)
+class MasterKeys:
+    auth_key: bytes
+    encryption_key: bytes
+
+def derive_subkey(master_key: bytes, purpose: str, length: int = SUBKEY_LEN) -> bytes:
+    # именованный подключ: метка назначения используется как info HKDF,
+    # поэтому ключи разных назначений независимы
+    if not purpose:
+        raise ValueError("Key purpose must not be empty.")
+
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=length,
+        salt=None,
+        info=purpose.encode("utf-8"),
+    ).derive(master_key)
+
 class KeyDerivationService:
 
     def __init__(
@@ -137,15 +165,69 @@ class KeyDerivationService:
         length = length or self.pbkdf2_settings.salt_len
         return os.urandom(length)
 
-    def derive_encryption_key(self, password: str, salt: bytes) -> bytes:
+    def derive_encryption_key(
+            self,
+            password: str,
+            salt: bytes,
+            settings: PBKDF2Settings | None = None,
+    ) -> bytes:
+        settings = settings or self.pbkdf2_settings
+
         return pbkdf2_hmac(
             "sha256",
             password.encode("utf-8"),
             salt,
-            self.pbkdf2_settings.iterations,
-            dklen=self.pbkdf2_settings.key_len,
+            settings.iterations,
+            dklen=settings.key_len,
+        )
+
+    # Argon2id + HKDF (один проход KDF на разблокировку)
+
+    def derive_master_secret(
+            self,
+            password: str,
+            salt: bytes,
+            settings: Argon2Settings | None = None,
+    ) -> bytes:
+        settings = settings or self.argon2_settings
+
+        return hash_secret_raw(
+            secret=password.encode("utf-8"),
+            salt=salt,
+            time_cost=settings.time_cost,
+            memory_cost=settings.memory_cost,
+            parallelism=settings.parallelism,
+            hash_len=settings.hash_len,
+            type=Type.ID,
         )
 
+    def split_master_secret(self, master_secret: bytes) -> MasterKeys:
+        return MasterKeys(
+            auth_key=self._hkdf(master_secret, AUTH_KEY_INFO),
+            encryption_key=self._hkdf(master_secret, ENCRYPTION_KEY_INFO),
+        )
+
+    def derive_master_keys(
+            self,
+            password: str,
+            salt: bytes,
+            settings: Argon2Settings | None = None,
+    ) -> MasterKeys:
+        return self.split_master_secret(
+            self.derive_master_secret(password, salt, settings)
+        )
+
+    def derive_subkey(self, master_key: bytes, purpose: str) -> bytes:
+        return derive_subkey(master_key, purpose)
+
+    def _hkdf(self, secret: bytes, info: bytes) -> bytes:
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=MASTER_KEY_LEN,
+            salt=None,
+            info=info,
+        ).derive(secret)
+
 # UI Helper
 
 def get_password_rule_status(password: str, policy: PasswordPolicy | None = None) -> dict[str, bool]:
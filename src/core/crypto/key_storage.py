@@ -1,118 +1,214 @@
 from __future__ import annotations
 
-import ctypes
-import os
-import sys
+import threading
 import time
+from typing import Callable
+
+from src.core.crypto.secure_arena import ArenaSlot, ArenaStats, SecureArena
 
 class KeyStorage:
     # Best-effort protected memory
-    # ключ хранится в bytearray, чтобы его можно было затереть
-    # на Unix выполняется попытка mlock()
-    # на Windows отмечается best-effort режим
-    # если системная защита недоступна, используется безопасный fallback
-
-    def __init__(self, ttl_seconds: int = 3600) -> None:
-        self._cached_key: bytearray | None = None
+    # ключ и подключи хранятся в слотах SecureArena: область закрепляется
+    # в RAM и исключается из core dump один раз при первом сохранении,
+    # слоты затираются нулями при очистке
+    # если системная защита недоступна, арена работает без закрепления
+    # подключи (save_subkey) живут не дольше основного ключа
+    # одна блокировка на одалживание, очистку и истечение срока: пока
+    # открыт блок borrow(), clear() из другого потока ждёт его завершения
+    # и не затирает ключ посреди создания шифра
+
+    def __init__(self, ttl_seconds: int = 3600, arena: SecureArena | None = None) -> None:
+        self._arena = arena
+        self._key_slot: ArenaSlot | None = None
+        self._subkeys: dict[str, ArenaSlot] = {}
         self._created_at: float | None = None
         self._last_access_at: float | None = None
         self._ttl_seconds = ttl_seconds
-        self._memory_protected: bool = False
+        self._clear_listeners: list[Callable[[], None]] = []
+        self._lock = threading.RLock()
+
+    @property
+    def arena(self) -> SecureArena:
+        # одна арена на сессию: создаётся при первом обращении
+        if self._arena is None or self._arena.closed:
+            self._arena = SecureArena()
+
+        return self._arena
 
     def save(self, key: bytes) -> None:
         self.clear()
 
-        self._cached_key = bytearray(key)
-        self._protect_memory()
+        with self._lock:
+            self._key_slot = self.arena.allocate(key)
 
-        now = time.time()
-        self._created_at = now
-        self._last_access_at = now
+            now = time.time()
+            self._created_at = now
+            self._last_access_at = now
 
     def load(self) -> bytes:
-        if self._cached_key is None:
+        with self._lock:
+            if self._key_slot is None:
+                raise RuntimeError("Ключ отсутствует в памяти.")
+
+            if not self.is_expired():
+                self._last_access_at = time.time()
+                return self._key_slot.tobytes()
+
+        self.clear()
+        raise RuntimeError("Срок хранения ключа истёк.")
+
+    def borrow(self, subkey: str | None = None) -> "KeyBorrow":
+        """
+        Read-only memoryview ключа в арене без копирования (блок with).
+
+        С subkey одалживается подключ, сохранённый save_subkey().
+        TTL продлевается один раз на весь блок. View нельзя сохранять за
+        пределами блока: после clear() он освобождается, а память слота
+        затирается.
+        """
+
+        return KeyBorrow(self, subkey)
+
+    def _open_view(self, subkey: str | None = None) -> memoryview:
+        # вызывается под self._lock из KeyBorrow.__enter__,
+        # истечение срока проверено там же
+        if self._key_slot is None:
             raise RuntimeError("Ключ отсутствует в памяти.")
 
-        if self.is_expired():
-            self.clear()
-            raise RuntimeError("Срок хранения ключа истёк.")
+        slot = self._key_slot if subkey is None else self._subkeys.get(subkey)
+
+        if slot is None:
+            raise RuntimeError("Подключ отсутствует в памяти.")
 
         self._last_access_at = time.time()
-        return bytes(self._cached_key)
+        return slot.readonly_view
+
+    def save_subkey(self, name: str, key: bytes) -> None:
+        with self._lock:
+            if self._key_slot is None:
+                raise RuntimeError("Ключ отсутствует в памяти.")
+
+            self._wipe_subkey(name)
+            self._subkeys[name] = self.arena.allocate(key)
+
+    def load_subkey(self, name: str) -> bytes | None:
+        if not self.has_key():
+            return None
+
+        with self._lock:
+            slot = self._subkeys.get(name)
+
+            if slot is None:
+                return None
+
+            self._last_access_at = time.time()
+            return slot.tobytes()
+
+    def has_subkey(self, name: str) -> bool:
+        with self._lock:
+            return self._key_slot is not None and name in self._subkeys
+
+    def discard_subkey(self, name: str) -> None:
+        with self._lock:
+            self._wipe_subkey(name)
+
+    def store_secret(self, data: bytes | bytearray | memoryview) -> ArenaSlot:
+        """
+        Размещает короткоживущий расшифрованный секрет в арене.
+
+        Вызывающий код освобождает слот через release() или with.
+        """
+
+        return self.arena.allocate(data)
 
     def clear(self) -> None:
-        if self._cached_key is not None:
-            self._unprotect_memory()
+        with self._lock:
+            had_key = self._key_slot is not None
+
+            for name in list(self._subkeys):
+                self._wipe_subkey(name)
+
+            if self._key_slot is not None:
+                self._key_slot.release()
 
-            for i in range(len(self._cached_key)):
-                self._cached_key[i] = 0
+            self._key_slot = None
+            self._created_at = None
+            self._last_access_at = None
 
-        self._cached_key = None
-        self._created_at = None
-        self._last_access_at = None
-        self._memory_protected = False
+        # слушатели вызываются без блокировки: они могут ждать другие потоки
+        if had_key:
+            self._notify_cleared()
 
     def has_key(self) -> bool:
-        return self._cached_key is not None and not self.is_expired()
+        if self.is_expired():
+            self.clear()
+
+        with self._lock:
+            return self._key_slot is not None
+
+    def add_clear_listener(self, listener: Callable[[], None]) -> None:
+        # слушатели вызываются при каждом удалении ключа:
+        # явной очистке, блокировке или истечении TTL
+        if listener not in self._clear_listeners:
+            self._clear_listeners.append(listener)
+
+    def remove_clear_listener(self, listener: Callable[[], None]) -> None:
+        if listener in self._clear_listeners:
+            self._clear_listeners.remove(listener)
+
+    def _notify_cleared(self) -> None:
+        for listener in list(self._clear_listeners):
+            listener()
 
     def is_expired(self) -> bool:
-        if self._cached_key is None or self._last_access_at is None:
-            return False
+        with self._lock:
+            if self._key_slot is None or self._last_access_at is None:
+                return False
 
-        return time.time() - self._last_access_at > self._ttl_seconds
+            return time.time() - self._last_access_at > self._ttl_seconds
 
     def touch(self) -> None:
-        if self._cached_key is not None:
-            self._last_access_at = time.time()
+        with self._lock:
+            if self._key_slot is not None:
+                self._last_access_at = time.time()
 
     def is_memory_protected(self) -> bool:
-        return self._memory_protected
+        return self._key_slot is not None and self.arena.locked
 
-    def _protect_memory(self) -> None:
-        if self._cached_key is None:
-            return
+    def arena_stats(self) -> ArenaStats:
+        return self.arena.stats()
 
-        if os.name == "posix":
-            self._memory_protected = self._try_mlock()
-        elif os.name == "nt":
-            self._memory_protected = self._try_windows_protect()
-        else:
-            self._memory_protected = False
+    def _wipe_subkey(self, name: str) -> None:
+        slot = self._subkeys.pop(name, None)
 
-    def _unprotect_memory(self) -> None:
-        if self._cached_key is None:
-            return
+        if slot is not None:
+            slot.release()
 
-        if os.name == "posix" and self._memory_protected:
-            self._try_munlock()
+class KeyBorrow:
+    # контекст одалживания ключа: класс вместо @contextmanager,
+    # потому что вызывается на каждую операцию шифрования
+    __slots__ = ("_storage", "_subkey")
 
-    def _buffer_address_and_size(self) -> tuple[int, int]:
-        if self._cached_key is None:
-            raise RuntimeError("Ключ отсутствует в памяти.")
+    def __init__(self, storage: KeyStorage, subkey: str | None = None) -> None:
+        self._storage = storage
+        self._subkey = subkey
 
-        buffer = (ctypes.c_char * len(self._cached_key)).from_buffer(self._cached_key)
-        return ctypes.addressof(buffer), len(self._cached_key)
+    def __enter__(self) -> memoryview:
+        storage = self._storage
+        # блокировка держится до __exit__: clear() ждёт конца блока
+        storage._lock.acquire()
 
-    def _try_mlock(self) -> bool:
-        try:
-            libc = ctypes.CDLL(None)
-            address, size = self._buffer_address_and_size()
-            result = libc.mlock(ctypes.c_void_p(address), ctypes.c_size_t(size))
-            return result == 0
-        except Exception:
-            return False
-
-    def _try_munlock(self) -> bool:
         try:
-            libc = ctypes.CDLL(None)
-            address, size = self._buffer_address_and_size()
-            result = libc.munlock(ctypes.c_void_p(address), ctypes.c_size_t(size))
-            return result == 0
-        except Exception:
-            return False
-
-    def _try_windows_protect(self) -> bool:
-        # В учебном проекте оставлен best-effort режим.
-        # CryptProtectMemory защищает данные в памяти, но требует аккуратной
-        # работы с размером блока и платформенными ограничениями
-        return sys.platform.startswith("win")
\ No newline at end of file
+            if not storage.is_expired():
+                return storage._open_view(self._subkey)
+        except BaseException:
+            storage._lock.release()
+            raise
+
+        storage._lock.release()
+        storage.clear()
+        raise RuntimeError("Срок хранения ключа истёк.")
+
+    def __exit__(self, *exc_info) -> None:
+        self._storage._lock.release()
+        return None
@@ -11,8 +11,8 @@ def _xor_bytes(data: bytes, key: bytes) -> bytes:
     return bytes(b ^ key[i % len(key)] for i, b in enumerate(data))
 
 def zero_bytes(buf: bytearray) -> None:
-    for i in range(len(buf)):
-        buf[i] = 0
+    # присваивание среза той же длины перезаписывает буфер на месте
+    buf[:] = bytes(len(buf))
 
 class AES256Placeholder(EncryptionService):
     def encrypt(self, data: bytes, key_manager) -> bytes:
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import ctypes
+import mmap
+import os
+import threading
+from dataclasses import dataclass
+
+@dataclass(frozen=True)
+class ArenaStats:
+    slot_size: int
+    slot_count: int
+    in_use: int
+    peak_in_use: int
+    allocations: int
+    locked: bool
+    dont_dump: bool
+
+_libc = None
+_libc_lock = threading.Lock()
+
+def _load_libc():
+    # библиотека загружается один раз на процесс, а не на каждый mlock
+    global _libc
+
+    with _libc_lock:
+        if _libc is None:
+            _libc = ctypes.CDLL(None, use_errno=True)
+
+        return _libc
+
+class ArenaSlot:
+    """
+    Слот арены с секретом длины length.
+
+    view - memoryview на память арены, копия не создаётся.
+    release() затирает слот нулями и возвращает его арене.
+    """
+
+    def __init__(self, arena: "SecureArena", index: int, length: int) -> None:
+        self._arena = arena
+        self._index = index
+        self._length = length
+        self._view: memoryview | None = arena._slot_view(index)[:length]
+        self._readonly: memoryview | None = None
+
+    @property
+    def length(self) -> int:
+        return self._length
+
+    @property
+    def released(self) -> bool:
+        return self._view is None
+
+    @property
+    def view(self) -> memoryview:
+        if self._view is None:
+            raise RuntimeError("Слот арены уже освобождён.")
+
+        return self._view
+
+    @property
+    def readonly_view(self) -> memoryview:
+        # создаётся один раз и освобождается вместе со слотом
+        if self._readonly is None:
+            self._readonly = self.view.toreadonly()
+
+        return self._readonly
+
+    def tobytes(self) -> bytes:
+        return self.view.tobytes()
+
+    def release(self) -> None:
+        view = self._view
+
+        if view is None:
+            return
+
+        self._view = None
+
+        if self._readonly is not None:
+            self._readonly.release()
+            self._readonly = None
+
+        view.release()
+        self._arena._release(self._index)
+
+    def __enter__(self) -> "ArenaSlot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+class SecureArena:
+    """
+    Защищённая область памяти для ключей и расшифрованных секретов.
+
+    Одна анонимная область mmap выделяется при создании, закрепляется
+    в RAM (mlock / VirtualLock) и исключается из core dump
+    (MADV_DONTDUMP) один раз. Дальше секреты размещаются в слотах
+    фиксированного размера без системных вызовов. Освобождённый слот
+    затирается нулями. Если ОС не даёт закрепить память, арена работает
+    без закрепления (locked=False).
+    """
+
+    DEFAULT_SLOT_SIZE = 256
+    DEFAULT_SLOT_COUNT = 64
+
+    def __init__(
+            self,
+            slot_size: int = DEFAULT_SLOT_SIZE,
+            slot_count: int = DEFAULT_SLOT_COUNT,
+    ) -> None:
+        if slot_size <= 0 or slot_count <= 0:
+            raise ValueError("Slot size and count must be positive.")
+
+        self.slot_size = slot_size
+        self.slot_count = slot_count
+        self._size = slot_size * slot_count
+        self._lock = threading.Lock()
+        self._free = list(range(slot_count - 1, -1, -1))
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._allocations = 0
+
+        self._memory: mmap.mmap | None = mmap.mmap(-1, self._size)
+        self._buffer = memoryview(self._memory)
+        self._address = self._buffer_address()
+        self._dont_dump = self._advise_dont_dump()
+        self._locked = self._lock_memory()
+
+    @property
+    def locked(self) -> bool:
+        return self._locked
+
+    @property
+    def closed(self) -> bool:
+        return self._memory is None
+
+    def allocate(self, data: bytes | bytearray | memoryview) -> ArenaSlot:
+        """Копирует секрет в свободный слот."""
+
+        length = len(data)
+
+        if length > self.slot_size:
+            raise ValueError("Secret does not fit in an arena slot.")
+
+        with self._lock:
+            if self._memory is None:
+                raise RuntimeError("Арена памяти закрыта.")
+
+            if not self._free:
+                raise MemoryError("Secure arena is full.")
+
+            index = self._free.pop()
+            self._in_use += 1
+            self._allocations += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+        slot = ArenaSlot(self, index, length)
+        slot.view[:] = data
+        return slot
+
+    def stats(self) -> ArenaStats:
+        with self._lock:
+            return ArenaStats(
+                slot_size=self.slot_size,
+                slot_count=self.slot_count,
+                in_use=self._in_use,
+                peak_in_use=self._peak_in_use,
+                allocations=self._allocations,
+                locked=self._locked,
+                dont_dump=self._dont_dump,
+            )
+
+    def close(self) -> None:
+        """Затирает всю область и освобождает её. Слоты должны быть освобождены."""
+
+        with self._lock:
+            if self._memory is None:
+                return
+
+            if self._in_use:
+                raise RuntimeError("В арене остались занятые слоты.")
+
+            self._buffer[:] = bytes(self._size)
+
+            if self._locked:
+                self._unlock_memory()
+
+            self._buffer.release()
+            self._memory.close()
+            self._memory = None
+            self._locked = False
+
+    def _slot_view(self, index: int) -> memoryview:
+        start = index * self.slot_size
+        return self._buffer[start:start + self.slot_size]
+
+    def _release(self, index: int) -> None:
+        with self._lock:
+            if self._memory is None:
+                return
+
+            start = index * self.slot_size
+            self._buffer[start:start + self.slot_size] = bytes(self.slot_size)
+            self._free.append(index)
+            self._in_use -= 1
+
+    def _buffer_address(self) -> int:
+        buffer = (ctypes.c_char * self._size).from_buffer(self._memory)
+
+        try:
+            return ctypes.addressof(buffer)
+        finally:
+            del buffer
+
+    def _advise_dont_dump(self) -> bool:
+        advice = getattr(mmap, "MADV_DONTDUMP", None)
+
+        if advice is None:
+            return False
+
+        try:
+            self._memory.madvise(advice)
+            return True
+        except OSError:
+            return False
+
+    def _lock_memory(self) -> bool:
+        try:
+            if os.name == "nt":
+                return bool(
+                    ctypes.windll.kernel32.VirtualLock(
+                        ctypes.c_void_p(self._address),
+                        ctypes.c_size_t(self._size),
+                    )
+                )
+
+            result = _load_libc().mlock(
+                ctypes.c_void_p(self._address),
+                ctypes.c_size_t(self._size),
+            )
+            return result == 0
+        except Exception:
+            return False
+
+    def _unlock_memory(self) -> None:
+        try:
+            if os.name == "nt":
+                ctypes.windll.kernel32.VirtualUnlock(
+                    ctypes.c_void_p(self._address),
+                    ctypes.c_size_t(self._size),
+                )
+            else:
+                _load_libc().munlock(
+                    ctypes.c_void_p(self._address),
+                    ctypes.c_size_t(self._size),
+                )
+        except Exception:
+            pass
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from dataclasses import asdict
+from typing import Any, Callable
+
+from src.core.crypto.key_derivation import (
+    Argon2Settings,
+    KeyDerivationService,
+    PBKDF2Settings,
+)
+
+class UnlockCancelled(Exception):
+    """Вычисление KDF отменено через UnlockWorker.cancel()."""
+
+class UnlockWorkerError(Exception):
+    """Процесс KDF завершился с ошибкой или аварийно."""
+
+ProgressCallback = Callable[[str], None]
+
+def _run_operation(operation: str, args: dict[str, Any]) -> Any:
+    if operation == "derive_master_secret":
+        settings = Argon2Settings(**args["settings"])
+        service = KeyDerivationService(argon2_settings=settings)
+        return service.derive_master_secret(args["password"], args["salt"])
+
+    if operation == "derive_encryption_key":
+        settings = PBKDF2Settings(**args["settings"])
+        service = KeyDerivationService(pbkdf2_settings=settings)
+        return service.derive_encryption_key(args["password"], args["salt"])
+
+    if operation == "verify_password":
+        # параметры Argon2 записаны в самом хеше
+        return KeyDerivationService().verify_password(args["password"], args["stored_hash"])
+
+    raise ValueError(f"Unknown KDF operation: {operation}")
+
+def _worker_main(connection) -> None:
+    # точка входа дочернего процесса: запросы (операция, аргументы)
+    # приходят по pipe, обратно уходят только этапы и результат KDF
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+
+        if request is None:
+            return
+
+        operation, args = request
+        connection.send(("progress", operation))
+
+        try:
+            connection.send(("result", _run_operation(operation, args)))
+        except Exception as exc:
+            connection.send(("error", f"{type(exc).__name__}: {exc}"))
+
+class UnlockWorker:
+    """
+    Выполняет KDF разблокировки в отдельном процессе.
+
+    Память Argon2id (memory_cost) выделяется в дочернем процессе, поэтому
+    процесс GUI после входа не держит её; в родитель по pipe возвращается
+    только результат. Вызовы блокирующие и рассчитаны на фоновый поток:
+    cancel() из другого потока завершает процесс, ожидающий вызов
+    получает UnlockCancelled.
+
+    persistent=False - новый процесс на каждый вызов, память
+    освобождается сразу. persistent=True - один процесс на все вызовы
+    (несколько хранилищ подряд без затрат на запуск), вызовы выполняются
+    по очереди до close().
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(
+            self,
+            persistent: bool = False,
+            on_progress: ProgressCallback | None = None,
+            start_method: str = "spawn",
+    ) -> None:
+        self.persistent = persistent
+        self.on_progress = on_progress
+        self._context = multiprocessing.get_context(start_method)
+        self._lock = threading.Lock()
+        self._call_lock = threading.Lock()
+        self._processes: set[Any] = set()
+        self._cancelled = threading.Event()
+        self._persistent_process = None
+        self._persistent_connection = None
+
+    # KDF operations
+
+    def derive_master_secret(
+            self,
+            password: str,
+            salt: bytes,
+            settings: Argon2Settings,
+    ) -> bytes:
+        return self._call(
+            "derive_master_secret",
+            {"password": password, "salt": salt, "settings": asdict(settings)},
+        )
+
+    def derive_encryption_key(
+            self,
+            password: str,
+            salt: bytes,
+            settings: PBKDF2Settings,
+    ) -> bytes:
+        return self._call(
+            "derive_encryption_key",
+            {"password": password, "salt": salt, "settings": asdict(settings)},
+        )
+
+    def verify_password(self, password: str, stored_hash: str) -> bool:
+        return self._call(
+            "verify_password",
+            {"password": password, "stored_hash": stored_hash},
+        )
+
+    # Lifecycle
+
+    def cancel(self) -> None:
+        """Прерывает выполняющиеся вычисления и не даёт начать новые до reset()."""
+
+        self._cancelled.set()
+
+        with self._lock:
+            processes = list(self._processes)
+
+        for process in processes:
+            process.terminate()
+
+    def reset(self) -> None:
+        self._cancelled.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            process = self._persistent_process
+            connection = self._persistent_connection
+            self._persistent_process = None
+            self._persistent_connection = None
+
+        if process is None:
+            return
+
+        try:
+            connection.send(None)
+        except (OSError, ValueError):
+            pass
+
+        process.join(timeout=1)
+
+        if process.is_alive():
+            process.terminate()
+
+        self._forget(process)
+        connection.close()
+
+    def __enter__(self) -> "UnlockWorker":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Internal
+
+    def _call(self, operation: str, args: dict[str, Any]) -> Any:
+        if self._cancelled.is_set():
+            raise UnlockCancelled("KDF computation was cancelled.")
+
+        if self.persistent:
+            with self._call_lock:
+                process, connection = self._get_persistent_process()
+
+                try:
+                    return self._exchange(process, connection, operation, args)
+                except (UnlockCancelled, UnlockWorkerError):
+                    self._discard_persistent_process()
+                    raise
+
+        process, connection = self._start_process()
+
+        try:
+            result = self._exchange(process, connection, operation, args)
+            connection.send(None)
+            process.join(timeout=1)
+            return result
+        finally:
+            if process.is_alive():
+                process.terminate()
+
+            self._forget(process)
+            connection.close()
+
+    def _exchange(self, process, connection, operation: str, args: dict[str, Any]) -> Any:
+        try:
+            connection.send((operation, args))
+
+            while True:
+                # ожидание порциями, чтобы заметить cancel() и падение процесса
+                while not connection.poll(self.POLL_INTERVAL):
+                    if self._cancelled.is_set():
+                        raise UnlockCancelled("KDF computation was cancelled.")
+
+                    if not process.is_alive():
+                        raise UnlockWorkerError("KDF worker process exited unexpectedly.")
+
+                kind, value = connection.recv()
+
+                if kind == "progress":
+                    self._report(value)
+                elif kind == "result":
+                    self._report("done")
+                    return value
+                else:
+                    raise UnlockWorkerError(value)
+        except (EOFError, OSError) as exc:
+            if self._cancelled.is_set():
+                raise UnlockCancelled("KDF computation was cancelled.") from exc
+
+            raise UnlockWorkerError("KDF worker process exited unexpectedly.") from exc
+
+    def _report(self, stage: str) -> None:
+        if self.on_progress is not None:
+            self.on_progress(stage)
+
+    def _start_process(self):
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_connection,),
+            name="vault-unlock-worker",
+            daemon=True,
+        )
+        process.start()
+        child_connection.close()
+
+        with self._lock:
+            self._processes.add(process)
+
+        return process, parent_connection
+
+    def _get_persistent_process(self):
+        with self._lock:
+            process = self._persistent_process
+            connection = self._persistent_connection
+
+        if process is not None and process.is_alive():
+            return process, connection
+
+        process, connection = self._start_process()
+
+        with self._lock:
+            self._persistent_process = process
+            self._persistent_connection = connection
+
+        return process, connection
+
+    def _discard_persistent_process(self) -> None:
+        with self._lock:
+            process = self._persistent_process
+            connection = self._persistent_connection
+            self._persistent_process = None
+            self._persistent_connection = None
+
+        if process is None:
+            return
+
+        if process.is_alive():
+            process.terminate()
+
+        process.join(timeout=1)
+        self._forget(process)
+        connection.close()
+
+    def _forget(self, process) -> None:
+        with self._lock:
+            self._processes.discard(process)
@@ -1,56 +1,270 @@
 ﻿from __future__ import annotations
+import base64
+import hmac
 import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Callable, Iterator, Optional
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 from src.core.crypto.key_derivation import (
     Argon2Settings,
     AuthHashResult,
     KeyDerivationService,
+    MasterKeys,
     PBKDF2Settings,
 )
 from src.core.os_keychain import OSKeychain
-from src.core.crypto.key_storage import KeyStorage
+from src.core.crypto.key_storage import KeyBorrow, KeyStorage
+from src.core.crypto.secure_arena import ArenaStats
+from src.core.crypto.unlock_worker import UnlockWorker
+# KeySlot и KeySlotsError доступны и из src.core.key_manager
+from src.core.key_rotation import DataKeyRotationMixin, KeySlotsError
+from src.core.key_slots import KeySlot, KeySlotsMixin
 
 @dataclass(frozen=True)
 class DerivedKey:
     key: bytes
     salt: bytes
 
-class KeyManager:
+@dataclass(frozen=True)
+class UnlockTiming:
+    total_ms: float
+    kdf_ms: float
+    scheme: str
+    concurrent: bool
+
+class KeyManager(KeySlotsMixin, DataKeyRotationMixin):
+    # Конвертное шифрование: записи шифруются случайным ключом данных (DEK),
+    # в key_store.params хранится DEK, обёрнутый ключом из мастер-пароля
+    # (KEK), поэтому смена пароля не перешифровывает хранилище. Схема KDF
+    # хранится в params["kdf"]; слабые параметры и старая схема заменяются
+    # после входа (upgrade_kdf_params). Слоты ключей и быстрая
+    # разблокировка - KeySlotsMixin, ротация и версии ключа данных -
+    # DataKeyRotationMixin.
+
+    KEY_PARAMS_VERSION = 3
+    KDF_SCHEME = "argon2id_hkdf_sha256"
+    KDF_SCHEME_VERSION = 1
+    VERIFIER_PREFIX = "$hkdf-sha256$"
+    KDF_PARAMS_VERSION_SETTING = "kdf_params_version"
+    DATA_KEY_VERSION = 1
+    DATA_KEY_SIZE = 32
+    DATA_KEY_NONCE_SIZE = 12
+    DATA_KEY_ASSOCIATED_DATA = b"vault-data-key|master"
+    # схемы derive_named_key(): прежняя оставлена для уже выданных ключей
+    NAMED_KEY_SCHEME = "hkdf_sha256"
+    NAMED_KEY_SCHEME_LEGACY = "pbkdf2_purpose"
+
     def __init__(
             self,
             argon2_settings: Argon2Settings | None = None,
             pbkdf2_settings: PBKDF2Settings | None = None,
             key_cache_ttl_seconds: int = 3600,
+            concurrent_unlock: bool = True,
+            kdf_worker: UnlockWorker | None = None,
+            keychain: OSKeychain | None = None,
+            quick_unlock_max_attempts: int = KeySlotsMixin.QUICK_UNLOCK_MAX_ATTEMPTS,
+            quick_unlock_max_age_seconds: int = KeySlotsMixin.QUICK_UNLOCK_MAX_AGE_SECONDS,
+            data_key_rotation_threshold: int = DataKeyRotationMixin.DATA_KEY_ROTATION_THRESHOLD,
     ) -> None:
+        if not 0 < data_key_rotation_threshold <= self.DATA_KEY_USAGE_LIMIT:
+            raise ValueError("Порог ротации ключа данных вне допустимого диапазона")
+
         self._kdf = KeyDerivationService(argon2_settings, pbkdf2_settings)
+        self.concurrent_unlock = concurrent_unlock
+        # если задан, KDF разблокировки и смены пароля считается в
+        # отдельном процессе (см. UnlockWorker)
+        self.kdf_worker = kdf_worker
+        self.last_unlock_timing: UnlockTiming | None = None
+        self._unlock_executor: ThreadPoolExecutor | None = None
+        self._last_kdf_ms = 0.0
+        self._executor_lock = threading.Lock()
         self._storage = KeyStorage(ttl_seconds=key_cache_ttl_seconds)
-        self._os_keychain = OSKeychain()
+        self._os_keychain = keychain or OSKeychain()
+        self.quick_unlock_max_attempts = quick_unlock_max_attempts
+        self.quick_unlock_max_age_seconds = quick_unlock_max_age_seconds
+        self.data_key_rotation_threshold = data_key_rotation_threshold
         self._active_key: Optional[bytes] = None
         self._active_salt: Optional[bytes] = None
-
-    def _build_key_params(self) -> str:
-        return json.dumps(
-            {
-                "version": 1,
-                "auth": {
-                    "algorithm": "argon2id",
-                    "time_cost": self._kdf.argon2_settings.time_cost,
-                    "memory_cost": self._kdf.argon2_settings.memory_cost,
-                    "parallelism": self._kdf.argon2_settings.parallelism,
-                    "hash_len": self._kdf.argon2_settings.hash_len,
-                },
-                "encryption": {
-                    "algorithm": "pbkdf2_hmac_sha256",
-                    "iterations": self._kdf.pbkdf2_settings.iterations,
-                    "salt_len": self._kdf.pbkdf2_settings.salt_len,
-                    "key_len": self._kdf.pbkdf2_settings.key_len,
-                },
+        self._active_key_id: Optional[str] = None
+        self._pending_data_key: Optional[tuple[str, bytes]] = None
+        self._pending_key_version: Optional[int] = None
+        self._active_key_version: Optional[int] = None
+        self._root_key_version: Optional[int] = None
+        self._readable_key_versions: frozenset[int] = frozenset()
+        self._legacy_key_version: Optional[int] = None
+        self._usage_lock = threading.Lock()
+        self._pending_usage: dict[str, int] = {}
+
+    def _build_key_params(
+            self,
+            data_key: dict[str, Any] | None = None,
+            kdf: dict[str, Any] | None = None,
+            data_key_versions: list[dict[str, Any]] | None = None,
+    ) -> str:
+        if kdf is not None:
+            params: dict[str, Any] = {
+                "version": self.KEY_PARAMS_VERSION,
+                "kdf": kdf,
+                "data_key": data_key,
+            }
+
+            if data_key_versions:
+                params["data_key_versions"] = data_key_versions
+
+            return json.dumps(params, ensure_ascii=False)
+
+        # параметры старой схемы KDF
+        params: dict[str, Any] = {
+            "version": 2 if data_key else 1,
+            "auth": {
+                "algorithm": "argon2id",
+                "time_cost": self._kdf.argon2_settings.time_cost,
+                "memory_cost": self._kdf.argon2_settings.memory_cost,
+                "parallelism": self._kdf.argon2_settings.parallelism,
+                "hash_len": self._kdf.argon2_settings.hash_len,
+            },
+            "encryption": {
+                "algorithm": "pbkdf2_hmac_sha256",
+                "iterations": self._kdf.pbkdf2_settings.iterations,
+                "salt_len": self._kdf.pbkdf2_settings.salt_len,
+                "key_len": self._kdf.pbkdf2_settings.key_len,
             },
-            ensure_ascii=False,
+        }
+
+        if data_key is not None:
+            params["data_key"] = data_key
+
+        if data_key_versions:
+            params["data_key_versions"] = data_key_versions
+
+        return json.dumps(params, ensure_ascii=False)
+
+    def _build_kdf_params(self) -> dict[str, Any]:
+        settings = self._kdf.argon2_settings
+
+        return {
+            "scheme": self.KDF_SCHEME,
+            "version": self.KDF_SCHEME_VERSION,
+            "time_cost": settings.time_cost,
+            "memory_cost": settings.memory_cost,
+            "parallelism": settings.parallelism,
+            "hash_len": settings.hash_len,
+        }
+
+    def _new_credentials(
+            self,
+            password: str,
+    ) -> tuple[bytes, str, bytes, dict[str, Any]]:
+        """Соль, проверочное значение, KEK и параметры KDF для пароля."""
+
+        salt = self.generate_salt()
+        kdf = self._build_kdf_params()
+        keys = self._derive_master_keys(password, salt, kdf)
+
+        return salt, self._encode_verifier(keys.auth_key), keys.encryption_key, kdf
+
+    def _derive_master_keys(
+            self,
+            password: str,
+            salt: bytes,
+            kdf: dict[str, Any],
+    ) -> MasterKeys:
+        try:
+            if kdf["scheme"] != self.KDF_SCHEME or kdf["version"] != self.KDF_SCHEME_VERSION:
+                raise ValueError("Неподдерживаемая схема KDF")
+
+            settings = Argon2Settings(
+                time_cost=int(kdf["time_cost"]),
+                memory_cost=int(kdf["memory_cost"]),
+                parallelism=int(kdf["parallelism"]),
+                hash_len=int(kdf["hash_len"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Повреждены параметры ключа")
+
+        if self.kdf_worker is not None:
+            return self._kdf.split_master_secret(
+                self.kdf_worker.derive_master_secret(password, salt, settings)
+            )
+
+        return self._kdf.derive_master_keys(password, salt, settings)
+
+    def _encode_verifier(self, auth_key: bytes) -> str:
+        return self.VERIFIER_PREFIX + base64.b64encode(auth_key).decode("ascii")
+
+    def _wrap_data_key(
+            self,
+            kek: bytes,
+            data_key: bytes,
+            derived_from_password: bool = False,
+            key_id: str | None = None,
+            associated_data: bytes | None = None,
+    ) -> dict[str, Any]:
+        nonce = os.urandom(self.DATA_KEY_NONCE_SIZE)
+        wrapped = nonce + AESGCM(kek).encrypt(
+            nonce,
+            data_key,
+            associated_data or self.DATA_KEY_ASSOCIATED_DATA,
         )
 
+        return {
+            "version": self.DATA_KEY_VERSION,
+            "key_id": key_id or uuid.uuid4().hex,
+            "algorithm": "aes-256-gcm",
+            "wrapped_key": base64.b64encode(wrapped).decode("ascii"),
+            "derived_from_password": derived_from_password,
+        }
+
+    def _unwrap_data_key(
+            self,
+            kek: bytes,
+            record: Any,
+            associated_data: bytes | None = None,
+    ) -> bytes:
+        try:
+            if record["version"] != self.DATA_KEY_VERSION:
+                raise ValueError("Неподдерживаемая версия ключа данных")
+
+            wrapped = base64.b64decode(record["wrapped_key"])
+            nonce = wrapped[:self.DATA_KEY_NONCE_SIZE]
+
+            data_key = AESGCM(kek).decrypt(
+                nonce,
+                wrapped[self.DATA_KEY_NONCE_SIZE:],
+                associated_data or self.DATA_KEY_ASSOCIATED_DATA,
+            )
+        except (KeyError, TypeError, ValueError, InvalidTag):
+            raise ValueError("Повреждены параметры ключа")
+
+        if len(data_key) != self.DATA_KEY_SIZE:
+            raise ValueError("Повреждены параметры ключа")
+
+        return data_key
+
+    def _rewrap_data_key(self, kek: bytes, data_key: bytes, record: dict[str, Any]) -> dict[str, Any]:
+        # новая обёртка того же ключа сохраняет его версию и отметки
+        wrapped = self._wrap_data_key(
+            kek,
+            data_key,
+            record.get("derived_from_password", False),
+            record.get("key_id"),
+        )
+
+        for field in ("key_version", "drained"):
+            if field in record:
+                wrapped[field] = record[field]
+
+        return wrapped
+
     def is_master_password_set(self) -> bool:
         record = self.key_store.get_key("master_password")
         return record is not None
@@ -78,12 +292,73 @@ class KeyManager:
         password: str,
         salt: bytes,
         purpose: str,
+        scheme: str = NAMED_KEY_SCHEME,
     ) -> bytes:
+        """
+        Ключ назначения purpose из пароля.
+
+        NAMED_KEY_SCHEME: пароль растягивается один раз, ключ назначения
+        получается через HKDF. NAMED_KEY_SCHEME_LEGACY - прежняя схема
+        PBKDF2("<purpose>:<пароль>"), даёт другие ключи; нужна для данных,
+        защищённых ключом до перехода на HKDF. В разблокированной сессии
+        используйте get_subkey().
+        """
+
         if not purpose:
             raise ValueError("Key purpose must not be empty.")
 
-        purpose_password = f"{purpose}:{password}"
-        return self.derive_key(purpose_password, salt)
+        if scheme == self.NAMED_KEY_SCHEME_LEGACY:
+            return self.derive_key(f"{purpose}:{password}", salt)
+
+        if scheme != self.NAMED_KEY_SCHEME:
+            raise ValueError(f"Unsupported named key scheme: {scheme}")
+
+        return self._kdf.derive_subkey(self.derive_key(password, salt), purpose)
+
+    def get_subkey(self, purpose: str, key_version: int | None = None) -> bytes:
+        """
+        Именованный подключ активного ключа данных (HKDF-SHA256).
+
+        С key_version - подключ ключа данных этой версии (для чтения
+        данных, записанных до ленивой ротации). Подключ вычисляется один
+        раз за сессию и хранится в KeyStorage с тем же TTL и защитой
+        памяти, что и основной ключ; lock() затирает его вместе с основным.
+        """
+
+        name = self._subkey_name(purpose, key_version)
+        cached = self._storage.load_subkey(name)
+
+        if cached is not None:
+            return cached
+
+        with self.borrow_key(key_version) as key:
+            subkey = self._kdf.derive_subkey(key, purpose)
+
+        self._storage.save_subkey(name, subkey)
+
+        return subkey
+
+    def borrow_subkey(self, purpose: str, key_version: int | None = None) -> KeyBorrow:
+        """
+        Одалживает подключ get_subkey() без копирования (блок with).
+
+        Подключ вычисляется при первом обращении и затирается вместе
+        с ключом данных, поэтому HKDF не повторяется на каждый шифр.
+        """
+
+        name = self._subkey_name(purpose, key_version)
+
+        if not self._storage.has_subkey(name):
+            with self.borrow_key(key_version) as key:
+                self._storage.save_subkey(name, self._kdf.derive_subkey(key, purpose))
+
+        return self._storage.borrow(name)
+
+    def _subkey_name(self, purpose: str, key_version: int | None) -> str:
+        if key_version is not None and key_version != self._active_key_version:
+            return f"{purpose}|v{key_version}"
+
+        return purpose
 
     def derive_key_bundle(self, password: str) -> DerivedKey:
         salt = self.generate_salt()
@@ -92,7 +367,26 @@ class KeyManager:
 
     # Active key flow for current app logic
 
-    def unlock_with_password(self, db, password: str) -> bytes:
+    def unlock_with_password(self, db, password: str) -> None:
+        """
+        Разблокирует хранилище мастер-паролем.
+
+        Ключ данных остаётся только в KeyStorage и не возвращается:
+        копию bytes нельзя затереть. Для шифрования используйте
+        borrow_key().
+        """
+
+        started = time.perf_counter()
+        _root_key, _kek, params = self._unlock(db, password)
+
+        self.last_unlock_timing = UnlockTiming(
+            total_ms=(time.perf_counter() - started) * 1000,
+            kdf_ms=self._last_kdf_ms,
+            scheme=params.get("kdf", {}).get("scheme", "legacy"),
+            concurrent="kdf" not in params and self.concurrent_unlock,
+        )
+
+    def _unlock(self, db, password: str) -> tuple[bytes, bytes, dict[str, Any]]:
         row = db.execute(
             """
             SELECT salt, hash, params
@@ -104,16 +398,22 @@ class KeyManager:
         ).fetchone()
 
         if row is None:
-            salt = self.generate_salt()
-            auth_hash = self.create_auth_hash(password).hash
+            salt, auth_hash, kek, kdf = self._new_credentials(password)
+            data_key = os.urandom(self.DATA_KEY_SIZE)
+            record = self._wrap_data_key(kek, data_key)
+            params = self._build_key_params(record, kdf)
 
-            db.execute(
-                """
-                INSERT INTO key_store (key_type, salt, hash, params)
-                VALUES (?, ?, ?, ?);
-                """,
-                ("master", salt, auth_hash, self._build_key_params())
-            )
+            parsed = json.loads(params)
+
+            with self._transaction(db):
+                db.execute(
+                    """
+                    INSERT INTO key_store (key_type, salt, hash, params)
+                    VALUES (?, ?, ?, ?);
+                    """,
+                    ("master", salt, auth_hash, params)
+                )
+                self._sync_kdf_params_version(db, parsed)
         else:
             salt = row[0]
             stored_hash = row[1]
@@ -135,17 +435,421 @@ class KeyManager:
             except Exception:
                 raise ValueError("Повреждены параметры ключа")
 
-            if not self.verify_password(password, stored_hash):
+            if not isinstance(parsed, dict):
+                raise ValueError("Повреждены параметры ключа")
+
+            kek = self._verify_and_derive_kek(password, salt, stored_hash, parsed)
+
+            if "data_key" in parsed:
+                data_key = self._unwrap_data_key(kek, parsed["data_key"])
+            else:
+                data_key, parsed = self._migrate_to_data_key(db, kek, parsed)
+
+            self._sync_kdf_params_version(db, parsed)
+
+        self._pending_data_key = None
+        self._pending_key_version = None
+
+        if "pending_data_key" in parsed:
+            pending = parsed["pending_data_key"]
+            self._pending_data_key = (
+                pending["key_id"],
+                self._unwrap_data_key(kek, pending["resume"]),
+            )
+            self._pending_key_version = self._record_key_version(pending["resume"])
+
+        # ключ хранится только в арене KeyStorage, без долгоживущей копии
+        self._active_salt = salt
+        self._activate_data_key(data_key, parsed)
+        return data_key, kek, parsed
+
+    def _verify_and_derive_kek(
+            self,
+            password: str,
+            salt: bytes,
+            stored_hash: str,
+            params: dict[str, Any],
+    ) -> bytes:
+        # параметры KDF берутся из key_store, а не из настроек KeyManager:
+        # иначе смена значений по умолчанию сделала бы хранилище недоступным
+        started = time.perf_counter()
+
+        try:
+            if "kdf" in params:
+                keys = self._derive_master_keys(password, salt, params["kdf"])
+
+                if not hmac.compare_digest(
+                        self._encode_verifier(keys.auth_key),
+                        stored_hash,
+                ):
+                    raise ValueError("Неверный мастер-пароль")
+
+                return keys.encryption_key
+
+            return self._verify_legacy(password, salt, stored_hash, params)
+        finally:
+            self._last_kdf_ms = (time.perf_counter() - started) * 1000
+
+    def _verify_legacy(
+            self,
+            password: str,
+            salt: bytes,
+            stored_hash: str,
+            params: dict[str, Any],
+    ) -> bytes:
+        # Argon2-хеш старой схемы сам содержит свои параметры
+        settings = self._legacy_pbkdf2_settings(params)
+
+        if not self.concurrent_unlock:
+            if not self._verify_stored_hash(password, stored_hash):
                 raise ValueError("Неверный мастер-пароль")
 
+            return self._derive_legacy_key(password, salt, settings)
+
+        # Argon2 и PBKDF2 отпускают GIL в нативном коде, поэтому PBKDF2
+        # считается в отдельном потоке одновременно с проверкой пароля
+        future = self._get_unlock_executor().submit(
+            self._derive_legacy_key, password, salt, settings,
+        )
+
+        try:
+            verified = self._verify_stored_hash(password, stored_hash)
+        except BaseException:
+            future.cancel()
+            raise
+
+        if not verified:
+            # ключ от неверного пароля не нужен
+            future.cancel()
+            raise ValueError("Неверный мастер-пароль")
+
+        return future.result()
+
+    def _verify_stored_hash(self, password: str, stored_hash: str) -> bool:
+        if self.kdf_worker is not None:
+            return self.kdf_worker.verify_password(password, stored_hash)
+
+        return self.verify_password(password, stored_hash)
+
+    def _derive_legacy_key(self, password: str, salt: bytes, settings: PBKDF2Settings) -> bytes:
+        if self.kdf_worker is not None:
+            return self.kdf_worker.derive_encryption_key(password, salt, settings)
+
+        return self._kdf.derive_encryption_key(password, salt, settings)
+
+    def _get_unlock_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._unlock_executor is None:
+                self._unlock_executor = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix="vault-unlock",
+                )
+
+            return self._unlock_executor
+
+    def _legacy_pbkdf2_settings(self, params: dict[str, Any]) -> PBKDF2Settings:
+        encryption = params.get("encryption")
+
+        if encryption is None:
+            return self._kdf.pbkdf2_settings
+
+        try:
+            return PBKDF2Settings(
+                iterations=int(encryption["iterations"]),
+                salt_len=int(encryption.get("salt_len", self._kdf.pbkdf2_settings.salt_len)),
+                key_len=int(encryption["key_len"]),
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError("Повреждены параметры ключа")
+
+    # KDF upgrade
+
+    def needs_kdf_upgrade(self, db) -> bool:
+        """
+        True, если параметры KDF хранилища слабее текущих настроек
+        KeyManager или используется старая схема Argon2id + PBKDF2.
+
+        Слабее - значит ни один параметр не больше настроек и хотя бы
+        один меньше: пересчёт не должен уменьшать объём памяти ради
+        числа проходов (и наоборот).
+        """
+
+        params = self._load_key_params(db)
+
+        # обёртка ожидающего ключа сделана текущим KEK: сначала ротация
+        if not params or "pending_data_key" in params or "data_key" not in params:
+            return False
+
+        kdf = params.get("kdf")
+
+        if kdf is None:
+            return True
+
+        policy = self._kdf.argon2_settings
+
+        try:
+            if kdf["scheme"] != self.KDF_SCHEME or int(kdf["version"]) < self.KDF_SCHEME_VERSION:
+                return True
+
+            stored = (int(kdf["time_cost"]), int(kdf["memory_cost"]), int(kdf["hash_len"]))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Повреждены параметры ключа")
+
+        required = (policy.time_cost, policy.memory_cost, policy.hash_len)
+
+        return (
+            all(have <= need for have, need in zip(stored, required))
+            and stored != required
+        )
+
+    def upgrade_kdf_params(self, db, password: str) -> bool:
+        """
+        Пересчитывает проверочное значение и обёртку ключа данных
+        с текущими параметрами KDF. Ключ данных и записи не меняются.
+
+        Хранилище должно быть разблокировано этим паролем. Возвращает
+        False, если обновление не нужно или key_store изменился во время
+        пересчёта. Рассчитан на вызов из фонового потока после входа.
+        """
+
+        if not self.needs_kdf_upgrade(db):
+            return False
+
+        data_key = self._load_root_key()
+        row = db.execute(
+            "SELECT salt, hash, params FROM key_store WHERE key_type = ?;",
+            ("master",)
+        ).fetchone()
+        params = json.loads(row[2])
+
+        # повторная проверка пароля: неверный пароль здесь заблокировал бы
+        # хранилище навсегда
+        kek = self._verify_and_derive_kek(password, row[0], row[1], params)
+
+        if not hmac.compare_digest(self._unwrap_data_key(kek, params["data_key"]), data_key):
+            return False
+
+        salt, auth_hash, new_kek, kdf = self._new_credentials(password)
+        new_params = self._build_key_params(
+            self._rewrap_data_key(new_kek, data_key, params["data_key"]),
+            kdf,
+            params.get("data_key_versions"),
+        )
+
+        with self._transaction(db):
+            cursor = db.execute(
+                """
+                UPDATE key_store
+                SET salt = ?,
+                    hash = ?,
+                    params = ?
+                WHERE key_type = ? AND hash = ?;
+                """,
+                (salt, auth_hash, new_params, "master", row[1])
+            )
+
+            if cursor.rowcount == 0:
+                return False
+
+            self._sync_kdf_params_version(db, json.loads(new_params))
+
         self._active_salt = salt
-        self._active_key = self.derive_key(password, salt)
-        self._storage.save(self._active_key)
-        return self._active_key
+        return True
+
+    def change_master_password(
+            self,
+            db,
+            old_password: str,
+            new_password: str,
+    ) -> None:
+        """
+        Меняет мастер-пароль без перешифрования записей.
+
+        Обновляются только соль, хеш пароля и обёртка ключа данных.
+        Неверный текущий пароль вызывает ValueError.
+        """
+
+        data_key, _kek, params = self._unlock(db, old_password)
+
+        if "pending_data_key" in params:
+            raise RuntimeError("Перешифрование хранилища не завершено.")
+
+        new_salt, new_auth_hash, new_kek, kdf = self._new_credentials(new_password)
+
+        params = self._build_key_params(
+            self._rewrap_data_key(new_kek, data_key, params["data_key"]),
+            kdf,
+            params.get("data_key_versions"),
+        )
+
+        with self._transaction(db):
+            db.execute(
+                """
+                UPDATE key_store
+                SET salt = ?,
+                    hash = ?,
+                    params = ?
+                WHERE key_type = ?;
+                """,
+                (new_salt, new_auth_hash, params, "master")
+            )
+            self._sync_kdf_params_version(db, json.loads(params))
+
+        self._active_salt = new_salt
+
+    def is_data_key_derived_from_password(self, db) -> bool:
+        params = self._load_key_params(db)
+        return bool(params.get("data_key", {}).get("derived_from_password", False))
+
+    def _load_master_salt(self, db) -> bytes | None:
+        row = db.execute(
+            "SELECT salt FROM key_store WHERE key_type = ?;",
+            ("master",)
+        ).fetchone()
+
+        return row[0] if row is not None else None
+
+    def _parse_params(self, params: str | None) -> dict[str, Any]:
+        try:
+            parsed = json.loads(params or "{}")
+        except Exception:
+            raise ValueError("Повреждены параметры ключа")
+
+        if not isinstance(parsed, dict):
+            raise ValueError("Повреждены параметры ключа")
+
+        return parsed
+
+    def _load_key_params(self, db) -> dict[str, Any]:
+        row = db.execute(
+            "SELECT params FROM key_store WHERE key_type = ?;",
+            ("master",)
+        ).fetchone()
+
+        if row is None or not row[0]:
+            return {}
+
+        try:
+            params = json.loads(row[0])
+        except Exception:
+            raise ValueError("Повреждены параметры ключа")
+
+        if not isinstance(params, dict):
+            raise ValueError("Повреждены параметры ключа")
+
+        return params
+
+    def _migrate_to_data_key(
+            self,
+            db,
+            kek: bytes,
+            params: dict[str, Any],
+    ) -> tuple[bytes, dict[str, Any]]:
+        # однократная миграция старого хранилища: записи уже зашифрованы
+        # ключом из пароля, он и становится ключом данных; параметры KDF
+        # сохраняются, по ним этот ключ и получен
+        params = dict(params)
+        params["version"] = 2
+        params["data_key"] = self._wrap_data_key(kek, kek, derived_from_password=True)
+        params = json.dumps(params, ensure_ascii=False)
+
+        with self._transaction(db):
+            db.execute(
+                """
+                UPDATE key_store
+                SET params = ?
+                WHERE key_type = ?;
+                """,
+                (params, "master")
+            )
+            self._sync_kdf_params_version(db, json.loads(params))
+
+        return kek, json.loads(params)
+
+    def _sync_kdf_params_version(self, db, params: dict[str, Any]) -> None:
+        version = str(params.get("version", 1))
+        row = db.execute(
+            "SELECT setting_value FROM settings WHERE setting_key = ?;",
+            (self.KDF_PARAMS_VERSION_SETTING,)
+        ).fetchone()
+
+        if row is not None and row[0] == version:
+            return
+
+        db.execute(
+            """
+            INSERT INTO settings (setting_key, setting_value, encrypted)
+            VALUES (?, ?, 0)
+            ON CONFLICT(setting_key) DO UPDATE SET setting_value = excluded.setting_value;
+            """,
+            (self.KDF_PARAMS_VERSION_SETTING, version)
+        )
+
+    @contextmanager
+    def _transaction(self, db) -> Iterator[None]:
+        # ключевой материал фиксируется с fsync и во время bulk_import()
+        if hasattr(db, "transaction"):
+            with db.transaction(durable=True):
+                yield
+            return
+
+        yield
+
+        if hasattr(db, "commit"):
+            db.commit()
+
+    @property
+    def active_key_id(self) -> str | None:
+        return self._active_key_id
+
+    @property
+    def active_key_version(self) -> int | None:
+        """Версия ключа данных, которой шифруются новые данные."""
+        return self._active_key_version
+
+    @property
+    def legacy_key_version(self) -> int | None:
+        """
+        Версия ключа, которым зашифрованы записи без заголовка шифра.
+
+        Такие записи остаются только в хранилищах до конвертного
+        шифрования, пока их ключ из пароля не выведен из оборота;
+        иначе None.
+        """
+        return self._legacy_key_version
 
     def get_active_key(self) -> bytes:
         return self._storage.load()
 
+    def borrow_key(self, key_version: int | None = None) -> KeyBorrow:
+        """
+        Одалживает активный ключ без копирования:
+
+            with key_manager.borrow_key() as key:
+                cipher = AESGCM(key)
+
+        key - read-only memoryview защищённого буфера, действует только
+        внутри блока. Предпочтительнее get_active_key() в циклах.
+        С key_version одалживается ключ данных этой версии.
+        """
+
+        if key_version is None or key_version == self._active_key_version:
+            return self._storage.borrow()
+
+        if key_version != self._root_key_version and key_version not in self._readable_key_versions:
+            raise ValueError("Неизвестная версия ключа данных")
+
+        return self._storage.borrow(self._version_subkey_name(key_version))
+
+    def has_active_key(self) -> bool:
+        return self._storage.has_key()
+
+    def add_key_cleared_listener(self, listener: Callable[[], None]) -> None:
+        self._storage.add_clear_listener(listener)
+
+    def remove_key_cleared_listener(self, listener: Callable[[], None]) -> None:
+        self._storage.remove_clear_listener(listener)
+
     @property
     def active_key(self) -> bytes:
         return self.get_active_key()
@@ -160,16 +864,28 @@ class KeyManager:
         self._storage.clear()
         self._active_key = None
         self._active_salt = None
+        self._active_key_id = None
+        self._pending_data_key = None
+        self._pending_key_version = None
+        self._active_key_version = None
+        self._root_key_version = None
+        self._readable_key_versions = frozenset()
+        self._legacy_key_version = None
 
     def store_key(self) -> None:
         if self._active_key is None:
             raise RuntimeError("Нет активного ключа для сохранения в памяти.")
 
+        # после переноса в арену копия в _active_key не хранится
         self._storage.save(self._active_key)
+        self._active_key = None
 
     def load_key(self) -> bytes:
         return self._storage.load()
 
+    def secure_memory_stats(self) -> ArenaStats:
+        return self._storage.arena_stats()
+
     def save_keychain_secret(self, name: str, value: str) -> bool:
         return self._os_keychain.save_secret(name, value)
 
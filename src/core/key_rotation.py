@@ -0,0 +1,481 @@
+from __future__ import annotations
+import base64
+import json
+import os
+import uuid
+from typing import Any
+
+class KeySlotsError(RuntimeError):
+    """Замена ключа данных удалит дополнительные слоты; нужно согласие."""
+
+    def __init__(self, slot_ids: list[str]) -> None:
+        super().__init__(
+            "Замена ключа данных удалит дополнительные слоты ключей: "
+            + ", ".join(slot_ids)
+        )
+        self.slot_ids = slot_ids
+
+class DataKeyRotationMixin:
+    # Замена ключа данных (ротация) выполняется ReencryptionEngine.
+    # На время перешифрования новый ключ лежит в params["pending_data_key"]
+    # обёрнутым текущим KEK, а итоговые соль, хеш и обёртка - в "final".
+    # Так прерванную ротацию можно продолжить после обычной разблокировки.
+    #
+    # Ленивая ротация ключа данных: rotate_data_key_lazily() добавляет
+    # в params["data_key_versions"] новый ключ, обёрнутый корневым ключом
+    # данных (params["data_key"]), и делает его активным без пароля и без
+    # перешифрования. Номер версии ключа пишется в заголовок каждого
+    # шифртекста; старые записи читаются прежней версией и переписываются
+    # активной при чтении или фоновым ReencryptionEngine.drain_step().
+    # Когда данных старых версий не осталось, drop_retired_data_keys()
+    # удаляет их обёртки. Слоты и быстрая разблокировка оборачивают
+    # корневой ключ, поэтому продолжают работать.
+    #
+    # Учёт использования: число шифрований каждым ключом данных
+    # (settings "data_key_usage:<key_id>"). Для AES-GCM со случайным
+    # 96-битным nonce NIST SP 800-38D ограничивает ключ 2**32 операциями;
+    # needs_data_key_rotation() сообщает о достижении порога
+    # data_key_rotation_threshold с запасом до этой границы.
+    #
+    # Примесь KeyManager: использует его хранилище ключей (_storage),
+    # обёртку ключа данных и транзакции (_transaction).
+
+    DATA_KEY_VERSION_ASSOCIATED_DATA = b"vault-data-key|version|"
+    DATA_KEY_VERSION_SUBKEY = "data-key|v"
+    DEFAULT_KEY_VERSION = 1
+    DATA_KEY_USAGE_LIMIT = 2 ** 32
+    DATA_KEY_ROTATION_THRESHOLD = 2 ** 30
+    DATA_KEY_USAGE_SETTING_PREFIX = "data_key_usage:"
+
+    # Data key rotation
+
+    def begin_data_key_rotation(
+            self,
+            db,
+            password: str,
+            new_password: str | None = None,
+            drop_key_slots: bool = False,
+    ) -> str:
+        """
+        Создаёт новый ключ данных и сохраняет его как ожидающий.
+
+        Если передан new_password, вместе с завершением ротации
+        будет применён и новый мастер-пароль. Возвращает id нового ключа.
+
+        Дополнительные слоты и быстрая разблокировка новый ключ открыть
+        не смогут: без drop_key_slots=True при их наличии выбрасывается
+        KeySlotsError, с ним они удаляются при завершении ротации.
+        """
+
+        _data_key, kek, params = self._unlock(db, password)
+
+        if "pending_data_key" in params:
+            raise RuntimeError("Перешифрование хранилища уже начато.")
+
+        bound_slots = self._list_bound_slots(db)
+
+        if bound_slots and not drop_key_slots:
+            raise KeySlotsError(bound_slots)
+
+        new_data_key = os.urandom(self.DATA_KEY_SIZE)
+        key_id = uuid.uuid4().hex
+        # новая версия отличает перешифрованные строки от ещё не обработанных
+        key_version = self._latest_key_version(params) + 1
+        final: dict[str, Any] = {}
+
+        if new_password is None:
+            final["data_key"] = self._wrap_data_key(kek, new_data_key, key_id=key_id)
+        else:
+            new_salt, new_auth_hash, new_kek, kdf = self._new_credentials(new_password)
+            final["salt"] = base64.b64encode(new_salt).decode("ascii")
+            final["hash"] = new_auth_hash
+            final["kdf"] = kdf
+            final["data_key"] = self._wrap_data_key(new_kek, new_data_key, key_id=key_id)
+
+        final["data_key"]["key_version"] = key_version
+        resume = self._wrap_data_key(kek, new_data_key, key_id=key_id)
+        resume["key_version"] = key_version
+
+        params["pending_data_key"] = {
+            "version": self.DATA_KEY_VERSION,
+            "key_id": key_id,
+            "resume": resume,
+            "final": final,
+            "drop_key_slots": drop_key_slots,
+        }
+
+        with self._transaction(db):
+            db.execute(
+                "UPDATE key_store SET params = ? WHERE key_type = ?;",
+                (json.dumps(params, ensure_ascii=False), "master")
+            )
+
+        self._pending_data_key = (key_id, new_data_key)
+        self._pending_key_version = key_version
+        return key_id
+
+    def get_pending_data_key(self) -> tuple[str, bytes] | None:
+        """(id, ключ) начатой и не завершённой ротации после разблокировки."""
+        return self._pending_data_key
+
+    @property
+    def pending_key_version(self) -> int | None:
+        return self._pending_key_version
+
+    def complete_data_key_rotation(self, db) -> list[str]:
+        """
+        Делает ожидающий ключ данных основным.
+
+        Вызывается после перешифрования всех данных, обычно внутри той же
+        транзакции, что и последняя порция записей. Возвращает id
+        удалённых слотов (см. begin_data_key_rotation).
+        """
+
+        if self._pending_data_key is None:
+            raise RuntimeError("Нет начатой ротации ключа данных.")
+
+        params = self._load_key_params(db)
+        pending = params.pop("pending_data_key", None)
+
+        if pending is None or pending["key_id"] != self._pending_data_key[0]:
+            raise RuntimeError("Нет начатой ротации ключа данных.")
+
+        removed_slots = self._list_bound_slots(db)
+
+        if removed_slots and not pending.get("drop_key_slots"):
+            raise KeySlotsError(removed_slots)
+
+        final = pending["final"]
+        params["data_key"] = final["data_key"]
+        # все данные перешифрованы новым ключом: прежние версии не нужны
+        params.pop("data_key_versions", None)
+
+        if "kdf" in final:
+            params = json.loads(self._build_key_params(final["data_key"], final["kdf"]))
+
+        with self._transaction(db):
+            if "salt" in final:
+                db.execute(
+                    """
+                    UPDATE key_store
+                    SET salt = ?,
+                        hash = ?,
+                        params = ?
+                    WHERE key_type = ?;
+                    """,
+                    (
+                        base64.b64decode(final["salt"]),
+                        final["hash"],
+                        json.dumps(params, ensure_ascii=False),
+                        "master",
+                    )
+                )
+            else:
+                db.execute(
+                    "UPDATE key_store SET params = ? WHERE key_type = ?;",
+                    (json.dumps(params, ensure_ascii=False), "master")
+                )
+
+            # обёртки старого ключа данных в дополнительных слотах
+            # больше не действуют; согласие дано в begin_data_key_rotation
+            db.execute(
+                "DELETE FROM key_store WHERE key_type LIKE ?;",
+                (self.SLOT_KEY_TYPE_PREFIX + "%",)
+            )
+            quick_unlock = self._delete_quick_unlock_row(db)
+            self._sync_kdf_params_version(db, params)
+
+        self._delete_quick_unlock_secret(quick_unlock)
+
+        _key_id, data_key = self._pending_data_key
+
+        if "salt" in final:
+            self._active_salt = base64.b64decode(final["salt"])
+
+        self._pending_data_key = None
+        self._pending_key_version = None
+        self._activate_data_key(data_key, params)
+        return removed_slots
+
+    # Lazy data key rotation
+
+    def rotate_data_key_lazily(self, db) -> int:
+        """
+        Делает активным новый ключ данных без перешифрования хранилища.
+
+        Пароль не нужен: новый ключ оборачивается корневым ключом данных.
+        Новые данные шифруются новой версией, старые читаются прежними
+        версиями, пока их не перепишут (чтение записи или
+        ReencryptionEngine.drain_step()). Возвращает номер новой версии.
+        """
+
+        params = self._load_key_params(db)
+
+        if "pending_data_key" in params:
+            raise RuntimeError("Перешифрование хранилища не завершено.")
+
+        if "data_key" not in params or not self._storage.has_key():
+            raise RuntimeError("Хранилище заблокировано.")
+
+        key_version = self._latest_key_version(params) + 1
+        new_data_key = os.urandom(self.DATA_KEY_SIZE)
+        root_key = self._load_root_key()
+
+        record = self._wrap_data_key(
+            root_key,
+            new_data_key,
+            associated_data=self._version_associated_data(key_version),
+        )
+        record["key_version"] = key_version
+        params["data_key_versions"] = [*params.get("data_key_versions", []), record]
+
+        with self._transaction(db):
+            db.execute(
+                "UPDATE key_store SET params = ? WHERE key_type = ?;",
+                (json.dumps(params, ensure_ascii=False), "master")
+            )
+
+        self._activate_data_key(root_key, params)
+        return key_version
+
+    def retired_key_versions(self) -> list[int]:
+        """Версии ключа данных, данные которых ещё могут оставаться в хранилище."""
+
+        # во время перешифрования строки переписывает только ReencryptionEngine
+        if self._pending_data_key is not None:
+            return []
+
+        return sorted(self._readable_key_versions - {self._active_key_version})
+
+    def drop_retired_data_keys(self, db) -> None:
+        """
+        Удаляет прежние версии ключа данных, когда данных ими не осталось.
+
+        Вызывается после полного перешифрования (ReencryptionEngine).
+        Корневой ключ остаётся: им обёрнуты версии и слоты.
+        """
+
+        retired = set(self.retired_key_versions())
+
+        if not retired:
+            return
+
+        params = self._load_key_params(db)
+        root = params.get("data_key")
+
+        if not root or "pending_data_key" in params:
+            return
+
+        kept = []
+        dropped_ids = []
+
+        for record in params.get("data_key_versions", []):
+            if self._record_key_version(record) in retired:
+                dropped_ids.append(record.get("key_id"))
+            else:
+                kept.append(record)
+
+        if kept:
+            params["data_key_versions"] = kept
+        else:
+            params.pop("data_key_versions", None)
+
+        if self._record_key_version(root) in retired:
+            root["drained"] = True
+
+        with self._transaction(db):
+            db.execute(
+                "UPDATE key_store SET params = ? WHERE key_type = ?;",
+                (json.dumps(params, ensure_ascii=False), "master")
+            )
+
+            for key_id in dropped_ids:
+                db.execute(
+                    "DELETE FROM settings WHERE setting_key = ?;",
+                    (self.DATA_KEY_USAGE_SETTING_PREFIX + str(key_id),)
+                )
+
+        for version in retired - {self._root_key_version}:
+            self._storage.discard_subkey(self._version_subkey_name(version))
+
+        self._readable_key_versions = self._readable_key_versions - retired
+
+        if self._legacy_key_version in retired:
+            self._legacy_key_version = None
+
+    def _activate_data_key(self, root_key: bytes, params: dict[str, Any]) -> None:
+        """Размещает в KeyStorage все версии ключа данных; активна последняя."""
+
+        root = params["data_key"]
+        root_version = self._record_key_version(root)
+        keys = {root_version: (root.get("key_id"), root_key)}
+
+        for record in params.get("data_key_versions", []):
+            version = self._record_key_version(record)
+            keys[version] = (
+                record.get("key_id"),
+                self._unwrap_data_key(
+                    root_key,
+                    record,
+                    self._version_associated_data(version),
+                ),
+            )
+
+        active_version = max(keys)
+        key_id, active_key = keys[active_version]
+
+        self._storage.save(active_key)
+
+        for version, (_key_id, key) in keys.items():
+            if version != active_version:
+                self._storage.save_subkey(self._version_subkey_name(version), key)
+
+        readable = set(keys)
+
+        if root.get("drained") and root_version != active_version:
+            readable.discard(root_version)
+
+        self._active_key_id = key_id
+        self._active_key_version = active_version
+        self._root_key_version = root_version
+        self._readable_key_versions = frozenset(readable)
+        self._legacy_key_version = (
+            root_version
+            if root.get("derived_from_password") and root_version in readable
+            else None
+        )
+
+    def _load_root_key(self) -> bytes:
+        with self.borrow_key(self._root_key_version) as key:
+            return key.tobytes()
+
+    def _latest_key_version(self, params: dict[str, Any]) -> int:
+        versions = [
+            self._record_key_version(record)
+            for record in params.get("data_key_versions", [])
+        ]
+
+        if "data_key" in params:
+            versions.append(self._record_key_version(params["data_key"]))
+
+        return max(versions, default=self.DEFAULT_KEY_VERSION)
+
+    def _record_key_version(self, record: Any) -> int:
+        try:
+            version = int(record.get("key_version", self.DEFAULT_KEY_VERSION))
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError("Повреждены параметры ключа")
+
+        # номер версии занимает 2 байта в заголовке шифртекста
+        if not 0 < version < 2 ** 16:
+            raise ValueError("Повреждены параметры ключа")
+
+        return version
+
+    def _version_associated_data(self, key_version: int) -> bytes:
+        return self.DATA_KEY_VERSION_ASSOCIATED_DATA + str(key_version).encode("ascii")
+
+    def _version_subkey_name(self, key_version: int) -> str:
+        return f"{self.DATA_KEY_VERSION_SUBKEY}{key_version}"
+
+    # Data key usage accounting
+
+    def record_key_usage(self, count: int = 1, key_id: str | None = None) -> None:
+        """
+        Учитывает count шифрований ключом данных (по умолчанию активным).
+
+        Счётчик копится в памяти и записывается в settings той же
+        транзакцией, что и шифртексты (write_key_usage()), а при
+        блокировке и закрытии EntryManager - через flush_key_usage().
+        """
+
+        key_id = key_id or self._active_key_id
+
+        if not key_id or count <= 0:
+            return
+
+        with self._usage_lock:
+            self._pending_usage[key_id] = self._pending_usage.get(key_id, 0) + count
+
+    def write_key_usage(self, db) -> dict[str, int]:
+        """
+        Прибавляет накопленные счётчики к settings в открытой транзакции db.
+
+        Вызывается перед фиксацией единицы работы с шифртекстами, поэтому
+        отдельного commit не требуется. Возвращает записанные счётчики:
+        если транзакцию затем откатили, их нужно вернуть через
+        restore_key_usage().
+        """
+
+        with self._usage_lock:
+            pending, self._pending_usage = self._pending_usage, {}
+
+        if not pending:
+            return {}
+
+        try:
+            for key_id, count in pending.items():
+                db.execute(
+                    """
+                    INSERT INTO settings (setting_key, setting_value, encrypted)
+                    VALUES (?, ?, 0)
+                    ON CONFLICT(setting_key) DO UPDATE SET setting_value =
+                        CAST(setting_value AS INTEGER) + CAST(excluded.setting_value AS INTEGER);
+                    """,
+                    (self.DATA_KEY_USAGE_SETTING_PREFIX + key_id, count)
+                )
+        except Exception:
+            self.restore_key_usage(pending)
+            raise
+
+        return pending
+
+    def restore_key_usage(self, usage: dict[str, int]) -> None:
+        # счётчики не должны теряться из-за неудачной записи или отката
+        with self._usage_lock:
+            for key_id, count in usage.items():
+                self._pending_usage[key_id] = self._pending_usage.get(key_id, 0) + count
+
+    def flush_key_usage(self, db) -> None:
+        """
+        Записывает накопленные счётчики в отдельной транзакции.
+
+        Для блокировки и закрытия, когда своей единицы работы нет.
+        Внутри открытой транзакции ничего не делает: её ещё можно
+        откатить, счётчики запишет следующая единица работы.
+        """
+
+        if getattr(db, "in_transaction", False):
+            return
+
+        usage: dict[str, int] = {}
+
+        try:
+            with self._transaction(db):
+                usage = self.write_key_usage(db)
+        except Exception:
+            self.restore_key_usage(usage)
+            raise
+
+    def data_key_usage(self, db, key_id: str | None = None) -> int:
+        """Число шифрований ключом данных, включая ещё не записанные."""
+
+        key_id = key_id or self._active_key_id
+
+        if not key_id:
+            return 0
+
+        row = db.execute(
+            "SELECT setting_value FROM settings WHERE setting_key = ?;",
+            (self.DATA_KEY_USAGE_SETTING_PREFIX + key_id,)
+        ).fetchone()
+
+        with self._usage_lock:
+            pending = self._pending_usage.get(key_id, 0)
+
+        return (int(row[0]) if row is not None else 0) + pending
+
+    def needs_data_key_rotation(self, db) -> bool:
+        """True, если активный ключ данных достиг порога использования."""
+
+        return self.data_key_usage(db) >= self.data_key_rotation_threshold
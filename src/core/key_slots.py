@@ -0,0 +1,486 @@
+from __future__ import annotations
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+from src.core.crypto.key_derivation import MasterKeys, PBKDF2Settings
+
+@dataclass(frozen=True)
+class KeySlot:
+    slot_id: str
+    kind: str
+    hint: str
+    created_at: str | None
+
+class KeySlotsMixin:
+    # Слоты ключей: кроме строки "master" в key_store могут быть строки
+    # "slot:<id>" с собственными солью, проверочным значением, параметрами
+    # KDF и обёрткой того же ключа данных (второй пароль, ключ
+    # восстановления, ключ администратора). Разблокировка по слоту
+    # выполняет KDF только этого слота. Ключ восстановления случайный,
+    # поэтому его слот использует HKDF без растяжения (RECOVERY_KDF_SCHEME).
+    # Полная ротация ключа данных удаляет дополнительные слоты и быструю
+    # разблокировку: их KEK неизвестны, переобернуть новый ключ нельзя.
+    # Поэтому begin_data_key_rotation() без drop_key_slots=True отказывает
+    # (KeySlotsError), если такие слоты есть.
+    #
+    # Быстрая разблокировка по PIN (строка "quick_unlock"): после входа
+    # по мастер-паролю ключ данных оборачивается ключом, который зависит
+    # и от случайного секрета в хранилище ключей ОС (keyring), и от PIN
+    # с дешёвым PBKDF2. Без секрета из keyring перебор PIN по файлу базы
+    # невозможен. Счётчик неудачных попыток увеличивается до проверки;
+    # после QUICK_UNLOCK_MAX_ATTEMPTS ошибок или по истечении срока
+    # quick_unlock_max_age_seconds быстрая разблокировка отключается и
+    # нужен мастер-пароль.
+    #
+    # Примесь KeyManager: использует его KDF, обёртку ключа данных,
+    # хранилище ключей ОС (_os_keychain) и транзакции (_transaction).
+
+    RECOVERY_KDF_SCHEME = "hkdf_sha256"
+    MASTER_SLOT_ID = "master"
+    SLOT_KEY_TYPE_PREFIX = "slot:"
+    SLOT_KINDS = ("password", "recovery", "escrow")
+    SLOT_HINT_MAX_LENGTH = 64
+    RECOVERY_KEY_SIZE = 20
+    QUICK_UNLOCK_KEY_TYPE = "quick_unlock"
+    QUICK_UNLOCK_KDF_SCHEME = "pbkdf2_sha256_keychain"
+    QUICK_UNLOCK_PIN_ITERATIONS = 20_000
+    QUICK_UNLOCK_PIN_MIN_LENGTH = 4
+    QUICK_UNLOCK_MAX_ATTEMPTS = 3
+    QUICK_UNLOCK_MAX_AGE_SECONDS = 8 * 3600
+    QUICK_UNLOCK_SECRET_SIZE = 32
+
+    # Key slots
+
+    def list_key_slots(self, db) -> list[KeySlot]:
+        """Слоты хранилища с подсказками; секреты не раскрываются."""
+
+        rows = db.execute(
+            "SELECT key_type, params, created_at FROM key_store ORDER BY id;"
+        ).fetchall()
+        slots = []
+
+        for key_type, params, created_at in rows:
+            if key_type == "master":
+                slots.append(KeySlot(self.MASTER_SLOT_ID, "master", "", created_at))
+            elif key_type.startswith(self.SLOT_KEY_TYPE_PREFIX):
+                slot = self._parse_params(params).get("slot", {})
+                slots.append(
+                    KeySlot(
+                        key_type[len(self.SLOT_KEY_TYPE_PREFIX):],
+                        slot.get("kind", "password"),
+                        slot.get("hint", ""),
+                        created_at,
+                    )
+                )
+
+        return slots
+
+    def _list_bound_slots(self, db) -> list[str]:
+        """Слоты, кроме мастер-пароля, которые открывают текущий ключ данных."""
+
+        rows = db.execute(
+            "SELECT key_type FROM key_store WHERE key_type LIKE ? OR key_type = ? ORDER BY id;",
+            (self.SLOT_KEY_TYPE_PREFIX + "%", self.QUICK_UNLOCK_KEY_TYPE)
+        ).fetchall()
+
+        return [
+            key_type[len(self.SLOT_KEY_TYPE_PREFIX):]
+            if key_type.startswith(self.SLOT_KEY_TYPE_PREFIX)
+            else key_type
+            for (key_type,) in rows
+        ]
+
+    def add_key_slot(
+            self,
+            db,
+            secret: str,
+            kind: str = "password",
+            hint: str = "",
+    ) -> KeySlot:
+        """
+        Добавляет слот с ещё одним паролем или ключом, который
+        открывает тот же ключ данных. Хранилище должно быть разблокировано.
+        """
+
+        if kind not in self.SLOT_KINDS:
+            raise ValueError("Неизвестный тип слота")
+
+        if not secret:
+            raise ValueError("Секрет слота не может быть пустым")
+
+        if kind == "recovery":
+            salt = self.generate_salt()
+            kdf = {"scheme": self.RECOVERY_KDF_SCHEME, "version": 1}
+            keys = self._derive_slot_keys(secret, salt, kdf)
+            verifier = self._encode_verifier(keys.auth_key)
+            kek = keys.encryption_key
+        else:
+            salt, verifier, kek, kdf = self._new_credentials(secret)
+
+        return self._store_key_slot(db, kind, hint, salt, verifier, kek, kdf)
+
+    def add_recovery_key(self, db, hint: str = "") -> tuple[KeySlot, str]:
+        """Создаёт ключ восстановления для печати и слот для него."""
+
+        recovery_key = self.generate_recovery_key()
+        slot = self.add_key_slot(db, recovery_key, kind="recovery", hint=hint)
+        return slot, recovery_key
+
+    def generate_recovery_key(self) -> str:
+        encoded = base64.b32encode(os.urandom(self.RECOVERY_KEY_SIZE)).decode("ascii")
+        return "-".join(encoded[i:i + 4] for i in range(0, len(encoded), 4))
+
+    def remove_key_slot(self, db, slot_id: str) -> None:
+        if slot_id == self.MASTER_SLOT_ID:
+            raise ValueError("Слот мастер-пароля нельзя удалить")
+
+        with self._transaction(db):
+            cursor = db.execute(
+                "DELETE FROM key_store WHERE key_type = ?;",
+                (self.SLOT_KEY_TYPE_PREFIX + slot_id,)
+            )
+
+        if cursor.rowcount == 0:
+            raise ValueError("Слот ключа не найден")
+
+    def unlock_with_slot(self, db, slot_id: str, secret: str) -> None:
+        """Разблокирует хранилище секретом одного слота, выполняя только его KDF."""
+
+        if slot_id == self.MASTER_SLOT_ID:
+            self.unlock_with_password(db, secret)
+            return
+
+        row = db.execute(
+            "SELECT salt, hash, params FROM key_store WHERE key_type = ?;",
+            (self.SLOT_KEY_TYPE_PREFIX + slot_id,)
+        ).fetchone()
+
+        if row is None:
+            raise ValueError("Слот ключа не найден")
+
+        # ожидающий ключ ротации обёрнут только KEK мастер-пароля
+        if "pending_data_key" in self._load_key_params(db):
+            raise RuntimeError("Перешифрование хранилища не завершено.")
+
+        salt, stored_hash, params = row[0], row[1], self._parse_params(row[2])
+
+        try:
+            kdf = params["kdf"]
+            record = params["data_key"]
+        except KeyError:
+            raise ValueError("Повреждены параметры ключа")
+
+        keys = self._derive_slot_keys(secret, salt, kdf)
+
+        if not hmac.compare_digest(self._encode_verifier(keys.auth_key), stored_hash):
+            raise ValueError("Неверный ключ слота")
+
+        data_key = self._unwrap_data_key(keys.encryption_key, record)
+
+        self._pending_data_key = None
+        self._pending_key_version = None
+        self._active_salt = self._load_master_salt(db)
+        self._activate_data_key(data_key, self._load_key_params(db))
+
+    def _store_key_slot(
+            self,
+            db,
+            kind: str,
+            hint: str,
+            salt: bytes,
+            verifier: str,
+            kek: bytes,
+            kdf: dict[str, Any],
+    ) -> KeySlot:
+        hint = hint.strip()
+
+        if len(hint) > self.SLOT_HINT_MAX_LENGTH:
+            raise ValueError("Подсказка слота слишком длинная")
+
+        master = self._load_key_params(db)
+
+        if "pending_data_key" in master:
+            raise RuntimeError("Перешифрование хранилища не завершено.")
+
+        slot_id = uuid.uuid4().hex[:12]
+
+        master_record = master.get("data_key", {})
+
+        # слот оборачивает корневой ключ: им открываются все версии
+        with self.borrow_key(self._root_key_version) as data_key:
+            record = self._rewrap_data_key(kek, data_key, master_record)
+
+        params = {
+            "version": self.KEY_PARAMS_VERSION,
+            "kdf": kdf,
+            "data_key": record,
+            "slot": {"kind": kind, "hint": hint},
+        }
+
+        with self._transaction(db):
+            db.execute(
+                """
+                INSERT INTO key_store (key_type, salt, hash, params)
+                VALUES (?, ?, ?, ?);
+                """,
+                (
+                    self.SLOT_KEY_TYPE_PREFIX + slot_id,
+                    salt,
+                    verifier,
+                    json.dumps(params, ensure_ascii=False),
+                )
+            )
+
+        row = db.execute(
+            "SELECT created_at FROM key_store WHERE key_type = ?;",
+            (self.SLOT_KEY_TYPE_PREFIX + slot_id,)
+        ).fetchone()
+
+        return KeySlot(slot_id, kind, hint, row[0] if row else None)
+
+    def _derive_slot_keys(self, secret: str, salt: bytes, kdf: Any) -> MasterKeys:
+        if isinstance(kdf, dict) and kdf.get("scheme") == self.RECOVERY_KDF_SCHEME:
+            # ключ восстановления вводится с дефисами и в любом регистре
+            normalized = "".join(secret.split()).replace("-", "").upper()
+            secret_key = hmac.new(salt, normalized.encode("utf-8"), hashlib.sha256).digest()
+            return self._kdf.split_master_secret(secret_key)
+
+        return self._derive_master_keys(secret, salt, kdf)
+
+    # Quick unlock
+
+    def enable_quick_unlock(self, db, pin: str) -> None:
+        """
+        Включает быструю разблокировку по PIN для текущего ключа данных.
+
+        Вызывается после входа по мастер-паролю; повторный вызов заменяет
+        PIN, сбрасывает счётчик попыток и срок действия.
+        """
+
+        if len(pin) < self.QUICK_UNLOCK_PIN_MIN_LENGTH:
+            raise ValueError("PIN слишком короткий")
+
+        if not self._os_keychain.is_available():
+            raise RuntimeError("Хранилище ключей ОС недоступно.")
+
+        master = self._load_key_params(db)
+
+        if "pending_data_key" in master:
+            raise RuntimeError("Перешифрование хранилища не завершено.")
+
+        self.disable_quick_unlock(db)
+
+        keychain_secret = os.urandom(self.QUICK_UNLOCK_SECRET_SIZE)
+        entry = f"quick-unlock:{uuid.uuid4().hex}"
+
+        if not self._os_keychain.save_secret(
+                entry,
+                base64.b64encode(keychain_secret).decode("ascii"),
+        ):
+            raise RuntimeError("Не удалось сохранить секрет в хранилище ключей ОС.")
+
+        salt = self.generate_salt()
+        kdf = {
+            "scheme": self.QUICK_UNLOCK_KDF_SCHEME,
+            "version": 1,
+            "iterations": self.QUICK_UNLOCK_PIN_ITERATIONS,
+        }
+        keys = self._derive_quick_unlock_keys(pin, salt, kdf, keychain_secret)
+        master_record = master.get("data_key", {})
+
+        with self.borrow_key(self._root_key_version) as data_key:
+            record = self._rewrap_data_key(keys.encryption_key, data_key, master_record)
+
+        params = {
+            "version": self.KEY_PARAMS_VERSION,
+            "kdf": kdf,
+            "data_key": record,
+            "keychain_entry": entry,
+            "created_at": time.time(),
+            "failed_attempts": 0,
+        }
+
+        try:
+            with self._transaction(db):
+                db.execute(
+                    """
+                    INSERT INTO key_store (key_type, salt, hash, params)
+                    VALUES (?, ?, ?, ?);
+                    """,
+                    (
+                        self.QUICK_UNLOCK_KEY_TYPE,
+                        salt,
+                        self._encode_verifier(keys.auth_key),
+                        json.dumps(params, ensure_ascii=False),
+                    )
+                )
+        except Exception:
+            self._os_keychain.delete_secret(entry)
+            raise
+
+    def disable_quick_unlock(self, db) -> None:
+        with self._transaction(db):
+            params = self._delete_quick_unlock_row(db)
+
+        self._delete_quick_unlock_secret(params)
+
+    def is_quick_unlock_available(self, db) -> bool:
+        """Можно ли сейчас разблокировать хранилище PIN без мастер-пароля."""
+
+        try:
+            row = self._load_quick_unlock(db)
+        except ValueError:
+            return False
+
+        if row is None or self._quick_unlock_expired(row[2]):
+            return False
+
+        if "pending_data_key" in self._load_key_params(db):
+            return False
+
+        return self._load_quick_unlock_secret(row[2]) is not None
+
+    def unlock_with_pin(self, db, pin: str) -> None:
+        """
+        Разблокирует хранилище PIN быстрой разблокировки.
+
+        ValueError - неверный PIN, попытки ещё есть. RuntimeError -
+        быстрая разблокировка недоступна (выключена, истекла, исчерпаны
+        попытки или нет секрета в keyring), нужен мастер-пароль.
+        """
+
+        row = self._load_quick_unlock(db)
+
+        if row is None:
+            raise RuntimeError("Быстрая разблокировка не включена.")
+
+        salt, stored_hash, params = row
+
+        if self._quick_unlock_expired(params):
+            self.disable_quick_unlock(db)
+            raise RuntimeError("Срок быстрой разблокировки истёк, введите мастер-пароль.")
+
+        if "pending_data_key" in self._load_key_params(db):
+            raise RuntimeError("Перешифрование хранилища не завершено.")
+
+        keychain_secret = self._load_quick_unlock_secret(params)
+
+        if keychain_secret is None:
+            self.disable_quick_unlock(db)
+            raise RuntimeError("Секрет быстрой разблокировки не найден в хранилище ключей ОС.")
+
+        # попытка засчитывается до проверки: прерванная проверка
+        # не даёт лишней попытки
+        attempts = int(params.get("failed_attempts", 0)) + 1
+        self._update_quick_unlock_attempts(db, params, attempts)
+
+        keys = self._derive_quick_unlock_keys(pin, salt, params["kdf"], keychain_secret)
+
+        if not hmac.compare_digest(self._encode_verifier(keys.auth_key), stored_hash):
+            if attempts >= self.quick_unlock_max_attempts:
+                self.disable_quick_unlock(db)
+                raise RuntimeError("Превышено число попыток PIN, введите мастер-пароль.")
+
+            raise ValueError("Неверный PIN")
+
+        data_key = self._unwrap_data_key(keys.encryption_key, params["data_key"])
+        self._update_quick_unlock_attempts(db, params, 0)
+
+        self._pending_data_key = None
+        self._pending_key_version = None
+        self._active_salt = self._load_master_salt(db)
+        self._activate_data_key(data_key, self._load_key_params(db))
+
+    def _derive_quick_unlock_keys(
+            self,
+            pin: str,
+            salt: bytes,
+            kdf: Any,
+            keychain_secret: bytes,
+    ) -> MasterKeys:
+        try:
+            if kdf["scheme"] != self.QUICK_UNLOCK_KDF_SCHEME or kdf["version"] != 1:
+                raise ValueError("Неподдерживаемая схема KDF")
+
+            settings = PBKDF2Settings(iterations=int(kdf["iterations"]))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Повреждены параметры ключа")
+
+        pin_key = self._kdf.derive_encryption_key(pin, salt, settings)
+        secret = hmac.new(keychain_secret, pin_key, hashlib.sha256).digest()
+        return self._kdf.split_master_secret(secret)
+
+    def _load_quick_unlock(self, db) -> tuple[bytes, str, dict[str, Any]] | None:
+        row = db.execute(
+            "SELECT salt, hash, params FROM key_store WHERE key_type = ?;",
+            (self.QUICK_UNLOCK_KEY_TYPE,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        params = self._parse_params(row[2])
+
+        if "kdf" not in params or "data_key" not in params:
+            raise ValueError("Повреждены параметры ключа")
+
+        return row[0], row[1], params
+
+    def _load_quick_unlock_secret(self, params: dict[str, Any]) -> bytes | None:
+        entry = params.get("keychain_entry")
+        value = self._os_keychain.load_secret(entry) if entry else None
+
+        if value is None:
+            return None
+
+        try:
+            return base64.b64decode(value)
+        except ValueError:
+            return None
+
+    def _quick_unlock_expired(self, params: dict[str, Any]) -> bool:
+        try:
+            created_at = float(params["created_at"])
+        except (KeyError, TypeError, ValueError):
+            return True
+
+        return time.time() - created_at > self.quick_unlock_max_age_seconds
+
+    def _update_quick_unlock_attempts(self, db, params: dict[str, Any], attempts: int) -> None:
+        params["failed_attempts"] = attempts
+
+        with self._transaction(db):
+            db.execute(
+                "UPDATE key_store SET params = ? WHERE key_type = ?;",
+                (json.dumps(params, ensure_ascii=False), self.QUICK_UNLOCK_KEY_TYPE)
+            )
+
+    def _delete_quick_unlock_row(self, db) -> dict[str, Any] | None:
+        row = db.execute(
+            "SELECT params FROM key_store WHERE key_type = ?;",
+            (self.QUICK_UNLOCK_KEY_TYPE,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        db.execute(
+            "DELETE FROM key_store WHERE key_type = ?;",
+            (self.QUICK_UNLOCK_KEY_TYPE,)
+        )
+
+        try:
+            return self._parse_params(row[0])
+        except ValueError:
+            return None
+
+    def _delete_quick_unlock_secret(self, params: dict[str, Any] | None) -> None:
+        if params and params.get("keychain_entry"):
+            self._os_keychain.delete_secret(params["keychain_entry"])
@@ -1,13 +1,21 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Any, Optional
 
 # безопасный шаблон
 
 class OSKeychain:
     SERVICE_NAME = "CryptoSafe Manager"
 
-    def __init__(self) -> None:
+    def __init__(self, backend: Any | None = None) -> None:
+        # backend - объект с интерфейсом keyring (set_password,
+        # get_password, delete_password), например бэкенд в памяти для
+        # тестов; по умолчанию используется системный keyring
+        if backend is not None:
+            self._keyring = backend
+            self._available = True
+            return
+
         try:
             import keyring
 
@@ -1,9 +1,15 @@
+from src.core.vault.attachment_manager import AttachmentManager
 from src.core.vault.entry_manager import EntryManager
+from src.core.vault.entry_cache import DecryptedEntryCache
 from src.core.vault.encryption_service import AESGCMEncryptionService
 from src.core.vault.password_generator import PasswordGenerator
+from src.core.vault.reencryption import ReencryptionEngine
 
 __all__ = [
+    "AttachmentManager",
     "EntryManager",
+    "DecryptedEntryCache",
     "AESGCMEncryptionService",
     "PasswordGenerator",
+    "ReencryptionEngine",
 ]
\ No newline at end of file
@@ -0,0 +1,624 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Iterator
+
+from src.core.crypto.key_derivation import derive_subkey
+from src.core.events import EventBus, now_utc
+from src.core.key_manager import KeyManager
+from src.core.vault.encryption_service import (
+    AESGCMEncryptionService,
+    VaultEncryptionError,
+)
+
+class AttachmentManagerError(Exception):
+    """Ошибка при выполнении операции с вложением записи."""
+
+@dataclass
+class AttachmentAdded:
+    name: str
+    timestamp: str
+    entry_id: str
+    attachment_id: str
+
+@dataclass
+class AttachmentDeleted:
+    name: str
+    timestamp: str
+    entry_id: str
+    attachment_id: str
+
+class AttachmentManager:
+    """
+    Хранение файлов, прикреплённых к записям хранилища.
+
+    Файл читается и пишется кусками фиксированного размера, поэтому
+    расход памяти не зависит от размера файла.
+
+    Каждый уникальный кусок хранится один раз в attachment_blobs:
+    он шифруется AES-256-GCM и адресуется ключевым хешем (HMAC-SHA256)
+    своего открытого текста. Повторное прикрепление того же файла
+    добавляет только ссылки на уже сохранённые куски.
+
+    Порядок кусков файла защищён потоковым AEAD: для каждого куска
+    хеш шифруется с nonce из префикса файла и номера куска, а номер
+    и флаг последнего куска входят в associated_data.
+    """
+
+    CONTENT_HASH_PURPOSE = "vault-attachment-content-hash"
+    BLOB_AAD_LABEL = b"attachment-blob|"
+    NAME_AAD_LABEL = b"|name"
+
+    def __init__(
+        self,
+        db,
+        key_manager: KeyManager,
+        event_bus: EventBus | None = None,
+        encryption_service: AESGCMEncryptionService | None = None,
+        chunk_size: int | None = None,
+    ) -> None:
+        self.db = db
+        self.key_manager = key_manager
+        self.event_bus = event_bus
+
+        self.encryption_service = (
+            encryption_service
+            if encryption_service is not None
+            else AESGCMEncryptionService()
+        )
+
+        self.chunk_size = chunk_size or self.encryption_service.STREAM_CHUNK_SIZE
+
+        if self.chunk_size < 1:
+            raise ValueError("Chunk size must be positive.")
+
+    def add_attachment(
+        self,
+        entry_id: str,
+        source: BinaryIO,
+        filename: str,
+    ) -> dict[str, Any]:
+        """
+        Прикрепляет файл к записи.
+
+        source читается до конца кусками по chunk_size байт.
+        Все изменения фиксируются одним commit.
+        """
+
+        if not isinstance(filename, str) or not filename.strip():
+            raise AttachmentManagerError("Attachment filename is required.")
+
+        attachment_id = str(uuid.uuid4())
+        created_at = self._utc_now()
+        stream_nonce = self.encryption_service.new_stream_nonce()
+        hash_key = self._content_hash_key()
+        ref_associated_data = attachment_id.encode("utf-8")
+
+        encrypted_name = self.encryption_service.encrypt(
+            filename.encode("utf-8"),
+            self.key_manager,
+            associated_data=ref_associated_data + self.NAME_AAD_LABEL,
+        )
+
+        size = 0
+        chunk_count = 0
+
+        try:
+            with self._transaction():
+                if not self._entry_exists(entry_id):
+                    raise AttachmentManagerError("Vault entry does not exist.")
+
+                self.db.execute(
+                    """
+                    INSERT INTO attachments (
+                        id,
+                        entry_id,
+                        encrypted_name,
+                        size,
+                        chunk_size,
+                        chunk_count,
+                        stream_nonce,
+                        created_at
+                    )
+                    VALUES (?, ?, ?, 0, ?, 0, ?, ?);
+                    """,
+                    (
+                        attachment_id,
+                        entry_id,
+                        encrypted_name,
+                        self.chunk_size,
+                        stream_nonce,
+                        created_at,
+                    ),
+                )
+
+                for index, final, data in self.encryption_service.iter_stream_chunks(
+                        source,
+                        self.chunk_size,
+                ):
+                    chunk_hash = hmac.new(hash_key, data, hashlib.sha256).digest()
+
+                    self._store_blob(chunk_hash, data)
+
+                    encrypted_ref = self.encryption_service.encrypt_stream_chunk(
+                        chunk_hash,
+                        self.key_manager,
+                        stream_nonce,
+                        index,
+                        final,
+                        associated_data=ref_associated_data,
+                    )
+
+                    self.db.execute(
+                        """
+                        INSERT INTO attachment_chunks (
+                            attachment_id,
+                            chunk_index,
+                            chunk_hash,
+                            encrypted_ref
+                        )
+                        VALUES (?, ?, ?, ?);
+                        """,
+                        (attachment_id, index, chunk_hash, encrypted_ref),
+                    )
+
+                    size += len(data)
+                    chunk_count += 1
+
+                self.db.execute(
+                    """
+                    UPDATE attachments
+                    SET size = ?, chunk_count = ?
+                    WHERE id = ?;
+                    """,
+                    (size, chunk_count, attachment_id),
+                )
+
+        except AttachmentManagerError:
+            raise
+        except Exception as exc:
+            raise AttachmentManagerError("Failed to add attachment.") from exc
+
+        self._publish_event(
+            AttachmentAdded(
+                name="AttachmentAdded",
+                timestamp=now_utc(),
+                entry_id=entry_id,
+                attachment_id=attachment_id,
+            )
+        )
+
+        return {
+            "id": attachment_id,
+            "entry_id": entry_id,
+            "filename": filename,
+            "size": size,
+            "created_at": created_at,
+        }
+
+    def read_attachment(self, attachment_id: str, destination: BinaryIO) -> int:
+        """
+        Расшифровывает вложение в destination и возвращает число байт.
+
+        Каждый кусок проверяется перед записью. Если файл повреждён,
+        обрезан или куски переставлены, выбрасывается AttachmentManagerError;
+        уже записанные в destination куски при этом не удаляются.
+        """
+
+        row = self.db.execute(
+            """
+            SELECT stream_nonce, chunk_count, encrypted_name
+            FROM attachments
+            WHERE id = ?;
+            """,
+            (attachment_id,),
+        ).fetchone()
+
+        if row is None:
+            raise AttachmentManagerError("Attachment does not exist.")
+
+        stream_nonce = row[0]
+        chunk_count = row[1]
+        ref_associated_data = attachment_id.encode("utf-8")
+        # хеши кусков считаются ключом той версии, которой записано вложение
+        hash_key = self._content_hash_key(
+            self.encryption_service.blob_key_version(row[2])
+        )
+
+        cursor = self.db.execute(
+            """
+            SELECT c.chunk_index, c.chunk_hash, c.encrypted_ref, b.encrypted_data
+            FROM attachment_chunks c
+            JOIN attachment_blobs b ON b.chunk_hash = c.chunk_hash
+            WHERE c.attachment_id = ?
+            ORDER BY c.chunk_index;
+            """,
+            (attachment_id,),
+        )
+
+        expected_index = 0
+        total = 0
+
+        try:
+            # курсор читается построчно, в памяти только текущий кусок
+            for chunk_index, chunk_hash, encrypted_ref, encrypted_data in cursor:
+                if chunk_index != expected_index:
+                    raise AttachmentManagerError("Attachment chunks are missing.")
+
+                chunk_hash = bytes(chunk_hash)
+
+                ref = self.encryption_service.decrypt_stream_chunk(
+                    encrypted_ref,
+                    self.key_manager,
+                    stream_nonce,
+                    chunk_index,
+                    chunk_index == chunk_count - 1,
+                    associated_data=ref_associated_data,
+                )
+
+                data = self.encryption_service.decrypt(
+                    encrypted_data,
+                    self.key_manager,
+                    associated_data=self.BLOB_AAD_LABEL + chunk_hash,
+                )
+
+                actual_hash = hmac.new(hash_key, data, hashlib.sha256).digest()
+
+                if not (
+                    hmac.compare_digest(ref, chunk_hash)
+                    and hmac.compare_digest(actual_hash, chunk_hash)
+                ):
+                    raise AttachmentManagerError("Attachment chunk is corrupted.")
+
+                destination.write(data)
+                total += len(data)
+                expected_index += 1
+
+        except VaultEncryptionError as exc:
+            raise AttachmentManagerError("Failed to decrypt attachment.") from exc
+
+        if expected_index != chunk_count:
+            raise AttachmentManagerError("Attachment chunks are missing.")
+
+        return total
+
+    def list_attachments(self, entry_id: str) -> list[dict[str, Any]]:
+        cursor = self.db.execute(
+            """
+            SELECT id, encrypted_name, size, created_at
+            FROM attachments
+            WHERE entry_id = ?
+            ORDER BY created_at, id;
+            """,
+            (entry_id,),
+        )
+
+        attachments = []
+
+        for attachment_id, encrypted_name, size, created_at in cursor.fetchall():
+            try:
+                filename = self.encryption_service.decrypt(
+                    encrypted_name,
+                    self.key_manager,
+                    associated_data=attachment_id.encode("utf-8") + self.NAME_AAD_LABEL,
+                ).decode("utf-8")
+            except (VaultEncryptionError, UnicodeDecodeError) as exc:
+                raise AttachmentManagerError(
+                    "Failed to decrypt attachment name."
+                ) from exc
+
+            attachments.append(
+                {
+                    "id": attachment_id,
+                    "entry_id": entry_id,
+                    "filename": filename,
+                    "size": size,
+                    "created_at": created_at,
+                }
+            )
+
+        return attachments
+
+    def delete_attachment(self, attachment_id: str) -> bool:
+        """
+        Удаляет вложение.
+
+        Куски, на которые больше не ссылается ни одно вложение,
+        удаляются вместе с ним.
+        """
+
+        row = self.db.execute(
+            "SELECT entry_id FROM attachments WHERE id = ?;",
+            (attachment_id,),
+        ).fetchone()
+
+        if row is None:
+            return False
+
+        entry_id = row[0]
+
+        try:
+            with self._transaction():
+                self.db.execute(
+                    """
+                    UPDATE attachment_blobs
+                    SET ref_count = ref_count - (
+                        SELECT COUNT(*)
+                        FROM attachment_chunks c
+                        WHERE c.attachment_id = ?
+                          AND c.chunk_hash = attachment_blobs.chunk_hash
+                    )
+                    WHERE chunk_hash IN (
+                        SELECT chunk_hash
+                        FROM attachment_chunks
+                        WHERE attachment_id = ?
+                    );
+                    """,
+                    (attachment_id, attachment_id),
+                )
+
+                self.db.execute(
+                    "DELETE FROM attachment_chunks WHERE attachment_id = ?;",
+                    (attachment_id,),
+                )
+
+                self.db.execute(
+                    "DELETE FROM attachments WHERE id = ?;",
+                    (attachment_id,),
+                )
+
+                self.db.execute(
+                    "DELETE FROM attachment_blobs WHERE ref_count <= 0;"
+                )
+
+        except Exception as exc:
+            raise AttachmentManagerError("Failed to delete attachment.") from exc
+
+        self._publish_event(
+            AttachmentDeleted(
+                name="AttachmentDeleted",
+                timestamp=now_utc(),
+                entry_id=entry_id,
+                attachment_id=attachment_id,
+            )
+        )
+
+        return True
+
+    def rekey_attachment(
+        self,
+        attachment_id: str,
+        target: "AttachmentManager",
+    ) -> None:
+        """
+        Перешифровывает вложение ключом и шифром менеджера target.
+
+        Каждый кусок проверяется текущим ключом, получает новый хеш
+        под ключом target и сохраняется в target; старые куски удаляются,
+        когда на них не остаётся ссылок. Вызывающий код отвечает за
+        транзакцию: вложение должно перешифровываться целиком.
+        """
+
+        row = self.db.execute(
+            """
+            SELECT encrypted_name, stream_nonce, chunk_count
+            FROM attachments
+            WHERE id = ?;
+            """,
+            (attachment_id,),
+        ).fetchone()
+
+        if row is None:
+            raise AttachmentManagerError("Attachment does not exist.")
+
+        encrypted_name, stream_nonce, chunk_count = row
+        ref_associated_data = attachment_id.encode("utf-8")
+        hash_key = self._content_hash_key(
+            self.encryption_service.blob_key_version(encrypted_name)
+        )
+        target_hash_key = target._content_hash_key()
+
+        # список хешей одного вложения небольшой: 32 байта на кусок
+        chunks = self.db.execute(
+            """
+            SELECT chunk_index, chunk_hash, encrypted_ref
+            FROM attachment_chunks
+            WHERE attachment_id = ?
+            ORDER BY chunk_index;
+            """,
+            (attachment_id,),
+        ).fetchall()
+
+        if len(chunks) != chunk_count:
+            raise AttachmentManagerError("Attachment chunks are missing.")
+
+        try:
+            name = self.encryption_service.decrypt(
+                encrypted_name,
+                self.key_manager,
+                associated_data=ref_associated_data + self.NAME_AAD_LABEL,
+            )
+
+            for expected_index, (chunk_index, chunk_hash, encrypted_ref) in enumerate(chunks):
+                if chunk_index != expected_index:
+                    raise AttachmentManagerError("Attachment chunks are missing.")
+
+                chunk_hash = bytes(chunk_hash)
+                final = chunk_index == chunk_count - 1
+
+                ref = self.encryption_service.decrypt_stream_chunk(
+                    encrypted_ref,
+                    self.key_manager,
+                    stream_nonce,
+                    chunk_index,
+                    final,
+                    associated_data=ref_associated_data,
+                )
+
+                blob_row = self.db.execute(
+                    "SELECT encrypted_data FROM attachment_blobs WHERE chunk_hash = ?;",
+                    (chunk_hash,),
+                ).fetchone()
+
+                if blob_row is None:
+                    raise AttachmentManagerError("Attachment chunk is missing.")
+
+                data = self.encryption_service.decrypt(
+                    blob_row[0],
+                    self.key_manager,
+                    associated_data=self.BLOB_AAD_LABEL + chunk_hash,
+                )
+
+                actual_hash = hmac.new(hash_key, data, hashlib.sha256).digest()
+
+                if not (
+                    hmac.compare_digest(ref, chunk_hash)
+                    and hmac.compare_digest(actual_hash, chunk_hash)
+                ):
+                    raise AttachmentManagerError("Attachment chunk is corrupted.")
+
+                new_hash = hmac.new(target_hash_key, data, hashlib.sha256).digest()
+                target._store_blob(new_hash, data)
+
+                self.db.execute(
+                    """
+                    UPDATE attachment_blobs
+                    SET ref_count = ref_count - 1
+                    WHERE chunk_hash = ?;
+                    """,
+                    (chunk_hash,),
+                )
+
+                self.db.execute(
+                    """
+                    UPDATE attachment_chunks
+                    SET chunk_hash = ?, encrypted_ref = ?
+                    WHERE attachment_id = ? AND chunk_index = ?;
+                    """,
+                    (
+                        new_hash,
+                        target.encryption_service.encrypt_stream_chunk(
+                            new_hash,
+                            target.key_manager,
+                            stream_nonce,
+                            chunk_index,
+                            final,
+                            associated_data=ref_associated_data,
+                        ),
+                        attachment_id,
+                        chunk_index,
+                    ),
+                )
+
+            self.db.execute(
+                "UPDATE attachments SET encrypted_name = ? WHERE id = ?;",
+                (
+                    target.encryption_service.encrypt(
+                        name,
+                        target.key_manager,
+                        associated_data=ref_associated_data + self.NAME_AAD_LABEL,
+                    ),
+                    attachment_id,
+                ),
+            )
+
+            self.db.execute("DELETE FROM attachment_blobs WHERE ref_count <= 0;")
+
+        except VaultEncryptionError as exc:
+            raise AttachmentManagerError("Failed to decrypt attachment.") from exc
+
+    def _store_blob(self, chunk_hash: bytes, data: bytes) -> None:
+        cursor = self.db.execute(
+            """
+            UPDATE attachment_blobs
+            SET ref_count = ref_count + 1
+            WHERE chunk_hash = ?;
+            """,
+            (chunk_hash,),
+        )
+
+        # кусок уже сохранён другим вложением - достаточно ссылки
+        if cursor.rowcount:
+            return
+
+        encrypted_data = self.encryption_service.encrypt(
+            data,
+            self.key_manager,
+            associated_data=self.BLOB_AAD_LABEL + chunk_hash,
+        )
+
+        self.db.execute(
+            """
+            INSERT INTO attachment_blobs (chunk_hash, encrypted_data, ref_count)
+            VALUES (?, ?, 1);
+            """,
+            (chunk_hash, encrypted_data),
+        )
+
+    def _content_hash_key(self, key_version: int | None = None) -> bytes:
+        # отдельный ключ для хеша, чтобы хеш куска не раскрывал его содержимое
+        # перебором и не совпадал между хранилищами с разными ключами;
+        # key_version - версия ключа данных вложения, записанного до ротации
+        if hasattr(self.key_manager, "get_subkey"):
+            return self.key_manager.get_subkey(self.CONTENT_HASH_PURPOSE, key_version)
+
+        return derive_subkey(self.key_manager.get_active_key(), self.CONTENT_HASH_PURPOSE)
+
+    def _entry_exists(self, entry_id: str) -> bool:
+        row = self.db.execute(
+            "SELECT 1 FROM vault_entries WHERE id = ?;",
+            (entry_id,),
+        ).fetchone()
+
+        return row is not None
+
+    def _publish_event(self, event: Any) -> None:
+        if self.event_bus is not None:
+            self.event_bus.publish(event)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # счётчик шифрований ключом пишется в том же commit, что и шифртексты
+        usage: dict[str, int] = {}
+
+        if hasattr(self.db, "transaction"):
+            outermost = not getattr(self.db, "in_transaction", False)
+
+            try:
+                with self.db.transaction():
+                    yield
+
+                    if outermost:
+                        usage = self._write_key_usage()
+            except BaseException:
+                self._restore_key_usage(usage)
+                raise
+
+            return
+
+        try:
+            yield
+            usage = self._write_key_usage()
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            self._restore_key_usage(usage)
+            raise
+
+    def _write_key_usage(self) -> dict[str, int]:
+        if hasattr(self.key_manager, "write_key_usage"):
+            return self.key_manager.write_key_usage(self.db)
+
+        return {}
+
+    def _restore_key_usage(self, usage: dict[str, int]) -> None:
+        if usage:
+            self.key_manager.restore_key_usage(usage)
+
+    def _utc_now(self) -> str:
+        return datetime.now(timezone.utc).isoformat()
@@ -2,13 +2,26 @@ from __future__ import annotations
 
 import json
 import os
+import struct
+import zlib
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Protocol
+from typing import Any, BinaryIO, Generic, Iterator, NoReturn, Protocol, Sequence, TypeVar
 
 from cryptography.exceptions import InvalidTag
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 from src.core.crypto.abstract import EncryptionService
+from src.core.crypto.cipher_suites import (
+    AES_256_GCM,
+    DEFAULT_CIPHER_SUITE,
+    CipherSuite,
+    get_cipher_suite,
+    get_cipher_suite_by_id,
+    resolve_cipher_suite,
+)
+from src.core.crypto.key_derivation import derive_subkey
 
 class KeyManagerProtocol(Protocol):
     def get_active_key(self) -> bytes:
@@ -17,17 +30,362 @@ class KeyManagerProtocol(Protocol):
 class VaultEncryptionError(Exception):
     """Ошибка шифрования или расшифровки данных хранилища."""
 
+T = TypeVar("T")
+
+class PayloadCodec(Protocol):
+    codec_id: int
+
+    def encode(self, payload: dict[str, Any]) -> bytes:
+        ...
+
+    def decode(self, data: bytes | bytearray | memoryview) -> dict[str, Any]:
+        ...
+
+class JsonPayloadCodec:
+    codec_id = 1
+
+    def encode(self, payload: dict[str, Any]) -> bytes:
+        payload_json = json.dumps(
+            payload,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+        return payload_json.encode("utf-8")
+
+    def decode(self, data: bytes | bytearray | memoryview) -> dict[str, Any]:
+        try:
+            payload = json.loads(str(data, "utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            raise VaultEncryptionError(
+                "Encrypted payload has invalid JSON format."
+            ) from exc
+
+        if not isinstance(payload, dict):
+            raise VaultEncryptionError("Encrypted payload must be a dictionary.")
+
+        return payload
+
+class BinaryPayloadCodec:
+    # Компактный формат записи:
+    # [размер заголовка: varint]
+    # [заголовок: число полей, затем для каждого поля id и длина
+    #  (для списка - число элементов и длины элементов), всё varint]
+    # [значения всех полей подряд одной строкой UTF-8]
+    # Имена полей не хранятся, длины считаются в символах: текст
+    # декодируется одним вызовом и режется срезами строки.
+    # Значения: str - как есть, int - десятичной строкой, list[str] - элементы.
+    # Payload, который не укладывается в схему (лишние поля, другие типы),
+    # encode() отвергает через ValueError - такие записи пишутся в JSON.
+
+    codec_id = 2
+
+    FIELDS = (
+        (1, "version", int),
+        (2, "created_at", str),
+        (3, "title", str),
+        (4, "username", str),
+        (5, "password", str),
+        (6, "url", str),
+        (7, "notes", str),
+        (8, "category", str),
+        (9, "tags", list),
+    )
+
+    _SMALL_VARINTS = tuple(bytes((value,)) for value in range(0x80))
+
+    def __init__(self) -> None:
+        self._by_name = {name: (field_id, kind) for field_id, name, kind in self.FIELDS}
+        self._by_id = {field_id: (name, kind) for field_id, name, kind in self.FIELDS}
+
+    def encode(self, payload: dict[str, Any]) -> bytes:
+        header = [len(payload)]
+        texts: list[str] = []
+
+        for name, value in payload.items():
+            field = self._by_name.get(name)
+
+            if field is None:
+                raise ValueError(f"Field {name!r} is not supported by binary codec.")
+
+            field_id, kind = field
+            header.append(field_id)
+
+            if kind is str:
+                if not isinstance(value, str):
+                    raise ValueError(f"Field {name!r} must be a string.")
+
+                header.append(len(value))
+                texts.append(value)
+
+            elif kind is int:
+                if type(value) is not int or value < 0:
+                    raise ValueError(f"Field {name!r} must be a non-negative integer.")
+
+                text = str(value)
+                header.append(len(text))
+                texts.append(text)
+
+            else:
+                if not isinstance(value, list) or not all(
+                        isinstance(item, str) for item in value
+                ):
+                    raise ValueError(f"Field {name!r} must be a list of strings.")
+
+                header.append(len(value))
+                header.extend(len(item) for item in value)
+                texts.extend(value)
+
+        encode_varint = self._encode_varint
+        header_bytes = b"".join(encode_varint(value) for value in header)
+
+        return (
+            encode_varint(len(header_bytes))
+            + header_bytes
+            + "".join(texts).encode("utf-8")
+        )
+
+    def decode(self, data: bytes | bytearray | memoryview) -> dict[str, Any]:
+        header_size, pos = self._decode_varint(data, 0)
+        text_start = pos + header_size
+        header = self._decode_header(data[pos:text_start])
+
+        try:
+            text = str(data[text_start:], "utf-8")
+        except UnicodeDecodeError as exc:
+            raise VaultEncryptionError(
+                "Binary payload has invalid UTF-8 data."
+            ) from exc
+
+        by_id = self._by_id
+        payload: dict[str, Any] = {}
+        text_pos = 0
+
+        try:
+            count = header[0]
+            index = 1
+
+            for _ in range(count):
+                field = by_id.get(header[index])
+                length = header[index + 1]
+                index += 2
+
+                if field is None:
+                    raise VaultEncryptionError("Binary payload has unknown field.")
+
+                name, kind = field
+
+                if kind is list:
+                    items = []
+
+                    for item_length in header[index:index + length]:
+                        items.append(text[text_pos:text_pos + item_length])
+                        text_pos += item_length
+
+                    index += length
+                    payload[name] = items
+                    continue
+
+                value = text[text_pos:text_pos + length]
+                text_pos += length
+
+                if kind is int:
+                    if not value.isdigit():
+                        raise VaultEncryptionError(
+                            "Binary payload has invalid integer."
+                        )
+
+                    value = int(value)
+
+                payload[name] = value
+        except IndexError as exc:
+            raise VaultEncryptionError("Binary payload is truncated.") from exc
+
+        if index != len(header) or text_pos != len(text):
+            raise VaultEncryptionError("Binary payload has invalid field lengths.")
+
+        return payload
+
+    def _decode_header(self, header: bytes | bytearray | memoryview) -> list[int]:
+        # обычно все числа заголовка меньше 128 и занимают по одному байту
+        if not header:
+            raise VaultEncryptionError("Binary payload is truncated.")
+
+        if max(header) < 0x80:
+            return list(header)
+
+        values = []
+        pos = 0
+
+        while pos < len(header):
+            value, pos = self._decode_varint(header, pos)
+            values.append(value)
+
+        return values
+
+    @classmethod
+    def _encode_varint(cls, value: int) -> bytes:
+        if value < 0x80:
+            return cls._SMALL_VARINTS[value]
+
+        out = bytearray()
+
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+
+        out.append(value)
+
+        return bytes(out)
+
+    @staticmethod
+    def _decode_varint(data: bytes | bytearray | memoryview, pos: int) -> tuple[int, int]:
+        if pos < len(data) and data[pos] < 0x80:
+            return data[pos], pos + 1
+
+        result = 0
+        shift = 0
+
+        while True:
+            if pos >= len(data) or shift > 63:
+                raise VaultEncryptionError("Binary payload has invalid varint.")
+
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+
+            if byte < 0x80:
+                return result, pos
+
+            shift += 7
+
+class _CipherCache(dict):
+    # AEAD-контексты одного ключа по шифрам: контекст создаётся при первом
+    # обращении, поэтому пакет записей одного шифра одалживает ключ один раз.
+    # Шифр None - записи без заголовка (AES-256-GCM самим ключом данных).
+    def __init__(self, service: "AESGCMEncryptionService", key_manager: Any) -> None:
+        super().__init__()
+        self._service = service
+        self._key_manager = key_manager
+        # версия ключа, которым могут быть зашифрованы записи без заголовка;
+        # None - таких записей в хранилище нет
+        self.legacy_key_version = getattr(
+            key_manager, "legacy_key_version", service.DEFAULT_KEY_VERSION,
+        )
+
+    def __missing__(self, key: tuple[CipherSuite | None, int]) -> Any:
+        suite, key_version = key
+        cipher = self._service._build_cipher(
+            self._key_manager,
+            suite or self._service._legacy_suite,
+            key_version,
+            legacy=suite is None,
+        )
+        self[key] = cipher
+        return cipher
+
+@dataclass(frozen=True)
+class BatchItemResult(Generic[T]):
+    # Результат одного элемента пакетной операции:
+    # ошибка одного элемента не прерывает обработку остальных.
+    value: T | None = None
+    error: VaultEncryptionError | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 class AESGCMEncryptionService(EncryptionService):
-    # Формат хранения: nonce + ciphertext
+    # Формат хранения: [0xC6, id шифра, версия ключа (2 байта)] + nonce + ciphertext
+    # id шифра - из реестра cipher_suites (AES-256-GCM, ChaCha20-Poly1305,
+    # AES-256-GCM-SIV), поэтому записи разных шифров сосуществуют.
+    # Версия ключа данных (KeyManager.active_key_version) позволяет ввести
+    # новый ключ без немедленного перешифрования: старые записи читаются
+    # прежним ключом, пока их не перепишут.
+    # Форматы с заголовком шифруют подключом HKDF(ключ данных,
+    # "cipher-suite|<id шифра>"), а сам заголовок входит в associated_data:
+    # шифры не делят один ключ, а заголовок нельзя подменить.
+    # Записи хранилищ до конвертного шифрования не имеют заголовка:
+    # AES-256-GCM ключом из пароля без подключа, nonce + ciphertext.
+    # Они читаются, только пока этот ключ остаётся корневым
+    # (KeyManager.legacy_key_version). Случайный nonce такой записи может
+    # начинаться с байтов заголовка, поэтому при неверном теге запись
+    # проверяется и как старая - но лишь в таких хранилищах.
     # nonce: 12 байт, уникальный для каждой операции шифрования.
     # ciphertext:
         # зашифрованные данные вместе с authentication tag.
-        # в AES-GCM тег аутентификации автоматически добавляется
+        # тег аутентификации AEAD автоматически добавляется
         # к результату метода encrypt().
+    # Имя класса сохранено для совместимости: шифр задаёт cipher_suite.
 
     NONCE_SIZE = 12
     KEY_SIZE = 32
-    PAYLOAD_VERSION = 1
+    VERSIONED_HEADER_MAGIC = 0xC6
+    VERSIONED_HEADER_SIZE = 4
+    DEFAULT_KEY_VERSION = 1
+    SUITE_KEY_PURPOSE = "cipher-suite|"
+
+    # Версия полей внутри JSON записи (поле "version").
+    ENTRY_SCHEMA_VERSION = 1
+
+    # Формат открытого текста перед шифрованием:
+    # версия 1 - JSON записи без заголовка (начинается с "{");
+    # версия 2 - 1 байт версии + 1 байт кодека сжатия + JSON;
+    # версия 3 - как версия 2, но данные начинаются с id кодека payload
+    #            (JsonPayloadCodec, BinaryPayloadCodec).
+    # Сведения о сжатии и кодеке лежат внутри шифртекста и защищены тегом AES-GCM.
+    PAYLOAD_VERSION = 3
+    SUPPORTED_PAYLOAD_VERSIONS = (2, 3)
+    CODEC_NONE = 0
+    CODEC_ZLIB = 1
+    COMPRESSION_MIN_SIZE = 256
+    COMPRESSION_LEVEL = 6
+    MAX_PAYLOAD_SIZE = 16 * 1024 * 1024
+
+    # Раздельный формат записи:
+    # header - поля, нужные для списка записей (без секретов);
+    # body - секретные поля, расшифровываются только по запросу.
+    # Каждая часть шифруется отдельно, а её роль добавляется
+    # к associated_data, чтобы части нельзя было поменять местами.
+    HEADER_FIELDS = ("version", "created_at", "title", "username", "url", "category", "tags")
+    BODY_FIELDS = ("password", "notes")
+    HEADER_AAD_LABEL = b"|header"
+    BODY_AAD_LABEL = b"|body"
+
+    # Потоковое шифрование (файлы, вложения), схема STREAM:
+    # заголовок шифра пишется один раз в начале потока (encrypt_stream)
+    # или перед каждым куском (encrypt_stream_chunk);
+    # данные режутся на куски по STREAM_CHUNK_SIZE байт. Каждый поток
+    # получает случайную соль (24 байта) и свой ключ
+    # HKDF(подключ шифра, соль, "stream"), nonce куска - нулевой префикс
+    # (7 байт) + номер куска (4 байта) + флаг последнего куска. Поэтому
+    # nonce не повторяются между потоками при любом их числе.
+    # Номер и флаг также входят в associated_data, поэтому куски нельзя
+    # переставить, а поток - незаметно обрезать.
+    STREAM_CHUNK_SIZE = 64 * 1024
+    STREAM_NONCE_PREFIX_SIZE = 7
+    STREAM_SALT_SIZE = 24
+    STREAM_KEY_INFO = b"stream"
+    STREAM_MAX_CHUNKS = 2 ** 32
+    TAG_SIZE = 16
+
+    def __init__(
+            self,
+            compression: bool = True,
+            codec: PayloadCodec | None = None,
+            cipher_suite: str = DEFAULT_CIPHER_SUITE,
+    ) -> None:
+        self.cipher_suite = get_cipher_suite(resolve_cipher_suite(cipher_suite))
+        self._suite_prefix = bytes((self.VERSIONED_HEADER_MAGIC, self.cipher_suite.suite_id))
+        self._legacy_suite = get_cipher_suite(AES_256_GCM)
+        self.compression = compression
+        self.codec = codec if codec is not None else BinaryPayloadCodec()
+        self._json_codec = JsonPayloadCodec()
+        self._codecs: dict[int, PayloadCodec] = {
+            self._json_codec.codec_id: self._json_codec,
+            BinaryPayloadCodec.codec_id: BinaryPayloadCodec(),
+        }
+        self._codecs[self.codec.codec_id] = self.codec
 
     def encrypt(
             self,
@@ -38,18 +396,18 @@ class AESGCMEncryptionService(EncryptionService):
         if not isinstance(data, bytes):
             raise TypeError("Data for encryption must be bytes.")
 
-        key = self._get_valid_key(key_manager)
-
-        nonce = os.urandom(self.NONCE_SIZE)
-        aesgcm = AESGCM(key)
-
-        ciphertext = aesgcm.encrypt(
+        cipher = self._build_cipher(key_manager)
+        nonce = os.urandom(self.cipher_suite.nonce_size)
+        encrypted = self._encrypt_with(
+            cipher,
+            self._header(key_manager),
             nonce,
             data,
             associated_data,
         )
 
-        return nonce + ciphertext
+        self._record_usage(key_manager, 1)
+        return encrypted
 
     def decrypt(
             self,
@@ -63,39 +421,402 @@ class AESGCMEncryptionService(EncryptionService):
         if len(encrypted_data) <= self.NONCE_SIZE:
             raise VaultEncryptionError("Encrypted data is too short.")
 
-        key = self._get_valid_key(key_manager)
+        return self._decrypt_with(
+            self._cipher_cache(key_manager),
+            encrypted_data,
+            associated_data,
+        )
 
-        nonce = encrypted_data[:self.NONCE_SIZE]
-        ciphertext = encrypted_data[self.NONCE_SIZE:]
+    def encrypt_many(
+            self,
+            data_items: Sequence[bytes],
+            key_manager: KeyManagerProtocol,
+            associated_data: Sequence[bytes | None] | None = None,
+    ) -> list[bytes]:
+        """
+        Шифрует пакет данных одним ключом.
 
-        aesgcm = AESGCM(key)
+        Ключ запрашивается и проверяется один раз, контекст шифра
+        создаётся один раз, а nonce для всех элементов берутся
+        из одного чтения os.urandom.
+        """
 
-        try:
-            return aesgcm.decrypt(
-                nonce,
-                ciphertext,
-                associated_data,
+        associated = self._batch_associated_data(data_items, associated_data)
+
+        for data in data_items:
+            if not isinstance(data, bytes):
+                raise TypeError("Data for encryption must be bytes.")
+
+        if not data_items:
+            return []
+
+        cipher = self._build_cipher(key_manager)
+        header = self._header(key_manager)
+        nonce_size = self.cipher_suite.nonce_size
+        nonces = os.urandom(nonce_size * len(data_items))
+
+        encrypted = [
+            self._encrypt_with(
+                cipher,
+                header,
+                nonces[i * nonce_size:(i + 1) * nonce_size],
+                data,
+                associated[i],
             )
-        except InvalidTag as exc:
-            raise VaultEncryptionError(
-                "Encrypted data authentication failed."
-            ) from exc
+            for i, data in enumerate(data_items)
+        ]
 
-    def encrypt_entry(
+        self._record_usage(key_manager, len(encrypted))
+        return encrypted
+
+    def decrypt_many(
             self,
-            entry_data: dict[str, Any],
+            encrypted_items: Sequence[bytes],
             key_manager: KeyManagerProtocol,
+            associated_data: Sequence[bytes | None] | None = None,
+    ) -> list[BatchItemResult[bytes]]:
+        """
+        Расшифровывает пакет данных одним ключом.
+
+        Для каждого элемента возвращается BatchItemResult: повреждённый
+        элемент или неверный тег не прерывают расшифровку остальных.
+        """
+
+        associated = self._batch_associated_data(encrypted_items, associated_data)
+
+        if not encrypted_items:
+            return []
+
+        ciphers = self._cipher_cache(key_manager)
+        results: list[BatchItemResult[bytes]] = []
+
+        for i, encrypted_data in enumerate(encrypted_items):
+            try:
+                if not isinstance(encrypted_data, bytes):
+                    raise VaultEncryptionError("Encrypted data must be bytes.")
+
+                if len(encrypted_data) <= self.NONCE_SIZE:
+                    raise VaultEncryptionError("Encrypted data is too short.")
+
+                results.append(
+                    BatchItemResult(
+                        value=self._decrypt_with(ciphers, encrypted_data, associated[i])
+                    )
+                )
+            except VaultEncryptionError as exc:
+                results.append(BatchItemResult(error=exc))
+
+        return results
+
+    def new_stream_nonce(self) -> bytes:
+        """Случайная соль потока, из которой выводится ключ потока."""
+        return os.urandom(self.STREAM_SALT_SIZE)
+
+    def iter_stream_chunks(
+            self,
+            source: BinaryIO,
+            chunk_size: int | None = None,
+    ) -> Iterator[tuple[int, bool, bytes]]:
+        """
+        Читает source кусками и возвращает (номер, последний ли, данные).
+
+        В памяти одновременно находятся не более двух кусков: следующий
+        кусок читается заранее, чтобы знать, является ли текущий последним.
+        Пустой источник даёт один пустой последний кусок.
+        """
+
+        chunk_size = chunk_size or self.STREAM_CHUNK_SIZE
+
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be positive.")
+
+        index = 0
+        current = self._read_exactly(source, chunk_size)
+
+        while True:
+            following = (
+                self._read_exactly(source, chunk_size)
+                if len(current) == chunk_size
+                else b""
+            )
+            final = not following
+
+            if index >= self.STREAM_MAX_CHUNKS:
+                raise VaultEncryptionError("Stream has too many chunks.")
+
+            yield index, final, current
+
+            if final:
+                return
+
+            index += 1
+            current = following
+
+    def encrypt_stream_chunk(
+            self,
+            data: bytes,
+            key_manager: KeyManagerProtocol,
+            stream_nonce: bytes,
+            index: int,
+            final: bool,
             associated_data: bytes | None = None,
     ) -> bytes:
-        payload = self._build_payload(entry_data)
+        header = self._header(key_manager)
+        cipher, nonce_prefix = self._stream_cipher(key_manager, stream_nonce)
+        encrypted = header + self._seal_stream_chunk(
+            cipher,
+            nonce_prefix,
+            index,
+            final,
+            data,
+            header + (associated_data or b""),
+        )
 
-        payload_json = json.dumps(
-            payload,
-            ensure_ascii=False,
-            separators=(",", ":"),
+        self._record_usage(key_manager, 1)
+        return encrypted
+
+    def decrypt_stream_chunk(
+            self,
+            encrypted_chunk: bytes,
+            key_manager: KeyManagerProtocol,
+            stream_nonce: bytes,
+            index: int,
+            final: bool,
+            associated_data: bytes | None = None,
+    ) -> bytes:
+        header = self._parse_header(encrypted_chunk)
+
+        if header is None:
+            raise VaultEncryptionError("Encrypted stream chunk has no cipher header.")
+
+        suite, key_version, start = header
+        cipher, nonce_prefix = self._stream_cipher(
+            key_manager, stream_nonce, suite, key_version,
+        )
+        return self._open_stream_chunk(
+            cipher,
+            nonce_prefix,
+            index,
+            final,
+            encrypted_chunk[start:],
+            encrypted_chunk[:start] + (associated_data or b""),
+        )
+
+    def encrypt_stream(
+            self,
+            source: BinaryIO,
+            destination: BinaryIO,
+            key_manager: KeyManagerProtocol,
+            associated_data: bytes | None = None,
+            chunk_size: int | None = None,
+    ) -> int:
+        """
+        Шифрует поток source в destination с постоянным расходом памяти.
+
+        Формат: заголовок шифра и версии ключа (4 байта)
+        + соль потока (24 байта) + размер куска (4 байта), далее для
+        каждого куска длина шифртекста (4 байта) и шифртекст.
+        Возвращает число байт открытого текста.
+        """
+
+        chunk_size = chunk_size or self.STREAM_CHUNK_SIZE
+        stream_nonce = self.new_stream_nonce()
+        cipher, nonce_prefix = self._stream_cipher(key_manager, stream_nonce)
+        header = self._header(key_manager)
+        associated_data = header + (associated_data or b"")
+        total = 0
+
+        destination.write(header + stream_nonce + struct.pack(">I", chunk_size))
+
+        for index, final, data in self.iter_stream_chunks(source, chunk_size):
+            encrypted_chunk = self._seal_stream_chunk(
+                cipher,
+                nonce_prefix,
+                index,
+                final,
+                data,
+                associated_data,
+            )
+            destination.write(struct.pack(">I", len(encrypted_chunk)))
+            destination.write(encrypted_chunk)
+            total += len(data)
+
+        self._record_usage(key_manager, index + 1)
+        return total
+
+    def decrypt_stream(
+            self,
+            source: BinaryIO,
+            destination: BinaryIO,
+            key_manager: KeyManagerProtocol,
+            associated_data: bytes | None = None,
+    ) -> int:
+        """
+        Расшифровывает поток, записанный encrypt_stream().
+
+        Каждый кусок проверяется до записи в destination. Обрезанный,
+        переставленный или дополненный поток вызывает VaultEncryptionError,
+        но уже записанные куски при этом остаются в destination.
+        """
+
+        prefix = self._read_exactly(source, self.VERSIONED_HEADER_SIZE)
+        parsed = self._parse_header(prefix)
+
+        if parsed is None:
+            raise VaultEncryptionError("Encrypted stream has no cipher header.")
+
+        suite, key_version, _ = parsed
+        associated_data = prefix + (associated_data or b"")
+        header_size = self.STREAM_SALT_SIZE + 4
+        header = self._read_exactly(source, header_size)
+
+        if len(header) != header_size:
+            raise VaultEncryptionError("Encrypted stream header is truncated.")
+
+        stream_nonce = header[:self.STREAM_SALT_SIZE]
+        chunk_size = struct.unpack(">I", header[self.STREAM_SALT_SIZE:])[0]
+        cipher, nonce_prefix = self._stream_cipher(
+            key_manager, stream_nonce, suite, key_version,
+        )
+
+        encrypted_chunk = self._read_stream_record(source, chunk_size)
+
+        if encrypted_chunk is None:
+            raise VaultEncryptionError("Encrypted stream has no chunks.")
+
+        index = 0
+        total = 0
+
+        while encrypted_chunk is not None:
+            following = self._read_stream_record(source, chunk_size)
+
+            data = self._open_stream_chunk(
+                cipher,
+                nonce_prefix,
+                index,
+                following is None,
+                encrypted_chunk,
+                associated_data,
+            )
+            destination.write(data)
+            total += len(data)
+
+            index += 1
+            encrypted_chunk = following
+
+        return total
+
+    def encrypt_entries(
+            self,
+            entries_data: Sequence[dict[str, Any]],
+            key_manager: KeyManagerProtocol,
+            associated_data: Sequence[bytes | None] | None = None,
+    ) -> list[bytes]:
+        return self.encrypt_many(
+            [
+                self._pack_payload(self.serialize_entry(entry_data))
+                for entry_data in entries_data
+            ],
+            key_manager,
+            associated_data=associated_data,
+        )
+
+    def decrypt_entries(
+            self,
+            encrypted_items: Sequence[bytes],
+            key_manager: KeyManagerProtocol,
+            associated_data: Sequence[bytes | None] | None = None,
+    ) -> list[BatchItemResult[dict[str, Any]]]:
+        results: list[BatchItemResult[dict[str, Any]]] = []
+
+        for result in self.decrypt_many(
+                encrypted_items,
+                key_manager,
+                associated_data=associated_data,
+        ):
+            if not result.ok:
+                results.append(BatchItemResult(error=result.error))
+                continue
+
+            try:
+                results.append(
+                    BatchItemResult(
+                        value=self.deserialize_entry(
+                            self._unpack_payload(result.value)
+                        )
+                    )
+                )
+            except VaultEncryptionError as exc:
+                results.append(BatchItemResult(error=exc))
+
+        return results
+
+    def encrypt_entries_parts(
+            self,
+            entries_data: Sequence[dict[str, Any]],
+            key_manager: KeyManagerProtocol,
+            associated_data: Sequence[bytes | None] | None = None,
+    ) -> list[tuple[bytes, bytes]]:
+        """Пакетный вариант encrypt_entry_parts()."""
+
+        associated = self._batch_associated_data(entries_data, associated_data)
+
+        parts: list[bytes] = []
+        parts_associated: list[bytes] = []
+
+        for i, entry_data in enumerate(entries_data):
+            header_bytes, body_bytes = self.serialize_entry_parts(entry_data)
+
+            parts.extend(
+                (
+                    self._pack_payload(header_bytes),
+                    self._pack_payload(body_bytes),
+                )
+            )
+            parts_associated.extend(
+                (
+                    self._part_associated_data(associated[i], self.HEADER_AAD_LABEL),
+                    self._part_associated_data(associated[i], self.BODY_AAD_LABEL),
+                )
+            )
+
+        encrypted_parts = self.encrypt_many(
+            parts,
+            key_manager,
+            associated_data=parts_associated,
         )
 
-        payload_bytes = payload_json.encode("utf-8")
+        return [
+            (encrypted_parts[i], encrypted_parts[i + 1])
+            for i in range(0, len(encrypted_parts), 2)
+        ]
+
+    def encrypt_entry_headers(
+            self,
+            headers: Sequence[dict[str, Any]],
+            key_manager: KeyManagerProtocol,
+            associated_data: Sequence[bytes | None] | None = None,
+    ) -> list[bytes]:
+        """Шифрует заголовки из decrypt_entry_header() без тела записи."""
+
+        associated = self._batch_associated_data(headers, associated_data)
+
+        return self.encrypt_many(
+            [self._pack_payload(self._encode_payload(header)) for header in headers],
+            key_manager,
+            associated_data=[
+                self._part_associated_data(associated[i], self.HEADER_AAD_LABEL)
+                for i in range(len(headers))
+            ],
+        )
+
+    def encrypt_entry(
+            self,
+            entry_data: dict[str, Any],
+            key_manager: KeyManagerProtocol,
+            associated_data: bytes | None = None,
+    ) -> bytes:
+        payload_bytes = self._pack_payload(self.serialize_entry(entry_data))
 
         return self.encrypt(
             payload_bytes,
@@ -115,22 +836,213 @@ class AESGCMEncryptionService(EncryptionService):
             associated_data=associated_data,
         )
 
-        try:
-            payload = json.loads(payload_bytes.decode("utf-8"))
-        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
-            raise VaultEncryptionError(
-                "Encrypted payload has invalid JSON format."
-            ) from exc
+        return self.deserialize_entry(self._unpack_payload(payload_bytes))
+
+    def encrypt_entry_parts(
+            self,
+            entry_data: dict[str, Any],
+            key_manager: KeyManagerProtocol,
+            associated_data: bytes | None = None,
+    ) -> tuple[bytes, bytes]:
+        header_bytes, body_bytes = self.serialize_entry_parts(entry_data)
+
+        encrypted_header = self.encrypt(
+            self._pack_payload(header_bytes),
+            key_manager,
+            associated_data=self._part_associated_data(
+                associated_data,
+                self.HEADER_AAD_LABEL,
+            ),
+        )
+
+        encrypted_body = self.encrypt(
+            self._pack_payload(body_bytes),
+            key_manager,
+            associated_data=self._part_associated_data(
+                associated_data,
+                self.BODY_AAD_LABEL,
+            ),
+        )
+
+        return encrypted_header, encrypted_body
+
+    def decrypt_entry_header(
+            self,
+            encrypted_header: bytes,
+            key_manager: KeyManagerProtocol,
+            associated_data: bytes | None = None,
+    ) -> dict[str, Any]:
+        header_bytes = self.decrypt(
+            encrypted_header,
+            key_manager,
+            associated_data=self._part_associated_data(
+                associated_data,
+                self.HEADER_AAD_LABEL,
+            ),
+        )
+
+        header = self._decode_payload(self._unpack_payload(header_bytes))
+        self._validate_fields(header, {"version", "created_at", "title", "username", "url"})
+
+        return header
+
+    def decrypt_entry_body(
+            self,
+            encrypted_body: bytes,
+            key_manager: KeyManagerProtocol,
+            associated_data: bytes | None = None,
+    ) -> dict[str, Any]:
+        body_bytes = self.decrypt(
+            encrypted_body,
+            key_manager,
+            associated_data=self._part_associated_data(
+                associated_data,
+                self.BODY_AAD_LABEL,
+            ),
+        )
+
+        body = self._decode_payload(self._unpack_payload(body_bytes))
+        self._validate_fields(body, set(self.BODY_FIELDS))
+
+        return body
+
+    def decrypt_entry_parts(
+            self,
+            encrypted_header: bytes,
+            encrypted_body: bytes,
+            key_manager: KeyManagerProtocol,
+            associated_data: bytes | None = None,
+    ) -> dict[str, Any]:
+        payload = self.decrypt_entry_header(
+            encrypted_header,
+            key_manager,
+            associated_data=associated_data,
+        )
+        payload.update(
+            self.decrypt_entry_body(
+                encrypted_body,
+                key_manager,
+                associated_data=associated_data,
+            )
+        )
+
+        return payload
+
+    def serialize_entry_parts(self, entry_data: dict[str, Any]) -> tuple[bytes, bytes]:
+        payload = self._build_payload(entry_data)
+
+        header = {field: payload[field] for field in self.HEADER_FIELDS}
+        body = {field: payload[field] for field in self.BODY_FIELDS}
+
+        return self._encode_payload(header), self._encode_payload(body)
+
+    def serialize_entry(self, entry_data: dict[str, Any]) -> bytes:
+        return self._encode_payload(self._build_payload(entry_data))
+
+    def deserialize_entry(self, payload_bytes: bytes | bytearray) -> dict[str, Any]:
+        payload = self._decode_payload(payload_bytes)
 
         self._validate_payload(payload)
 
         return payload
 
+    def blob_key_version(self, data: bytes) -> int:
+        """Версия ключа данных, которым зашифрованы data (по заголовку)."""
+
+        header = self._parse_header(data)
+        return header[1] if header is not None else self.DEFAULT_KEY_VERSION
+
+    def _encode_payload(self, payload: dict[str, Any]) -> bytes:
+        # payload, который не поддерживает выбранный кодек, пишется в JSON
+        try:
+            data = self.codec.encode(payload)
+            codec_id = self.codec.codec_id
+        except ValueError:
+            data = self._json_codec.encode(payload)
+            codec_id = self._json_codec.codec_id
+
+        return bytes((codec_id,)) + data
+
+    def _decode_payload(self, payload_bytes: bytes | bytearray) -> dict[str, Any]:
+        if not payload_bytes:
+            raise VaultEncryptionError("Encrypted payload is empty.")
+
+        # версии 1 и 2: JSON без id кодека
+        if payload_bytes[0] == ord("{"):
+            return self._json_codec.decode(payload_bytes)
+
+        codec = self._codecs.get(payload_bytes[0])
+
+        if codec is None:
+            raise VaultEncryptionError("Unsupported encrypted payload codec.")
+
+        # memoryview не создаёт ещё одну копию открытого текста
+        return codec.decode(memoryview(payload_bytes)[1:])
+
+    def _pack_payload(self, payload_bytes: bytes) -> bytes:
+        codec = self.CODEC_NONE
+        data = payload_bytes
+
+        if self.compression and len(payload_bytes) >= self.COMPRESSION_MIN_SIZE:
+            compressed = zlib.compress(payload_bytes, self.COMPRESSION_LEVEL)
+
+            # сжатие сохраняется, только если оно действительно помогло
+            if len(compressed) < len(payload_bytes):
+                codec = self.CODEC_ZLIB
+                data = compressed
+
+        return bytes((self.PAYLOAD_VERSION, codec)) + data
+
+    def _unpack_payload(self, payload_bytes: bytes) -> bytes:
+        if not payload_bytes:
+            raise VaultEncryptionError("Encrypted payload is empty.")
+
+        # версия 1: JSON без заголовка
+        if payload_bytes[0] == ord("{"):
+            return payload_bytes
+
+        if (
+                payload_bytes[0] not in self.SUPPORTED_PAYLOAD_VERSIONS
+                or len(payload_bytes) < 2
+        ):
+            raise VaultEncryptionError("Unsupported encrypted payload version.")
+
+        codec = payload_bytes[1]
+        data = payload_bytes[2:]
+
+        if codec == self.CODEC_NONE:
+            return data
+
+        if codec == self.CODEC_ZLIB:
+            try:
+                decompressor = zlib.decompressobj()
+                result = decompressor.decompress(data, self.MAX_PAYLOAD_SIZE)
+            except zlib.error as exc:
+                raise VaultEncryptionError(
+                    "Encrypted payload could not be decompressed."
+                ) from exc
+
+            if decompressor.unconsumed_tail or not decompressor.eof:
+                raise VaultEncryptionError(
+                    "Encrypted payload could not be decompressed."
+                )
+
+            return result
+
+        raise VaultEncryptionError("Unsupported encrypted payload codec.")
+
+    def _part_associated_data(
+            self,
+            associated_data: bytes | None,
+            label: bytes,
+    ) -> bytes:
+        return (associated_data or b"") + label
+
     def _build_payload(self, entry_data: dict[str, Any]) -> dict[str, Any]:
         now = datetime.now(timezone.utc).isoformat()
 
         return {
-            "version": self.PAYLOAD_VERSION,
+            "version": self.ENTRY_SCHEMA_VERSION,
             "created_at": entry_data.get("created_at", now),
             "title": entry_data.get("title", ""),
             "username": entry_data.get("username", ""),
@@ -142,9 +1054,6 @@ class AESGCMEncryptionService(EncryptionService):
         }
 
     def _validate_payload(self, payload: dict[str, Any]) -> None:
-        if not isinstance(payload, dict):
-            raise VaultEncryptionError("Encrypted payload must be a dictionary.")
-
         required_fields = {
             "version",
             "created_at",
@@ -155,6 +1064,12 @@ class AESGCMEncryptionService(EncryptionService):
             "notes",
         }
 
+        self._validate_fields(payload, required_fields)
+
+    def _validate_fields(self, payload: Any, required_fields: set[str]) -> None:
+        if not isinstance(payload, dict):
+            raise VaultEncryptionError("Encrypted payload must be a dictionary.")
+
         missing_fields = required_fields - set(payload.keys())
 
         if missing_fields:
@@ -162,16 +1077,314 @@ class AESGCMEncryptionService(EncryptionService):
                 "Encrypted payload has missing required fields."
             )
 
-    def _get_valid_key(self, key_manager: KeyManagerProtocol) -> bytes:
+    def _build_cipher(
+            self,
+            key_manager: KeyManagerProtocol,
+            suite: CipherSuite | None = None,
+            key_version: int | None = None,
+            legacy: bool = False,
+            stream_salt: bytes | None = None,
+    ) -> Any:
+        # KeyManager отдаёт memoryview защищённого буфера без копии ключа;
+        # AEAD копирует ключ в свой контекст, поэтому одалживания
+        # на время создания шифра достаточно.
+        # legacy - записи без заголовка, зашифрованные самим ключом данных;
+        # stream_salt - ключ отдельного потока (см. _stream_cipher)
+        suite = suite or self.cipher_suite
+
+        if key_version == self._key_version(key_manager):
+            key_version = None
+
+        # у каждого шифра свой подключ: один ключ данных не используется
+        # разными алгоритмами. KeyManager вычисляет его один раз на ключ
+        # данных и хранит в арене до блокировки.
+        derive = not legacy
+        borrow_key = getattr(key_manager, "borrow_key", None)
+        borrow_subkey = getattr(key_manager, "borrow_subkey", None)
+
+        if key_version is not None and borrow_key is None:
+            # ключ прежней версии хранит только KeyManager с ротацией
+            raise VaultEncryptionError(f"Data key version {key_version} is not available.")
+
+        if borrow_key is None:
+            return self._create_cipher(
+                self._get_valid_key(key_manager, suite), suite, derive, stream_salt,
+            )
+
+        try:
+            if derive and borrow_subkey is not None:
+                borrow = borrow_subkey(self._suite_key_purpose(suite), key_version)
+                derive = False
+            else:
+                borrow = borrow_key(key_version)
+        except ValueError as exc:
+            raise VaultEncryptionError(
+                f"Data key version {key_version} is not available."
+            ) from exc
+
+        with borrow as key:
+            self._validate_key(key, suite)
+            return self._create_cipher(key, suite, derive, stream_salt)
+
+    def _suite_key_purpose(self, suite: CipherSuite) -> str:
+        return f"{self.SUITE_KEY_PURPOSE}{suite.suite_id}"
+
+    def _create_cipher(
+            self,
+            key: bytes | memoryview,
+            suite: CipherSuite,
+            derive: bool,
+            stream_salt: bytes | None = None,
+    ) -> Any:
+        if derive:
+            key = derive_subkey(key, self._suite_key_purpose(suite), suite.key_size)
+
+        if stream_salt is not None:
+            key = HKDF(
+                algorithm=hashes.SHA256(),
+                length=suite.key_size,
+                salt=stream_salt,
+                info=self.STREAM_KEY_INFO,
+            ).derive(key)
+
+        return suite.create(key)
+
+    def _stream_cipher(
+            self,
+            key_manager: KeyManagerProtocol,
+            stream_nonce: bytes,
+            suite: CipherSuite | None = None,
+            key_version: int | None = None,
+    ) -> tuple[Any, bytes]:
+        """(шифр, префикс nonce) для потока с солью stream_nonce."""
+
+        if len(stream_nonce) != self.STREAM_SALT_SIZE:
+            raise VaultEncryptionError("Invalid stream nonce size.")
+
+        # ключ потока уникален, поэтому префикс nonce постоянный
+        cipher = self._build_cipher(
+            key_manager, suite, key_version, stream_salt=stream_nonce,
+        )
+        return cipher, bytes(self.STREAM_NONCE_PREFIX_SIZE)
+
+    def _cipher_cache(self, key_manager: KeyManagerProtocol) -> _CipherCache:
+        return _CipherCache(self, key_manager)
+
+    def _key_version(self, key_manager: KeyManagerProtocol) -> int:
+        return getattr(key_manager, "active_key_version", None) or self.DEFAULT_KEY_VERSION
+
+    def _header(self, key_manager: KeyManagerProtocol) -> bytes:
+        return self._suite_prefix + struct.pack(">H", self._key_version(key_manager))
+
+    def _parse_header(self, data: bytes) -> tuple[CipherSuite, int, int] | None:
+        """(шифр, версия ключа, размер заголовка) или None для записи без заголовка."""
+
+        if len(data) < self.VERSIONED_HEADER_SIZE or data[0] != self.VERSIONED_HEADER_MAGIC:
+            return None
+
+        suite = get_cipher_suite_by_id(data[1])
+
+        if suite is None:
+            return None
+
+        return suite, (data[2] << 8) | data[3], self.VERSIONED_HEADER_SIZE
+
+    def _record_usage(self, key_manager: KeyManagerProtocol, count: int) -> None:
+        # учёт числа шифрований ключом: у случайного 96-битного nonce
+        # есть предел безопасного числа операций (см. KeyManager)
+        record = getattr(key_manager, "record_key_usage", None)
+
+        if record is not None:
+            record(count)
+
+    def _encrypt_with(
+            self,
+            cipher: Any,
+            header: bytes,
+            nonce: bytes,
+            data: bytes,
+            associated_data: bytes | None,
+    ) -> bytes:
+        # заголовок (шифр и версия ключа) защищён тегом вместе с данными
+        return header + nonce + cipher.encrypt(nonce, data, header + (associated_data or b""))
+
+    def _decrypt_with(
+            self,
+            ciphers: _CipherCache,
+            encrypted_data: bytes,
+            associated_data: bytes | None,
+    ) -> bytes:
+        header = self._parse_header(encrypted_data)
+        legacy_version = ciphers.legacy_key_version
+        error: Exception | None = None
+
+        if header is not None:
+            suite, key_version, start = header
+            nonce_end = start + suite.nonce_size
+
+            try:
+                return ciphers[suite, key_version].decrypt(
+                    encrypted_data[start:nonce_end],
+                    encrypted_data[nonce_end:],
+                    encrypted_data[:start] + (associated_data or b""),
+                )
+            except (InvalidTag, ValueError, VaultEncryptionError) as exc:
+                error = exc
+
+            if legacy_version is None:
+                # записей без заголовка в хранилище нет: повторная
+                # проверка только удвоила бы работу на неверном ключе
+                self._raise_decrypt_error(error)
+        elif legacy_version is None:
+            raise VaultEncryptionError("Encrypted data has no cipher header.")
+
+        nonce_size = self._legacy_suite.nonce_size
+
+        try:
+            return ciphers[None, legacy_version].decrypt(
+                encrypted_data[:nonce_size],
+                encrypted_data[nonce_size:],
+                associated_data,
+            )
+        except (InvalidTag, VaultEncryptionError) as exc:
+            self._raise_decrypt_error(error or exc)
+
+    def _raise_decrypt_error(self, error: Exception) -> NoReturn:
+        if isinstance(error, VaultEncryptionError):
+            raise error
+
+        raise VaultEncryptionError("Encrypted data authentication failed.") from error
+
+    def _seal_stream_chunk(
+            self,
+            cipher: Any,
+            stream_nonce: bytes,
+            index: int,
+            final: bool,
+            data: bytes,
+            associated_data: bytes | None,
+    ) -> bytes:
+        return cipher.encrypt(
+            self._stream_nonce(stream_nonce, index, final),
+            data,
+            self._stream_associated_data(associated_data, index, final),
+        )
+
+    def _open_stream_chunk(
+            self,
+            cipher: Any,
+            stream_nonce: bytes,
+            index: int,
+            final: bool,
+            encrypted_chunk: bytes,
+            associated_data: bytes | None,
+    ) -> bytes:
+        try:
+            return cipher.decrypt(
+                self._stream_nonce(stream_nonce, index, final),
+                encrypted_chunk,
+                self._stream_associated_data(associated_data, index, final),
+            )
+        except InvalidTag as exc:
+            raise VaultEncryptionError(
+                "Encrypted stream chunk authentication failed."
+            ) from exc
+
+    def _stream_nonce(self, stream_nonce: bytes, index: int, final: bool) -> bytes:
+        if len(stream_nonce) != self.STREAM_NONCE_PREFIX_SIZE:
+            raise VaultEncryptionError("Invalid stream nonce size.")
+
+        if not 0 <= index < self.STREAM_MAX_CHUNKS:
+            raise VaultEncryptionError("Stream chunk index is out of range.")
+
+        return stream_nonce + struct.pack(">IB", index, 1 if final else 0)
+
+    def _stream_associated_data(
+            self,
+            associated_data: bytes | None,
+            index: int,
+            final: bool,
+    ) -> bytes:
+        return (associated_data or b"") + struct.pack(">IB", index, 1 if final else 0)
+
+    def _read_stream_record(self, source: BinaryIO, chunk_size: int) -> bytes | None:
+        length_bytes = self._read_exactly(source, 4)
+
+        if not length_bytes:
+            return None
+
+        if len(length_bytes) != 4:
+            raise VaultEncryptionError("Encrypted stream is truncated.")
+
+        length = struct.unpack(">I", length_bytes)[0]
+
+        # длина из потока не доверенная: больше куска с тегом быть не может
+        if length < self.TAG_SIZE or length > chunk_size + self.TAG_SIZE:
+            raise VaultEncryptionError("Encrypted stream chunk has invalid size.")
+
+        encrypted_chunk = self._read_exactly(source, length)
+
+        if len(encrypted_chunk) != length:
+            raise VaultEncryptionError("Encrypted stream is truncated.")
+
+        return encrypted_chunk
+
+    def _read_exactly(self, source: BinaryIO, size: int) -> bytes:
+        # read() неблокирующих и сырых потоков может вернуть меньше size байт
+        data = source.read(size)
+
+        if len(data) == size or not data:
+            return data
+
+        parts = [data]
+        remaining = size - len(data)
+
+        while remaining:
+            data = source.read(remaining)
+
+            if not data:
+                break
+
+            parts.append(data)
+            remaining -= len(data)
+
+        return b"".join(parts)
+
+    def _batch_associated_data(
+            self,
+            items: Sequence[Any],
+            associated_data: Sequence[bytes | None] | None,
+    ) -> Sequence[bytes | None]:
+        if associated_data is None:
+            return [None] * len(items)
+
+        if len(associated_data) != len(items):
+            raise ValueError(
+                "Associated data must be provided for every batch item."
+            )
+
+        return associated_data
+
+    def _get_valid_key(
+            self,
+            key_manager: KeyManagerProtocol,
+            suite: CipherSuite | None = None,
+    ) -> bytes:
         key = key_manager.get_active_key()
-        self._validate_key(key)
+        self._validate_key(key, suite)
         return key
 
-    def _validate_key(self, key: bytes) -> None:
-        if not isinstance(key, bytes):
+    def _validate_key(
+            self,
+            key: bytes | memoryview,
+            suite: CipherSuite | None = None,
+    ) -> None:
+        suite = suite or self.cipher_suite
+
+        if not isinstance(key, (bytes, memoryview)):
             raise VaultEncryptionError("Encryption key must be bytes.")
 
-        if len(key) != self.KEY_SIZE:
+        if len(key) != suite.key_size:
             raise VaultEncryptionError(
-                "AES-256-GCM requires a 32-byte encryption key."
+                f"{suite.name} requires a {suite.key_size}-byte encryption key."
             )
\ No newline at end of file
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+from src.core.crypto.placeholder import zero_bytes
+
+T = TypeVar("T")
+
+@dataclass(frozen=True)
+class EntryCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size_bytes: int
+
+class DecryptedEntryCache:
+    # LRU-кэш расшифрованных payload записей.
+    # Ключ - (entry_id, updated_at): после изменения записи старая версия
+    # перестаёт совпадать и вытесняется при следующем обращении или записи.
+    # Открытый текст хранится в bytearray, чтобы его можно было затереть
+    # при вытеснении, блокировке хранилища или истечении TTL ключа.
+
+    DEFAULT_MAX_ENTRIES = 1000
+    DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+    def __init__(
+            self,
+            max_entries: int = DEFAULT_MAX_ENTRIES,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        if max_entries < 0 or max_bytes < 0:
+            raise ValueError("Cache limits must not be negative.")
+
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._items: OrderedDict[str, tuple[str, bytearray]] = OrderedDict()
+        self._size_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(
+            self,
+            entry_id: str,
+            updated_at: str,
+            decode: Callable[[bytearray], T],
+    ) -> T | None:
+        # decode вызывается под блокировкой: буфер не может быть затёрт,
+        # пока из него собирается результат
+        with self._lock:
+            item = self._items.get(entry_id)
+
+            if item is None:
+                self._misses += 1
+                return None
+
+            cached_updated_at, payload = item
+
+            if cached_updated_at != updated_at:
+                self._remove(entry_id)
+                self._misses += 1
+                return None
+
+            self._items.move_to_end(entry_id)
+            self._hits += 1
+            return decode(payload)
+
+    def put(self, entry_id: str, updated_at: str, payload: bytes | bytearray) -> None:
+        size = len(payload)
+
+        with self._lock:
+            self._remove(entry_id)
+
+            if size > self._max_bytes or self._max_entries == 0:
+                return
+
+            self._items[entry_id] = (updated_at, bytearray(payload))
+            self._size_bytes += size
+
+            while (
+                    len(self._items) > self._max_entries
+                    or self._size_bytes > self._max_bytes
+            ):
+                oldest_id = next(iter(self._items))
+                self._remove(oldest_id)
+                self._evictions += 1
+
+    def discard(self, entry_id: str) -> None:
+        with self._lock:
+            self._remove(entry_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry_id in list(self._items):
+                self._remove(entry_id)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def stats(self) -> EntryCacheStats:
+        with self._lock:
+            return EntryCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._items),
+                size_bytes=self._size_bytes,
+            )
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _remove(self, entry_id: str) -> None:
+        item = self._items.pop(entry_id, None)
+
+        if item is None:
+            return
+
+        payload = item[1]
+        self._size_bytes -= len(payload)
+        zero_bytes(payload)
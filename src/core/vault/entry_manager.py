@@ -1,14 +1,19 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, Callable, Iterator
 
 from src.core.events import EventBus, now_utc
 from src.core.key_manager import KeyManager
 from src.core.vault.encryption_service import AESGCMEncryptionService
+from src.core.vault.entry_cache import DecryptedEntryCache
 from src.core.vault.password_generator import PasswordGenerator
 
 class EntryManagerError(Exception):
@@ -32,6 +37,24 @@ class EntryDeleted:
     timestamp: str
     entry_id: str
 
+@dataclass
+class EntriesCreated:
+    name: str
+    timestamp: str
+    entry_ids: list[str]
+
+@dataclass
+class EntriesUpdated:
+    name: str
+    timestamp: str
+    entry_ids: list[str]
+
+@dataclass
+class EntriesDeleted:
+    name: str
+    timestamp: str
+    entry_ids: list[str]
+
 class EntryManager:
     """
     Центральный контроллер операций с записями хранилища.
@@ -39,15 +62,32 @@ class EntryManager:
     Отвечает за:
     - создание записи;
     - получение одной записи;
-    - получение всех записей;
+    - получение всех записей, в том числе постранично;
     - обновление записи;
-    - удаление записи.
+    - удаление записи;
+    - пакетное создание, обновление и удаление записей.
 
     Пользовательские поля записи не хранятся в базе открытым текстом.
     Они собираются в JSON, шифруются через AES-256-GCM и сохраняются
-    в поле encrypted_data.
+    двумя частями: encrypted_header (поля для списка) и encrypted_data
+    (password и notes). Записи старого формата, где вся запись лежит
+    в encrypted_data, переводятся в новый формат при чтении.
     """
 
+    # Ограничение на число параметров в одном запросе WHERE id IN (...).
+    # SQLite по умолчанию допускает не более 999 параметров.
+    BATCH_QUERY_SIZE = 500
+
+    # Размер страницы по умолчанию для iter_entries().
+    PAGE_SIZE = 200
+
+    # Параллельная расшифровка при массовом чтении.
+    # AESGCM из cryptography отпускает GIL, поэтому страницу можно
+    # расшифровывать в нескольких потоках. Маленькие страницы
+    # обрабатываются последовательно: накладные расходы пула больше выигрыша.
+    DEFAULT_DECRYPT_WORKERS = 4
+    PARALLEL_DECRYPT_THRESHOLD = 64
+
     def __init__(
         self,
         db,
@@ -55,11 +95,29 @@ class EntryManager:
         event_bus: EventBus | None = None,
         encryption_service: AESGCMEncryptionService | None = None,
         password_generator: PasswordGenerator | None = None,
+        entry_cache: DecryptedEntryCache | None = None,
+        decrypt_workers: int | None = None,
+        parallel_decrypt_threshold: int | None = None,
     ) -> None:
         self.db = db
         self.key_manager = key_manager
         self.event_bus = event_bus
 
+        if decrypt_workers is None:
+            decrypt_workers = min(self.DEFAULT_DECRYPT_WORKERS, os.cpu_count() or 1)
+
+        if decrypt_workers < 1:
+            raise ValueError("Decrypt workers count must be positive.")
+
+        self.decrypt_workers = decrypt_workers
+        self.parallel_decrypt_threshold = (
+            parallel_decrypt_threshold
+            if parallel_decrypt_threshold is not None
+            else self.PARALLEL_DECRYPT_THRESHOLD
+        )
+        self._decrypt_executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
         self.encryption_service = (
             encryption_service
             if encryption_service is not None
@@ -72,13 +130,26 @@ class EntryManager:
             else PasswordGenerator()
         )
 
+        self.entry_cache = (
+            entry_cache
+            if entry_cache is not None
+            else DecryptedEntryCache()
+        )
+
+        # расшифрованные данные не должны пережить ключ:
+        # кэш затирается при lock(), clear_active_key() и истечении TTL,
+        # тогда же записываются счётчики шифрований
+        if hasattr(self.key_manager, "add_key_cleared_listener"):
+            self.key_manager.add_key_cleared_listener(self._on_key_cleared)
+
     def create_entry(self, data_dict: dict[str, Any]) -> dict[str, Any]:
         """
         Создаёт новую запись хранилища.
 
         В базу сохраняются только:
         - id;
-        - encrypted_data;
+        - encrypted_header (поля для списка);
+        - encrypted_data (секретные поля);
         - created_at;
         - updated_at;
         - tags.
@@ -97,38 +168,42 @@ class EntryManager:
         tags = prepared_data.get("tags", [])
         tags_text = self._serialize_tags(tags)
 
-        encrypted_data = self.encryption_service.encrypt_entry(
+        payload_bytes = self.encryption_service.serialize_entry(prepared_data)
+        encrypted_header, encrypted_data = self.encryption_service.encrypt_entry_parts(
             prepared_data,
             self.key_manager,
             associated_data=entry_id.encode("utf-8"),
         )
 
         try:
-            self.db.execute(
-                """
-                INSERT INTO vault_entries (
-                    id,
-                    encrypted_data,
-                    created_at,
-                    updated_at,
-                    tags
+            with self._transaction():
+                self.db.execute(
+                    """
+                    INSERT INTO vault_entries (
+                        id,
+                        encrypted_data,
+                        created_at,
+                        updated_at,
+                        tags,
+                        encrypted_header
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?);
+                    """,
+                    (
+                        entry_id,
+                        encrypted_data,
+                        created_at,
+                        updated_at,
+                        tags_text,
+                        encrypted_header,
+                    ),
                 )
-                VALUES (?, ?, ?, ?, ?);
-                """,
-                (
-                    entry_id,
-                    encrypted_data,
-                    created_at,
-                    updated_at,
-                    tags_text,
-                ),
-            )
-            self._commit()
 
         except Exception as exc:
-            self._rollback()
             raise EntryManagerError("Failed to create vault entry.") from exc
 
+        self.entry_cache.put(entry_id, updated_at, payload_bytes)
+
         self._publish_event(
             EntryCreated(
                 name="EntryCreated",
@@ -152,7 +227,7 @@ class EntryManager:
 
         cursor = self.db.execute(
             """
-            SELECT id, encrypted_data, created_at, updated_at, tags
+            SELECT id, encrypted_data, created_at, updated_at, tags, encrypted_header
             FROM vault_entries
             WHERE id = ?;
             """,
@@ -164,31 +239,78 @@ class EntryManager:
         if row is None:
             return None
 
-        return self._row_to_entry(row)
+        entry = self._row_to_entry(row)
+        self._rekey_stale_rows([row], [entry])
+
+        return entry
 
     def get_all_entries(self) -> list[dict[str, Any]]:
         """
-        Возвращает все записи хранилища.
+        Возвращает все записи хранилища, начиная с самых новых.
 
-        Каждая запись расшифровывается из encrypted_data.
+        Записи читаются страницами iter_entries(); каждая страница
+        расшифровывается пакетом одним ключом, большие страницы -
+        параллельно в пуле потоков (см. _decrypt_rows).
         """
 
-        cursor = self.db.execute(
-            """
-            SELECT id, encrypted_data, created_at, updated_at, tags
-            FROM vault_entries
-            ORDER BY updated_at DESC;
-            """
-        )
+        return list(self.iter_entries())
 
-        rows = cursor.fetchall()
+    def iter_entries(
+        self,
+        page_size: int | None = None,
+        after: tuple[str, str] | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Постранично выдаёт записи хранилища, начиная с самых новых.
 
-        entries: list[dict[str, Any]] = []
+        Используется keyset-пагинация по (updated_at, id) через индекс
+        idx_vault_entries_updated_at_id: каждая страница читается отдельным
+        запросом и расшифровывается целиком перед выдачей, поэтому
+        в памяти одновременно находится не больше одной страницы.
 
-        for row in rows:
-            entries.append(self._row_to_entry(row))
+        after - позиция (updated_at, id) последней полученной записи;
+        выдача продолжается со следующей за ней записи.
+        """
 
-        return entries
+        for rows in self._iter_pages(page_size, after):
+            legacy_rows: list[tuple[str, str, dict[str, Any]]] = []
+            page = self._decrypt_rows(rows, self._row_to_entry, legacy_rows)
+
+            self._migrate_legacy_entries(legacy_rows)
+            self._rekey_stale_rows(rows, page)
+
+            yield from page
+
+    def get_entries_metadata(self) -> list[dict[str, Any]]:
+        """
+        Возвращает записи для списка без секретных полей.
+
+        Расшифровываются только заголовки (title, username, url,
+        category, tags); password и notes в память не загружаются.
+        """
+
+        return list(self.iter_entries_metadata())
+
+    def iter_entries_metadata(
+        self,
+        page_size: int | None = None,
+        after: tuple[str, str] | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Постранично выдаёт заголовки записей в том же порядке,
+        что и iter_entries().
+
+        Записи старого формата при этом переводятся в раздельный формат.
+        """
+
+        for rows in self._iter_pages(page_size, after, metadata_only=True):
+            legacy_rows: list[tuple[str, str, dict[str, Any]]] = []
+            page = self._decrypt_rows(rows, self._row_to_metadata, legacy_rows)
+
+            self._migrate_legacy_entries(legacy_rows)
+            self._rekey_stale_rows(rows, page, metadata_only=True)
+
+            yield from page
 
     def update_entry(
         self,
@@ -222,34 +344,38 @@ class EntryManager:
         tags = updated_entry.get("tags", [])
         tags_text = self._serialize_tags(tags)
 
-        encrypted_data = self.encryption_service.encrypt_entry(
+        payload_bytes = self.encryption_service.serialize_entry(updated_entry)
+        encrypted_header, encrypted_data = self.encryption_service.encrypt_entry_parts(
             updated_entry,
             self.key_manager,
             associated_data=entry_id.encode("utf-8"),
         )
 
         try:
-            self.db.execute(
-                """
-                UPDATE vault_entries
-                SET encrypted_data = ?,
-                    updated_at = ?,
-                    tags = ?
-                WHERE id = ?;
-                """,
-                (
-                    encrypted_data,
-                    updated_at,
-                    tags_text,
-                    entry_id,
-                ),
-            )
-            self._commit()
+            with self._transaction():
+                self.db.execute(
+                    """
+                    UPDATE vault_entries
+                    SET encrypted_data = ?,
+                        encrypted_header = ?,
+                        updated_at = ?,
+                        tags = ?
+                    WHERE id = ?;
+                    """,
+                    (
+                        encrypted_data,
+                        encrypted_header,
+                        updated_at,
+                        tags_text,
+                        entry_id,
+                    ),
+                )
 
         except Exception as exc:
-            self._rollback()
             raise EntryManagerError("Failed to update vault entry.") from exc
 
+        self.entry_cache.put(entry_id, updated_at, payload_bytes)
+
         self._publish_event(
             EntryUpdated(
                 name="EntryUpdated",
@@ -282,20 +408,19 @@ class EntryManager:
             return False
 
         try:
-            if soft_delete:
-                moved = self._try_move_to_deleted_entries(entry_id)
+            with self._transaction():
+                if soft_delete:
+                    moved = self._try_move_to_deleted_entries(entry_id)
 
-                if not moved:
+                    if not moved:
+                        self._delete_permanently(entry_id)
+                else:
                     self._delete_permanently(entry_id)
-            else:
-                self._delete_permanently(entry_id)
-
-            self._commit()
-
         except Exception as exc:
-            self._rollback()
             raise EntryManagerError("Failed to delete vault entry.") from exc
 
+        self.entry_cache.discard(entry_id)
+
         self._publish_event(
             EntryDeleted(
                 name="EntryDeleted",
@@ -306,22 +431,679 @@ class EntryManager:
 
         return True
 
+    def create_entries(
+        self,
+        data_dicts: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        """
+        Создаёт несколько записей в одной транзакции.
+
+        Все записи сначала проверяются и шифруются, затем сохраняются
+        одним пакетом. Если хотя бы одна запись не сохранилась,
+        транзакция откатывается целиком.
+
+        Возвращаются записи, собранные в памяти, без повторного чтения
+        и расшифровки из базы.
+        """
+
+        for data_dict in data_dicts:
+            self._validate_entry_data(data_dict)
+
+        if not data_dicts:
+            return []
+
+        entry_ids: list[str] = []
+        prepared_entries: list[dict[str, Any]] = []
+
+        for data_dict in data_dicts:
+            prepared_data = dict(data_dict)
+            prepared_data["created_at"] = self._utc_now()
+            prepared_data["version"] = prepared_data.get("version", 1)
+
+            entry_ids.append(str(uuid.uuid4()))
+            prepared_entries.append(prepared_data)
+
+        encrypted_parts = self.encryption_service.encrypt_entries_parts(
+            prepared_entries,
+            self.key_manager,
+            associated_data=[entry_id.encode("utf-8") for entry_id in entry_ids],
+        )
+
+        rows: list[tuple[Any, ...]] = []
+        entries: list[dict[str, Any]] = []
+
+        for entry_id, prepared_data, (encrypted_header, encrypted_data) in zip(
+            entry_ids,
+            prepared_entries,
+            encrypted_parts,
+        ):
+            created_at = prepared_data["created_at"]
+            tags_text = self._serialize_tags(prepared_data.get("tags", []))
+
+            rows.append(
+                (
+                    entry_id,
+                    encrypted_data,
+                    created_at,
+                    created_at,
+                    tags_text,
+                    encrypted_header,
+                )
+            )
+            entries.append(
+                self._build_entry(entry_id, prepared_data, created_at, tags_text)
+            )
+
+        try:
+            with self._transaction():
+                self._executemany(
+                    """
+                    INSERT INTO vault_entries (
+                        id,
+                        encrypted_data,
+                        created_at,
+                        updated_at,
+                        tags,
+                        encrypted_header
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?);
+                    """,
+                    rows,
+                )
+
+        except Exception as exc:
+            raise EntryManagerError("Failed to create vault entries.") from exc
+
+        self._publish_event(
+            EntriesCreated(
+                name="EntriesCreated",
+                timestamp=now_utc(),
+                entry_ids=[entry["id"] for entry in entries],
+            )
+        )
+
+        return entries
+
+    def update_entries(
+        self,
+        data_dicts: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        """
+        Обновляет несколько записей в одной транзакции.
+
+        Каждый словарь должен содержать поле id. Текущие записи
+        читаются одним запросом, объединяются с новыми данными
+        и сохраняются одним пакетом.
+        """
+
+        entry_ids = []
+
+        for data_dict in data_dicts:
+            entry_id = data_dict.get("id")
+
+            if not entry_id:
+                raise EntryManagerError("Entry id is required for update.")
+
+            entry_ids.append(entry_id)
+
+        if not entry_ids:
+            return []
+
+        current_entries = {
+            entry["id"]: entry
+            for entry in self._load_entries_by_ids(entry_ids)
+        }
+
+        if any(entry_id not in current_entries for entry_id in entry_ids):
+            raise EntryManagerError("Vault entry was not found.")
+
+        prepared_entries = []
+
+        for data_dict in data_dicts:
+            updated_entry = dict(current_entries[data_dict["id"]])
+            updated_entry.update(data_dict)
+
+            self._validate_entry_data(updated_entry)
+
+            updated_at = self._utc_now()
+
+            updated_entry["created_at"] = updated_entry.get(
+                "created_at",
+                updated_at,
+            )
+            updated_entry["updated_at"] = updated_at
+            updated_entry["version"] = updated_entry.get("version", 1)
+
+            prepared_entries.append(updated_entry)
+
+        encrypted_parts = self.encryption_service.encrypt_entries_parts(
+            prepared_entries,
+            self.key_manager,
+            associated_data=[
+                updated_entry["id"].encode("utf-8")
+                for updated_entry in prepared_entries
+            ],
+        )
+
+        rows: list[tuple[Any, ...]] = []
+        entries: list[dict[str, Any]] = []
+
+        for updated_entry, (encrypted_header, encrypted_data) in zip(
+            prepared_entries,
+            encrypted_parts,
+        ):
+            entry_id = updated_entry["id"]
+            updated_at = updated_entry["updated_at"]
+            tags_text = self._serialize_tags(updated_entry.get("tags", []))
+
+            rows.append(
+                (encrypted_data, encrypted_header, updated_at, tags_text, entry_id)
+            )
+            entries.append(
+                self._build_entry(entry_id, updated_entry, updated_at, tags_text)
+            )
+
+        try:
+            with self._transaction():
+                self._executemany(
+                    """
+                    UPDATE vault_entries
+                    SET encrypted_data = ?,
+                        encrypted_header = ?,
+                        updated_at = ?,
+                        tags = ?
+                    WHERE id = ?;
+                    """,
+                    rows,
+                )
+
+        except Exception as exc:
+            raise EntryManagerError("Failed to update vault entries.") from exc
+
+        for entry in entries:
+            self.entry_cache.discard(entry["id"])
+
+        self._publish_event(
+            EntriesUpdated(
+                name="EntriesUpdated",
+                timestamp=now_utc(),
+                entry_ids=[entry["id"] for entry in entries],
+            )
+        )
+
+        return entries
+
+    def delete_entries(
+        self,
+        entry_ids: list[str],
+        soft_delete: bool = True,
+    ) -> list[str]:
+        """
+        Удаляет несколько записей в одной транзакции.
+
+        Если soft_delete=True, записи переносятся в deleted_entries.
+        Возвращает id записей, которые действительно были удалены.
+        """
+
+        existing_ids = set(self._find_existing_ids(entry_ids))
+        deleted_ids = [
+            entry_id
+            for entry_id in dict.fromkeys(entry_ids)
+            if entry_id in existing_ids
+        ]
+
+        if not deleted_ids:
+            return []
+
+        try:
+            with self._transaction():
+                if soft_delete:
+                    deleted_at = self._utc_now()
+                    expires_at = (
+                        datetime.now(timezone.utc) + timedelta(days=30)
+                    ).isoformat()
+
+                    self._executemany(
+                        """
+                        INSERT INTO deleted_entries (
+                            id,
+                            encrypted_data,
+                            created_at,
+                            updated_at,
+                            deleted_at,
+                            expires_at,
+                            tags,
+                            encrypted_header
+                        )
+                        SELECT id, encrypted_data, created_at, updated_at, ?, ?, tags, encrypted_header
+                        FROM vault_entries
+                        WHERE id = ?;
+                        """,
+                        [
+                            (deleted_at, expires_at, entry_id)
+                            for entry_id in deleted_ids
+                        ],
+                    )
+
+                self._executemany(
+                    """
+                    DELETE FROM vault_entries
+                    WHERE id = ?;
+                    """,
+                    [(entry_id,) for entry_id in deleted_ids],
+                )
+
+                if not soft_delete:
+                    self._delete_attachments(deleted_ids)
+
+        except Exception as exc:
+            raise EntryManagerError("Failed to delete vault entries.") from exc
+
+        for entry_id in deleted_ids:
+            self.entry_cache.discard(entry_id)
+
+        self._publish_event(
+            EntriesDeleted(
+                name="EntriesDeleted",
+                timestamp=now_utc(),
+                entry_ids=deleted_ids,
+            )
+        )
+
+        return deleted_ids
+
+    def purge_expired_entries(self) -> int:
+        """
+        Окончательно удаляет записи из deleted_entries, срок хранения
+        которых истёк, вместе с их вложениями.
+
+        Возвращает число удалённых записей.
+        """
+
+        now = self._utc_now()
+
+        try:
+            with self._transaction():
+                expired_ids = [
+                    row[0]
+                    for row in self.db.execute(
+                        "SELECT id FROM deleted_entries WHERE expires_at <= ?;",
+                        (now,),
+                    ).fetchall()
+                ]
+
+                if expired_ids:
+                    self._executemany(
+                        "DELETE FROM deleted_entries WHERE id = ?;",
+                        [(entry_id,) for entry_id in expired_ids],
+                    )
+                    self._delete_attachments(expired_ids)
+
+        except Exception as exc:
+            raise EntryManagerError("Failed to purge deleted entries.") from exc
+
+        return len(expired_ids)
+
     def generate_password(self, length: int = 20) -> str:
         return self.password_generator.generate(length=length)
 
-    def _row_to_entry(self, row) -> dict[str, Any]:
+    def close(self) -> None:
+        """
+        Останавливает пул потоков расшифровки, если он был создан,
+        записывает накопленные счётчики шифрований и отписывается
+        от очистки ключа, чтобы KeyManager не удерживал менеджер.
+        """
+
+        self._flush_key_usage()
+
+        if hasattr(self.key_manager, "remove_key_cleared_listener"):
+            self.key_manager.remove_key_cleared_listener(self._on_key_cleared)
+
+        self.entry_cache.clear()
+
+        with self._executor_lock:
+            executor = self._decrypt_executor
+            self._decrypt_executor = None
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _decrypt_rows(
+        self,
+        rows: list[Any],
+        decode_row: Callable[..., dict[str, Any]],
+        legacy_rows: list[tuple[str, str, dict[str, Any]]],
+    ) -> list[dict[str, Any]]:
+        """
+        Расшифровывает страницу строк с сохранением порядка.
+
+        Большие страницы делятся на части по числу потоков и
+        расшифровываются параллельно; маленькие - в текущем потоке.
+        Потоки одалживают ключ через KeyStorage, блокировка которого
+        не даёт затереть ключ (блокировка, TTL) посреди создания шифра.
+        """
+
+        if (
+            self.decrypt_workers == 1
+            or len(rows) < self.parallel_decrypt_threshold
+        ):
+            return [decode_row(row, legacy_rows) for row in rows]
+
+        chunk_size = -(-len(rows) // self.decrypt_workers)
+        chunks = [
+            rows[i:i + chunk_size]
+            for i in range(0, len(rows), chunk_size)
+        ]
+
+        def decode_chunk(chunk: list[Any]) -> list[dict[str, Any]]:
+            return [decode_row(row, legacy_rows) for row in chunk]
+
+        entries: list[dict[str, Any]] = []
+
+        for decoded in self._get_decrypt_executor().map(decode_chunk, chunks):
+            entries.extend(decoded)
+
+        return entries
+
+    def _get_decrypt_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._decrypt_executor is None:
+                self._decrypt_executor = ThreadPoolExecutor(
+                    max_workers=self.decrypt_workers,
+                    thread_name_prefix="vault-decrypt",
+                )
+
+            return self._decrypt_executor
+
+    def _row_to_entry(
+        self,
+        row,
+        legacy_rows: list[tuple[str, str, dict[str, Any]]] | None = None,
+    ) -> dict[str, Any]:
         entry_id = row[0]
         encrypted_data = row[1]
         created_at = row[2]
         updated_at = row[3]
         tags_text = row[4]
+        encrypted_header = row[5]
+
+        payload = self._get_cached_payload(entry_id, updated_at)
+
+        if payload is None:
+            if encrypted_header is None:
+                payload = self.encryption_service.decrypt_entry(
+                    encrypted_data,
+                    self.key_manager,
+                    associated_data=entry_id.encode("utf-8"),
+                )
+                self._queue_legacy_migration(
+                    legacy_rows,
+                    entry_id,
+                    updated_at,
+                    payload,
+                )
+            else:
+                payload = self.encryption_service.decrypt_entry_parts(
+                    encrypted_header,
+                    encrypted_data,
+                    self.key_manager,
+                    associated_data=entry_id.encode("utf-8"),
+                )
+
+            self.entry_cache.put(
+                entry_id,
+                updated_at,
+                self.encryption_service.serialize_entry(payload),
+            )
 
-        payload = self.encryption_service.decrypt_entry(
-            encrypted_data,
+        return self._finalize_entry(
+            payload,
+            entry_id,
+            created_at,
+            updated_at,
+            tags_text,
+        )
+
+    def _row_to_metadata(
+        self,
+        row,
+        legacy_rows: list[tuple[str, str, dict[str, Any]]] | None = None,
+    ) -> dict[str, Any]:
+        entry_id = row[0]
+        encrypted_data = row[1]
+        created_at = row[2]
+        updated_at = row[3]
+        tags_text = row[4]
+        encrypted_header = row[5]
+
+        if encrypted_header is None:
+            payload = self.encryption_service.decrypt_entry(
+                encrypted_data,
+                self.key_manager,
+                associated_data=entry_id.encode("utf-8"),
+            )
+            self._queue_legacy_migration(
+                legacy_rows,
+                entry_id,
+                updated_at,
+                payload,
+            )
+
+            header = {
+                field: payload.get(field, "")
+                for field in self.encryption_service.HEADER_FIELDS
+            }
+        else:
+            header = self.encryption_service.decrypt_entry_header(
+                encrypted_header,
+                self.key_manager,
+                associated_data=entry_id.encode("utf-8"),
+            )
+
+        return self._finalize_entry(
+            header,
+            entry_id,
+            created_at,
+            updated_at,
+            tags_text,
+        )
+
+    def _queue_legacy_migration(
+        self,
+        legacy_rows: list[tuple[str, str, dict[str, Any]]] | None,
+        entry_id: str,
+        updated_at: str,
+        payload: dict[str, Any],
+    ) -> None:
+        if legacy_rows is None:
+            self._migrate_legacy_entries([(entry_id, updated_at, dict(payload))])
+            return
+
+        legacy_rows.append((entry_id, updated_at, dict(payload)))
+
+    def _migrate_legacy_entries(
+        self,
+        legacy_rows: list[tuple[str, str, dict[str, Any]]],
+    ) -> None:
+        """
+        Переводит записи старого формата в раздельный формат header/body.
+
+        Выполняется лениво при чтении. updated_at не меняется, поэтому
+        ключи кэша и позиции пагинации остаются прежними. Если запись
+        не удалось переписать, миграция повторится при следующем чтении.
+        """
+
+        if not legacy_rows:
+            return
+
+        encrypted_parts = self.encryption_service.encrypt_entries_parts(
+            [payload for _, _, payload in legacy_rows],
             self.key_manager,
-            associated_data=entry_id.encode("utf-8"),
+            associated_data=[
+                entry_id.encode("utf-8") for entry_id, _, _ in legacy_rows
+            ],
         )
 
+        rows = [
+            (encrypted_header, encrypted_body, entry_id, updated_at)
+            for (entry_id, updated_at, _), (encrypted_header, encrypted_body)
+            in zip(legacy_rows, encrypted_parts)
+        ]
+
+        try:
+            with self._transaction():
+                self._executemany(
+                    """
+                    UPDATE vault_entries
+                    SET encrypted_header = ?,
+                        encrypted_data = ?
+                    WHERE id = ?
+                      AND updated_at = ?
+                      AND encrypted_header IS NULL;
+                    """,
+                    rows,
+                )
+        except Exception:
+            return
+
+    def _rekey_stale_rows(
+        self,
+        rows: list[Any],
+        entries: list[dict[str, Any]],
+        metadata_only: bool = False,
+    ) -> None:
+        """
+        Переписывает активным ключом прочитанные записи, зашифрованные
+        прежней версией ключа данных (после ленивой ротации ключа).
+
+        Как и миграция старого формата, выполняется при чтении и не меняет
+        updated_at. Строка переписывается, только если её шифртекст не
+        изменился после чтения; ошибка записи не мешает чтению, остаток
+        перешифрует ReencryptionEngine.drain_step(). При чтении списка
+        переписывается только заголовок.
+        """
+
+        if not getattr(self.key_manager, "retired_key_versions", lambda: [])():
+            return
+
+        active_version = self.key_manager.active_key_version
+        key_version = self.encryption_service.blob_key_version
+
+        # записи старого формата уже переписаны _migrate_legacy_entries()
+        stale = [
+            (row, entry)
+            for row, entry in zip(rows, entries)
+            if row[5] is not None
+            and (
+                key_version(row[5]) != active_version
+                or (not metadata_only and key_version(row[1]) != active_version)
+            )
+        ]
+
+        if not stale:
+            return
+
+        associated_data = [row[0].encode("utf-8") for row, _ in stale]
+
+        if metadata_only:
+            encrypted_headers = self.encryption_service.encrypt_entry_headers(
+                [
+                    {
+                        field: entry[field]
+                        for field in self.encryption_service.HEADER_FIELDS
+                        if field in entry
+                    }
+                    for _, entry in stale
+                ],
+                self.key_manager,
+                associated_data=associated_data,
+            )
+
+            query = """
+                UPDATE vault_entries
+                SET encrypted_header = ?
+                WHERE id = ?
+                  AND encrypted_header = ?;
+            """
+            params = [
+                (encrypted_header, row[0], row[5])
+                for (row, _), encrypted_header in zip(stale, encrypted_headers)
+            ]
+        else:
+            encrypted_parts = self.encryption_service.encrypt_entries_parts(
+                [entry for _, entry in stale],
+                self.key_manager,
+                associated_data=associated_data,
+            )
+
+            query = """
+                UPDATE vault_entries
+                SET encrypted_header = ?,
+                    encrypted_data = ?
+                WHERE id = ?
+                  AND encrypted_header = ?
+                  AND encrypted_data = ?;
+            """
+            params = [
+                (encrypted_header, encrypted_body, row[0], row[5], row[1])
+                for (row, _), (encrypted_header, encrypted_body)
+                in zip(stale, encrypted_parts)
+            ]
+
+        try:
+            with self._transaction():
+                self._executemany(query, params)
+        except Exception:
+            return
+
+    def _get_cached_payload(
+        self,
+        entry_id: str,
+        updated_at: str,
+    ) -> dict[str, Any] | None:
+        # попадание в кэш не обращается к ключу, поэтому отдельно
+        # проверяется, что ключ ещё активен (это же запускает очистку по TTL)
+        if hasattr(self.key_manager, "has_active_key"):
+            if not self.key_manager.has_active_key():
+                self.entry_cache.clear()
+                return None
+
+        return self.entry_cache.get(
+            entry_id,
+            updated_at,
+            self.encryption_service.deserialize_entry,
+        )
+
+    def _build_entry(
+        self,
+        entry_id: str,
+        entry_data: dict[str, Any],
+        updated_at: str,
+        tags_text: str,
+    ) -> dict[str, Any]:
+        """
+        Собирает запись в том же виде, в каком её вернул бы get_entry,
+        но без обращения к базе и без расшифровки.
+        """
+
+        payload = self.encryption_service._build_payload(entry_data)
+
+        return self._finalize_entry(
+            payload,
+            entry_id,
+            entry_data["created_at"],
+            updated_at,
+            tags_text,
+        )
+
+    def _finalize_entry(
+        self,
+        payload: dict[str, Any],
+        entry_id: str,
+        created_at: str,
+        updated_at: str,
+        tags_text: str | None,
+    ) -> dict[str, Any]:
         payload["id"] = entry_id
         payload["created_at"] = payload.get("created_at", created_at)
         payload["updated_at"] = updated_at
@@ -329,6 +1111,118 @@ class EntryManager:
 
         return payload
 
+    def _iter_pages(
+        self,
+        page_size: int | None,
+        after: tuple[str, str] | None,
+        metadata_only: bool = False,
+    ) -> Iterator[list[Any]]:
+        page_size = page_size or self.PAGE_SIZE
+
+        if page_size < 1:
+            raise ValueError("Page size must be positive.")
+
+        position = after
+
+        while True:
+            rows = self._fetch_page(page_size, position, metadata_only)
+
+            if not rows:
+                return
+
+            yield rows
+
+            if len(rows) < page_size:
+                return
+
+            position = (rows[-1][3], rows[-1][0])
+
+    def _fetch_page(
+        self,
+        page_size: int,
+        after: tuple[str, str] | None,
+        metadata_only: bool = False,
+    ) -> list[Any]:
+        # для списка секретная часть читается только у записей
+        # старого формата, где она совпадает с заголовком
+        if metadata_only:
+            data_column = (
+                "CASE WHEN encrypted_header IS NULL "
+                "THEN encrypted_data END AS encrypted_data"
+            )
+        else:
+            data_column = "encrypted_data"
+
+        if after is None:
+            cursor = self.db.execute(
+                f"""
+                SELECT id, {data_column}, created_at, updated_at, tags, encrypted_header
+                FROM vault_entries
+                ORDER BY updated_at DESC, id DESC
+                LIMIT ?;
+                """,
+                (page_size,),
+            )
+        else:
+            updated_at, entry_id = after
+
+            cursor = self.db.execute(
+                f"""
+                SELECT id, {data_column}, created_at, updated_at, tags, encrypted_header
+                FROM vault_entries
+                WHERE updated_at <= ?
+                  AND (updated_at < ? OR id < ?)
+                ORDER BY updated_at DESC, id DESC
+                LIMIT ?;
+                """,
+                (updated_at, updated_at, entry_id, page_size),
+            )
+
+        return cursor.fetchall()
+
+    def _load_entries_by_ids(self, entry_ids: list[str]) -> list[dict[str, Any]]:
+        entries: list[dict[str, Any]] = []
+
+        for chunk in self._chunked(list(dict.fromkeys(entry_ids))):
+            placeholders = ", ".join("?" for _ in chunk)
+
+            cursor = self.db.execute(
+                f"""
+                SELECT id, encrypted_data, created_at, updated_at, tags, encrypted_header
+                FROM vault_entries
+                WHERE id IN ({placeholders});
+                """,
+                tuple(chunk),
+            )
+
+            for row in cursor.fetchall():
+                entries.append(self._row_to_entry(row))
+
+        return entries
+
+    def _find_existing_ids(self, entry_ids: list[str]) -> list[str]:
+        existing_ids: list[str] = []
+
+        for chunk in self._chunked(list(dict.fromkeys(entry_ids))):
+            placeholders = ", ".join("?" for _ in chunk)
+
+            cursor = self.db.execute(
+                f"""
+                SELECT id
+                FROM vault_entries
+                WHERE id IN ({placeholders});
+                """,
+                tuple(chunk),
+            )
+
+            existing_ids.extend(row[0] for row in cursor.fetchall())
+
+        return existing_ids
+
+    def _chunked(self, items: list[Any]) -> list[list[Any]]:
+        size = self.BATCH_QUERY_SIZE
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
     def _validate_entry_data(self, data_dict: dict[str, Any]) -> None:
         title = str(data_dict.get("title", "")).strip()
         password = str(data_dict.get("password", "")).strip()
@@ -384,7 +1278,7 @@ class EntryManager:
 
         cursor = self.db.execute(
             """
-            SELECT id, encrypted_data, created_at, updated_at, tags
+            SELECT id, encrypted_data, created_at, updated_at, tags, encrypted_header
             FROM vault_entries
             WHERE id = ?;
             """,
@@ -411,9 +1305,10 @@ class EntryManager:
                     updated_at,
                     deleted_at,
                     expires_at,
-                    tags
+                    tags,
+                    encrypted_header
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?);
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?);
                 """,
                 (
                     row[0],
@@ -423,17 +1318,24 @@ class EntryManager:
                     deleted_at,
                     expires_at,
                     row[4],
+                    row[5],
                 ),
             )
 
-            self._delete_permanently(entry_id)
-
-            return True
-
         except Exception:
             return False
 
+        # перенос и удаление выполняются в общей транзакции delete_entry;
+        # вложения остаются, пока запись можно восстановить
+        self._delete_entry_row(entry_id)
+
+        return True
+
     def _delete_permanently(self, entry_id: str) -> None:
+        self._delete_entry_row(entry_id)
+        self._delete_attachments([entry_id])
+
+    def _delete_entry_row(self, entry_id: str) -> None:
         self.db.execute(
             """
             DELETE FROM vault_entries
@@ -442,10 +1344,126 @@ class EntryManager:
             (entry_id,),
         )
 
+    def _delete_attachments(self, entry_ids: list[str]) -> None:
+        """
+        Удаляет вложения записей в текущей транзакции.
+
+        Счётчики ссылок кусков уменьшаются, куски без ссылок удаляются.
+        """
+
+        params = [(entry_id, entry_id) for entry_id in entry_ids]
+
+        self._executemany(
+            """
+            UPDATE attachment_blobs
+            SET ref_count = ref_count - (
+                SELECT COUNT(*)
+                FROM attachment_chunks c
+                JOIN attachments a ON a.id = c.attachment_id
+                WHERE a.entry_id = ?
+                  AND c.chunk_hash = attachment_blobs.chunk_hash
+            )
+            WHERE chunk_hash IN (
+                SELECT c.chunk_hash
+                FROM attachment_chunks c
+                JOIN attachments a ON a.id = c.attachment_id
+                WHERE a.entry_id = ?
+            );
+            """,
+            params,
+        )
+
+        self._executemany(
+            """
+            DELETE FROM attachment_chunks
+            WHERE attachment_id IN (
+                SELECT id FROM attachments WHERE entry_id = ?
+            );
+            """,
+            [(entry_id,) for entry_id in entry_ids],
+        )
+
+        self._executemany(
+            "DELETE FROM attachments WHERE entry_id = ?;",
+            [(entry_id,) for entry_id in entry_ids],
+        )
+
+        self.db.execute("DELETE FROM attachment_blobs WHERE ref_count <= 0;")
+
+    def _executemany(self, query: str, params_seq: list[tuple[Any, ...]]) -> None:
+        if hasattr(self.db, "executemany"):
+            self.db.executemany(query, params_seq)
+            return
+
+        for params in params_seq:
+            self.db.execute(query, params)
+
     def _publish_event(self, event: Any) -> None:
         if self.event_bus is not None:
             self.event_bus.publish(event)
 
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """
+        Единица работы над базой.
+
+        Если база поддерживает transaction(), все изменения фиксируются
+        одним commit. Иначе используется commit/rollback соединения.
+        Счётчик шифрований ключом пишется в том же commit.
+        """
+
+        usage: dict[str, int] = {}
+
+        if hasattr(self.db, "transaction"):
+            # во вложенном блоке счётчик запишет внешняя единица работы
+            outermost = not getattr(self.db, "in_transaction", False)
+
+            try:
+                with self.db.transaction():
+                    yield
+
+                    if outermost:
+                        usage = self._write_key_usage()
+            except BaseException:
+                self._restore_key_usage(usage)
+                raise
+
+            return
+
+        try:
+            yield
+            usage = self._write_key_usage()
+            self._commit()
+        except BaseException:
+            self._rollback()
+            self._restore_key_usage(usage)
+            raise
+
+    def _write_key_usage(self) -> dict[str, int]:
+        if hasattr(self.key_manager, "write_key_usage"):
+            return self.key_manager.write_key_usage(self.db)
+
+        return {}
+
+    def _restore_key_usage(self, usage: dict[str, int]) -> None:
+        if usage:
+            self.key_manager.restore_key_usage(usage)
+
+    def _flush_key_usage(self) -> None:
+        # при блокировке и закрытии своей транзакции нет
+        if hasattr(self.key_manager, "flush_key_usage"):
+            self.key_manager.flush_key_usage(self.db)
+
+    def _on_key_cleared(self) -> None:
+        self.entry_cache.clear()
+
+        # счётчики шифрований не должны пропасть при блокировке;
+        # если записать не удалось, они остаются в памяти KeyManager
+        try:
+            self._flush_key_usage()
+        except Exception:
+            pass
+
     def _commit(self) -> None:
         if hasattr(self.db, "commit"):
             self.db.commit()
@@ -0,0 +1,570 @@
+from __future__ import annotations
+
+import json
+import struct
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+from src.core.events import EventBus, now_utc
+from src.core.key_manager import KeyManager
+from src.core.vault.attachment_manager import AttachmentManager
+from src.core.vault.encryption_service import AESGCMEncryptionService
+
+class ReencryptionError(Exception):
+    """Ошибка перешифрования хранилища."""
+
+@dataclass
+class ReencryptionProgress:
+    name: str
+    timestamp: str
+    table: str
+    processed: int
+    total: int
+
+@dataclass
+class ReencryptionCompleted:
+    name: str
+    timestamp: str
+    key_id: str
+    processed: int
+
+@dataclass
+class KeySlotsRemoved:
+    name: str
+    timestamp: str
+    slot_ids: list[str]
+
+class _StaticKey:
+    # key_manager для сервиса шифрования с заранее известным ключом
+    def __init__(
+        self,
+        key: bytes,
+        key_version: int | None = None,
+        record_usage: Callable[[int], None] | None = None,
+    ) -> None:
+        self._key = key
+        self._record_usage = record_usage
+        self.active_key_version = key_version
+
+    def get_active_key(self) -> bytes:
+        return self._key
+
+    def record_key_usage(self, count: int = 1) -> None:
+        if self._record_usage is not None:
+            self._record_usage(count)
+
+class ReencryptionEngine:
+    """
+    Перешифрование всего хранилища новым ключом данных.
+
+    Используется для ротации ключа данных, смены шифра и смены пароля
+    хранилищ, где ключ данных получен из старого пароля.
+
+    Таблицы обрабатываются порциями по batch_size строк в порядке id.
+    Каждая порция и контрольная точка (таблица, последний id, id целевого
+    ключа) в settings фиксируются одной транзакцией, поэтому после сбоя
+    resume() продолжает с первой необработанной строки. До завершения
+    основным остаётся старый ключ, новый хранится в key_store как
+    ожидающий (см. KeyManager.begin_data_key_rotation).
+
+    Во время перешифрования хранилище не должно изменяться другими
+    компонентами: resume() нужно вызывать сразу после разблокировки,
+    до открытия записей.
+
+    После ленивой ротации (KeyManager.rotate_data_key_lazily) данные
+    прежних версий ключа переписываются небольшими порциями через
+    drain_step(); между порциями хранилище можно использовать.
+    """
+
+    DEFAULT_BATCH_SIZE = 200
+    DRAIN_BATCH_SIZE = 20
+    CHECKPOINT_SETTING = "reencryption_checkpoint"
+
+    # порядок обработки; вложения перешифровываются по одному целиком
+    ENTRY_TABLES = ("vault_entries", "deleted_entries")
+    ATTACHMENTS_STAGE = "attachments"
+
+    def __init__(
+        self,
+        db,
+        key_manager: KeyManager,
+        event_bus: EventBus | None = None,
+        encryption_service: AESGCMEncryptionService | None = None,
+        target_encryption_service: AESGCMEncryptionService | None = None,
+        batch_size: int | None = None,
+    ) -> None:
+        self.db = db
+        self.key_manager = key_manager
+        self.event_bus = event_bus
+
+        self.encryption_service = (
+            encryption_service
+            if encryption_service is not None
+            else AESGCMEncryptionService()
+        )
+
+        self.target_encryption_service = (
+            target_encryption_service
+            if target_encryption_service is not None
+            else self.encryption_service
+        )
+
+        self.batch_size = batch_size or self.DEFAULT_BATCH_SIZE
+
+        if self.batch_size < 1:
+            raise ValueError("Batch size must be positive.")
+
+    def change_master_password(
+        self,
+        old_password: str,
+        new_password: str,
+        drop_key_slots: bool = False,
+    ) -> int:
+        """
+        Меняет мастер-пароль.
+
+        Если ключ данных случайный, перешифровывается только его обёртка.
+        Если ключ данных получен из старого пароля (хранилище до
+        конвертного шифрования), он заменяется новым случайным ключом
+        с перешифрованием всех данных; дополнительные слоты при этом
+        удаляются только с drop_key_slots=True (см. rotate_data_key).
+        Возвращает число перешифрованных строк.
+        """
+
+        if not self.key_manager.is_data_key_derived_from_password(self.db):
+            self.key_manager.change_master_password(self.db, old_password, new_password)
+            return 0
+
+        return self.rotate_data_key(
+            old_password,
+            new_password=new_password,
+            drop_key_slots=drop_key_slots,
+        )
+
+    def rotate_data_key(
+        self,
+        password: str,
+        new_password: str | None = None,
+        drop_key_slots: bool = False,
+    ) -> int:
+        """
+        Заменяет ключ данных новым и перешифровывает хранилище.
+
+        Если есть дополнительные слоты или быстрая разблокировка, без
+        drop_key_slots=True выбрасывается KeySlotsError и ничего не
+        меняется; с ним слоты удаляются и публикуется KeySlotsRemoved.
+        """
+
+        self.key_manager.begin_data_key_rotation(
+            self.db,
+            password,
+            new_password,
+            drop_key_slots=drop_key_slots,
+        )
+        return self.resume()
+
+    def has_pending(self) -> bool:
+        return self.key_manager.get_pending_data_key() is not None
+
+    def resume(self) -> int:
+        """
+        Продолжает начатую ротацию с контрольной точки.
+
+        Ничего не делает, если ротация не начата. Возвращает число
+        строк, перешифрованных этим вызовом.
+        """
+
+        pending = self.key_manager.get_pending_data_key()
+
+        if pending is None:
+            return 0
+
+        key_id, new_key = pending
+        # источник - сам KeyManager: в хранилище могут быть данные
+        # нескольких версий ключа после ленивых ротаций
+        source = self.key_manager
+        target = _StaticKey(
+            new_key,
+            self.key_manager.pending_key_version,
+            lambda count: self.key_manager.record_key_usage(count, key_id),
+        )
+
+        checkpoint = self._load_checkpoint(key_id)
+        stages = list(self.ENTRY_TABLES) + [self.ATTACHMENTS_STAGE]
+        start = stages.index(checkpoint["table"]) if checkpoint else 0
+        last_id = checkpoint["last_id"] if checkpoint else None
+        processed = 0
+
+        for stage in stages[start:]:
+            if stage == self.ATTACHMENTS_STAGE:
+                processed += self._reencrypt_attachments(
+                    key_id, source, target, last_id,
+                )
+            else:
+                processed += self._reencrypt_table(
+                    stage, key_id, source, target, last_id,
+                )
+
+            last_id = None
+
+        with self._transaction():
+            removed_slots = self.key_manager.complete_data_key_rotation(self.db)
+            self.db.execute(
+                "DELETE FROM settings WHERE setting_key = ?;",
+                (self.CHECKPOINT_SETTING,),
+            )
+
+        if removed_slots:
+            self._publish_event(
+                KeySlotsRemoved(
+                    name="KeySlotsRemoved",
+                    timestamp=now_utc(),
+                    slot_ids=removed_slots,
+                )
+            )
+
+        self._publish_event(
+            ReencryptionCompleted(
+                name="ReencryptionCompleted",
+                timestamp=now_utc(),
+                key_id=key_id,
+                processed=processed,
+            )
+        )
+
+        return processed
+
+    def drain_step(self, batch_size: int | None = None) -> int:
+        """
+        Переписывает активным ключом одну порцию данных прежних версий.
+
+        Рассчитан на вызов в фоне между действиями пользователя. Возвращает
+        число переписанных строк и вложений; 0 - данных прежних версий не
+        осталось, и их ключи удалены (KeyManager.drop_retired_data_keys).
+        """
+
+        if not self.key_manager.retired_key_versions():
+            return 0
+
+        limit = batch_size or self.DRAIN_BATCH_SIZE
+        version = struct.pack(">H", self.key_manager.active_key_version)
+
+        for table in self.ENTRY_TABLES:
+            rows = self.db.execute(
+                f"""
+                SELECT id, encrypted_data, encrypted_header
+                FROM {table}
+                WHERE {self._stale_condition("encrypted_data")}
+                   OR (
+                       encrypted_header IS NOT NULL
+                       AND {self._stale_condition("encrypted_header")}
+                   )
+                ORDER BY id
+                LIMIT ?;
+                """,
+                (version, version, limit),
+            ).fetchall()
+
+            if rows:
+                params = self._reencrypt_rows(table, rows, self.key_manager, self.key_manager)
+
+                # строка, изменённая после чтения, уже зашифрована активным ключом
+                with self._transaction():
+                    self._executemany(
+                        f"""
+                        UPDATE {table}
+                        SET encrypted_data = ?, encrypted_header = ?
+                        WHERE id = ?
+                          AND encrypted_data = ?
+                          AND encrypted_header IS ?;
+                        """,
+                        [
+                            (*new_values, old_data, old_header)
+                            for new_values, (_, old_data, old_header) in zip(params, rows)
+                        ],
+                    )
+
+                return len(rows)
+
+        rows = self.db.execute(
+            f"""
+            SELECT id
+            FROM attachments
+            WHERE {self._stale_condition("encrypted_name")}
+            ORDER BY id
+            LIMIT ?;
+            """,
+            (version, limit),
+        ).fetchall()
+
+        if rows:
+            manager = AttachmentManager(
+                self.db,
+                self.key_manager,
+                encryption_service=self.encryption_service,
+            )
+
+            for (attachment_id,) in rows:
+                with self._transaction():
+                    manager.rekey_attachment(attachment_id, manager)
+
+            return len(rows)
+
+        self.key_manager.drop_retired_data_keys(self.db)
+        return 0
+
+    def _stale_condition(self, column: str) -> str:
+        # шифртекст без заголовка версии или другой версии ключа;
+        # параметр - 2 байта активной версии
+        return (
+            f"(substr({column}, 1, 1) != X'C6' OR substr({column}, 3, 2) != ?)"
+        )
+
+    def _reencrypt_rows(
+        self,
+        table: str,
+        rows: list[Any],
+        source: Any,
+        target: Any,
+    ) -> list[tuple[bytes, bytes | None, str]]:
+        """(encrypted_data, encrypted_header, id) строк, зашифрованных target."""
+
+        items: list[bytes] = []
+        associated: list[bytes] = []
+
+        for entry_id, encrypted_data, encrypted_header in rows:
+            entry_aad = entry_id.encode("utf-8")
+
+            # формат записи не меняется: перешифровываются готовые
+            # части с теми же associated_data
+            if encrypted_header is None:
+                items.append(encrypted_data)
+                associated.append(entry_aad)
+            else:
+                items.append(encrypted_header)
+                associated.append(entry_aad + self.encryption_service.HEADER_AAD_LABEL)
+                items.append(encrypted_data)
+                associated.append(entry_aad + self.encryption_service.BODY_AAD_LABEL)
+
+        plaintexts = []
+
+        for result in self.encryption_service.decrypt_many(items, source, associated):
+            if not result.ok:
+                raise ReencryptionError(
+                    f"Failed to decrypt a row in {table}."
+                ) from result.error
+
+            plaintexts.append(result.value)
+
+        encrypted = self.target_encryption_service.encrypt_many(
+            plaintexts,
+            target,
+            associated,
+        )
+
+        params = []
+        position = 0
+
+        for entry_id, _, encrypted_header in rows:
+            if encrypted_header is None:
+                params.append((encrypted[position], None, entry_id))
+                position += 1
+            else:
+                params.append((encrypted[position + 1], encrypted[position], entry_id))
+                position += 2
+
+        return params
+
+    def _reencrypt_table(
+        self,
+        table: str,
+        key_id: str,
+        source: Any,
+        target: _StaticKey,
+        last_id: str | None,
+    ) -> int:
+        total = self._count_rows(table)
+        done = self._count_rows(table, last_id)
+        processed = 0
+
+        while True:
+            rows = self.db.execute(
+                f"""
+                SELECT id, encrypted_data, encrypted_header
+                FROM {table}
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?;
+                """,
+                (last_id or "", self.batch_size),
+            ).fetchall()
+
+            if not rows:
+                return processed
+
+            params = self._reencrypt_rows(table, rows, source, target)
+            last_id = rows[-1][0]
+
+            # updated_at не меняется: содержимое записей осталось прежним
+            with self._transaction():
+                self._executemany(
+                    f"""
+                    UPDATE {table}
+                    SET encrypted_data = ?, encrypted_header = ?
+                    WHERE id = ?;
+                    """,
+                    params,
+                )
+                self._save_checkpoint(key_id, table, last_id)
+
+            processed += len(rows)
+            self._publish_progress(table, done + processed, total)
+
+    def _reencrypt_attachments(
+        self,
+        key_id: str,
+        source: Any,
+        target: _StaticKey,
+        last_id: str | None,
+    ) -> int:
+        table = self.ATTACHMENTS_STAGE
+        total = self._count_rows(table)
+        done = self._count_rows(table, last_id)
+        processed = 0
+
+        source_manager = AttachmentManager(
+            self.db,
+            source,
+            encryption_service=self.encryption_service,
+        )
+        target_manager = AttachmentManager(
+            self.db,
+            target,
+            encryption_service=self.target_encryption_service,
+        )
+
+        while True:
+            rows = self.db.execute(
+                """
+                SELECT id
+                FROM attachments
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?;
+                """,
+                (last_id or "", self.batch_size),
+            ).fetchall()
+
+            if not rows:
+                return processed
+
+            for (attachment_id,) in rows:
+                with self._transaction():
+                    source_manager.rekey_attachment(attachment_id, target_manager)
+                    self._save_checkpoint(key_id, table, attachment_id)
+
+                processed += 1
+                last_id = attachment_id
+
+            self._publish_progress(table, done + processed, total)
+
+    def _count_rows(self, table: str, up_to_id: str | None = None) -> int:
+        if up_to_id is None:
+            return self.db.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+
+        return self.db.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE id <= ?;",
+            (up_to_id,),
+        ).fetchone()[0]
+
+    def _load_checkpoint(self, key_id: str) -> dict[str, Any] | None:
+        row = self.db.execute(
+            "SELECT setting_value FROM settings WHERE setting_key = ?;",
+            (self.CHECKPOINT_SETTING,),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        try:
+            checkpoint = json.loads(row[0])
+        except (TypeError, ValueError) as exc:
+            raise ReencryptionError("Re-encryption checkpoint is damaged.") from exc
+
+        # контрольная точка другой ротации: строки таблиц уже согласованы
+        # с текущим ключом, начинать нужно сначала
+        if checkpoint.get("target_key_id") != key_id:
+            return None
+
+        return checkpoint
+
+    def _save_checkpoint(self, key_id: str, table: str, last_id: str) -> None:
+        value = json.dumps(
+            {
+                "target_key_id": key_id,
+                "table": table,
+                "last_id": last_id,
+            }
+        )
+
+        self.db.execute(
+            """
+            INSERT INTO settings (setting_key, setting_value, encrypted)
+            VALUES (?, ?, 0)
+            ON CONFLICT(setting_key) DO UPDATE SET setting_value = excluded.setting_value;
+            """,
+            (self.CHECKPOINT_SETTING, value),
+        )
+
+    def _publish_progress(self, table: str, processed: int, total: int) -> None:
+        self._publish_event(
+            ReencryptionProgress(
+                name="ReencryptionProgress",
+                timestamp=now_utc(),
+                table=table,
+                processed=processed,
+                total=total,
+            )
+        )
+
+    def _executemany(self, query: str, params_seq: list[tuple[Any, ...]]) -> None:
+        if hasattr(self.db, "executemany"):
+            self.db.executemany(query, params_seq)
+            return
+
+        for params in params_seq:
+            self.db.execute(query, params)
+
+    def _publish_event(self, event: Any) -> None:
+        if self.event_bus is not None:
+            self.event_bus.publish(event)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # счётчик шифрований ключом пишется в том же commit, что и пакет
+        usage: dict[str, int] = {}
+
+        if hasattr(self.db, "transaction"):
+            outermost = not getattr(self.db, "in_transaction", False)
+
+            try:
+                with self.db.transaction():
+                    yield
+
+                    if outermost:
+                        usage = self.key_manager.write_key_usage(self.db)
+            except BaseException:
+                self.key_manager.restore_key_usage(usage)
+                raise
+
+            return
+
+        try:
+            yield
+            usage = self.key_manager.write_key_usage(self.db)
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            self.key_manager.restore_key_usage(usage)
+            raise
@@ -2,22 +2,124 @@
 
 import sqlite3
 import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 from .models import CREATE_TABLES_SQL, CREATE_INDEXES_SQL, SCHEMA_VERSION
 
-class Database:
+@dataclass(frozen=True)
+class ConnectionProfile:
+    # настройки соединения SQLite (PRAGMA), применяются при connect()
+    name: str
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size_kib: int = 16 * 1024
+    mmap_size: int = 64 * 1024 * 1024
+    temp_store: str = "MEMORY"
+    busy_timeout_ms: int = 5000
+
+# durable - каждый commit переживает отключение питания;
+# balanced - в режиме WAL при сбое питания теряются только последние
+#   транзакции, база остаётся целой;
+# bulk-import - без fsync, для массовой записи (см. Database.bulk_import)
+DURABLE_PROFILE = ConnectionProfile(
+    "durable",
+    synchronous="FULL",
+    cache_size_kib=8 * 1024,
+    mmap_size=0,
+)
+BALANCED_PROFILE = ConnectionProfile("balanced")
+BULK_IMPORT_PROFILE = ConnectionProfile(
+    "bulk-import",
+    synchronous="OFF",
+    cache_size_kib=64 * 1024,
+    mmap_size=256 * 1024 * 1024,
+)
+
+CONNECTION_PROFILES = {
+    profile.name: profile
+    for profile in (DURABLE_PROFILE, BALANCED_PROFILE, BULK_IMPORT_PROFILE)
+}
+DEFAULT_CONNECTION_PROFILE = BALANCED_PROFILE.name
+
+def get_connection_profile(name: str) -> ConnectionProfile:
+    profile = CONNECTION_PROFILES.get(name.lower())
+
+    if profile is None:
+        raise ValueError(f"Unknown database profile: {name}")
+
+    return profile
 
-    def __init__(self, db_path: Path):
+class Database:
+    # Управление транзакциями:
+    # - autocommit=True: каждый execute() вне transaction() фиксируется сразу;
+    # - autocommit=False (отложенная фиксация): изменения копятся до commit();
+    # - transaction(): единица работы с одним commit, вложенные блоки
+    #   оформляются через SAVEPOINT и откатываются независимо.
+    #
+    # Профиль соединения (ConnectionProfile или имя из CONNECTION_PROFILES)
+    # задаёт журнал, synchronous, кэш страниц, mmap, temp_store и
+    # busy_timeout. Режим WAL сохраняется в файле базы.
+    #
+    # bulk_import() ослабляет synchronous только для потока, открывшего
+    # блок; транзакции других потоков (фоновый пересчёт KDF, перешифрование
+    # старых версий ключа) и transaction(durable=True) фиксируются
+    # с synchronous профиля.
+
+    def __init__(
+            self,
+            db_path: Path,
+            autocommit: bool = True,
+            profile: ConnectionProfile | str | None = None,
+    ):
         self._db_path = db_path
-        self._lock = threading.Lock()
+        self._lock = threading.RLock()
         self._connection: Optional[sqlite3.Connection] = None
+        self._autocommit = autocommit
+        self._transaction_depth = 0
+
+        if profile is None:
+            profile = DEFAULT_CONNECTION_PROFILE
+
+        if isinstance(profile, str):
+            profile = get_connection_profile(profile)
+
+        self._profile = profile
+        self._journal_mode: str | None = None
+        self._synchronous: str | None = None
+        self._bulk_import_thread: int | None = None
 
     @property
     def path(self) -> Path:
         return self._db_path
 
+    @property
+    def autocommit(self) -> bool:
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value: bool) -> None:
+        with self._lock:
+            self._autocommit = value
+
+            if value and self._transaction_depth == 0:
+                self._connection.commit()
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._transaction_depth > 0
+
+    @property
+    def profile(self) -> ConnectionProfile:
+        return self._profile
+
+    @property
+    def journal_mode(self) -> str | None:
+        # фактический режим журнала: для базы в памяти WAL недоступен
+        return self._journal_mode
+
     def connect(self) -> None:
         self._db_path.parent.mkdir(parents=True, exist_ok=True)
         # отладочное соединение отключено
@@ -27,10 +129,87 @@ class Database:
             check_same_thread=False
         )
         self._connection.execute("PRAGMA foreign_keys = ON;")
+        self._apply_profile(self._profile)
 
         self._initialize_schema()
         self._ensure_default_settings()
 
+    def _apply_profile(self, profile: ConnectionProfile) -> None:
+        connection = self._connection
+
+        # значения подставляются в PRAGMA только из ConnectionProfile
+        connection.execute(f"PRAGMA busy_timeout = {int(profile.busy_timeout_ms)};")
+        self._journal_mode = connection.execute(
+            f"PRAGMA journal_mode = {profile.journal_mode};"
+        ).fetchone()[0].lower()
+        connection.execute(f"PRAGMA synchronous = {profile.synchronous};")
+        self._synchronous = profile.synchronous
+        # отрицательное значение cache_size - размер кэша в КиБ
+        connection.execute(f"PRAGMA cache_size = {-int(profile.cache_size_kib)};")
+        connection.execute(f"PRAGMA mmap_size = {int(profile.mmap_size)};")
+        connection.execute(f"PRAGMA temp_store = {profile.temp_store};")
+
+    @contextmanager
+    def bulk_import(self) -> Iterator["Database"]:
+        """
+        Массовая запись с профилем BULK_IMPORT_PROFILE.
+
+        На время блока fsync отключается для транзакций потока, открывшего
+        блок (кроме transaction(durable=True)). Блок не удерживает
+        блокировку соединения: другие потоки продолжают работать
+        и фиксируют свои транзакции с synchronous профиля. После выхода
+        восстанавливается профиль соединения, а журнал WAL переносится
+        в файл базы (checkpoint), чтобы следующие чтения не проходили
+        через большой WAL.
+        """
+
+        with self._lock:
+            if self._transaction_depth or self._connection.in_transaction:
+                raise RuntimeError("Bulk import cannot start inside a transaction.")
+
+            if self._bulk_import_thread is not None:
+                raise RuntimeError("Bulk import is already in progress.")
+
+            self._apply_profile(BULK_IMPORT_PROFILE)
+            self._bulk_import_thread = threading.get_ident()
+
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._bulk_import_thread = None
+                self._apply_profile(self._profile)
+                self.checkpoint()
+
+    def _select_synchronous(self, durable: bool = False) -> None:
+        # вызывается под блокировкой перед началом внешней транзакции:
+        # внутри транзакции SQLite не меняет synchronous
+        if self._connection.in_transaction:
+            return
+
+        if self._bulk_import_thread == threading.get_ident() and not durable:
+            synchronous = BULK_IMPORT_PROFILE.synchronous
+        else:
+            synchronous = self._profile.synchronous
+
+        if synchronous != self._synchronous:
+            self._connection.execute(f"PRAGMA synchronous = {synchronous};")
+            self._synchronous = synchronous
+
+    def checkpoint(self, mode: str = "TRUNCATE") -> None:
+        """Переносит журнал WAL в файл базы (PRAGMA wal_checkpoint)."""
+
+        if mode.upper() not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Unknown checkpoint mode: {mode}")
+
+        with self._lock:
+            # незафиксированные изменения (autocommit=False) не переносятся:
+            # SQLite выполнит checkpoint позже автоматически
+            if self._journal_mode != "wal" or self._connection.in_transaction:
+                return
+
+            self._connection.execute(f"PRAGMA wal_checkpoint({mode.upper()});").fetchall()
+
     def _ensure_default_settings(self) -> None:
         defaults = [
             ("auto_lock_timeout", "300", 0),
@@ -115,6 +294,43 @@ class Database:
 
                 self._set_user_version(3)
 
+            if current_version < 5:
+                for table_name in ("vault_entries", "deleted_entries"):
+                    columns = self._connection.execute(
+                        f"PRAGMA table_info({table_name});"
+                    ).fetchall()
+
+                    column_names = [column[1] for column in columns]
+
+                    if column_names and "encrypted_header" not in column_names:
+                        self._connection.execute(
+                            f"ALTER TABLE {table_name} ADD COLUMN encrypted_header BLOB;"
+                        )
+
+                self._set_user_version(5)
+
+            if current_version < 6:
+                for stmt in CREATE_TABLES_SQL:
+                    if "attachment" in stmt:
+                        self._connection.execute(stmt)
+
+                for stmt in CREATE_INDEXES_SQL:
+                    if "attachment" in stmt:
+                        self._connection.execute(stmt)
+
+                self._set_user_version(6)
+
+            if current_version < 7:
+                # keyset-пагинация сортирует по (updated_at, id): индекс
+                # только по updated_at требовал временного B-дерева
+                self._connection.execute("DROP INDEX IF EXISTS idx_vault_entries_updated_at;")
+
+                for stmt in CREATE_INDEXES_SQL:
+                    if "idx_vault_entries_updated_at_id" in stmt:
+                        self._connection.execute(stmt)
+
+                self._set_user_version(7)
+
     def _get_user_version(self) -> int:
         cursor = self._connection.execute("PRAGMA user_version;")
         return cursor.fetchone()[0]
@@ -125,9 +341,71 @@ class Database:
     def execute(self, query, params=()):
         # debug sql disabled
 
-        cursor = self._connection.execute(query, params)
-        self._connection.commit()
-        return cursor
+        with self._lock:
+            if self._bulk_import_thread is not None and self._transaction_depth == 0:
+                self._select_synchronous()
+
+            cursor = self._connection.execute(query, params)
+
+            if self._should_commit():
+                self._connection.commit()
+
+            return cursor
+
+    def executemany(self, query, params_seq):
+        # весь пакет выполняется атомарно и фиксируется одним commit
+        with self.transaction():
+            return self._connection.executemany(query, params_seq)
+
+    @contextmanager
+    def transaction(self, durable: bool = False) -> Iterator["Database"]:
+        # durable - фиксировать с synchronous профиля и внутри bulk_import();
+        # для вложенного блока действует режим внешней транзакции
+        with self._lock:
+            if self._transaction_depth == 0 and not self._connection.in_transaction:
+                savepoint = None
+                self._select_synchronous(durable)
+                self._connection.execute("BEGIN;")
+            else:
+                savepoint = f"sp_{self._transaction_depth}"
+                self._connection.execute(f"SAVEPOINT {savepoint};")
+
+            self._transaction_depth += 1
+
+            try:
+                yield self
+            except BaseException:
+                self._transaction_depth -= 1
+
+                if savepoint is None:
+                    self._connection.rollback()
+                else:
+                    self._connection.execute(f"ROLLBACK TO SAVEPOINT {savepoint};")
+                    self._connection.execute(f"RELEASE SAVEPOINT {savepoint};")
+
+                raise
+
+            self._transaction_depth -= 1
+
+            if savepoint is not None:
+                self._connection.execute(f"RELEASE SAVEPOINT {savepoint};")
+            elif self._autocommit:
+                self._connection.commit()
+
+    def commit(self) -> None:
+        # внутри transaction() фиксирует только внешний блок
+        with self._lock:
+            if self._transaction_depth == 0:
+                self._connection.commit()
+
+    def rollback(self) -> None:
+        # внутри transaction() откат выполняется при выходе из блока по исключению
+        with self._lock:
+            if self._transaction_depth == 0:
+                self._connection.rollback()
+
+    def _should_commit(self) -> bool:
+        return self._autocommit and self._transaction_depth == 0
 
     def close(self) -> None:
         if self._connection:
@@ -1,5 +1,10 @@
-﻿SCHEMA_VERSION = 4
+﻿SCHEMA_VERSION = 7
 
+# Хранение записи:
+# - encrypted_header IS NULL - старый формат, encrypted_data содержит всю запись;
+# - encrypted_header задан - раздельный формат: encrypted_header хранит
+#   поля для списка (title/username/url/category), encrypted_data - секреты
+#   (password/notes).
 CREATE_TABLES_SQL = [
     """
     CREATE TABLE IF NOT EXISTS vault_entries (
@@ -7,7 +12,8 @@ CREATE_TABLES_SQL = [
         encrypted_data BLOB NOT NULL,
         created_at TEXT NOT NULL,
         updated_at TEXT NOT NULL,
-        tags TEXT
+        tags TEXT,
+        encrypted_header BLOB
     );
     """,
 
@@ -19,7 +25,8 @@ CREATE_TABLES_SQL = [
         updated_at TEXT NOT NULL,
         deleted_at TEXT NOT NULL,
         expires_at TEXT NOT NULL,
-        tags TEXT
+        tags TEXT,
+        encrypted_header BLOB
     );
     """,
 
@@ -53,12 +60,51 @@ CREATE_TABLES_SQL = [
         version INTEGER NOT NULL DEFAULT 1,
         created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
     );
+    """,
+
+    # Вложения записей.
+    # attachment_blobs - уникальные куски файлов, адресуемые ключевым
+    # хешем открытого текста (HMAC), поэтому одинаковые куски хранятся
+    # один раз; ref_count - число ссылок из attachment_chunks.
+    # attachment_chunks - упорядоченный список кусков файла; encrypted_ref
+    # (хеш куска, зашифрованный потоковым AEAD) фиксирует порядок кусков
+    # и последний кусок, чтобы файл нельзя было переставить или обрезать.
+    # entry_id без внешнего ключа: вложения переживают мягкое удаление записи.
+    """
+    CREATE TABLE IF NOT EXISTS attachments (
+        id TEXT PRIMARY KEY,
+        entry_id TEXT NOT NULL,
+        encrypted_name BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        chunk_size INTEGER NOT NULL,
+        chunk_count INTEGER NOT NULL,
+        stream_nonce BLOB NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    """,
+
+    """
+    CREATE TABLE IF NOT EXISTS attachment_blobs (
+        chunk_hash BLOB PRIMARY KEY,
+        encrypted_data BLOB NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+
+    """
+    CREATE TABLE IF NOT EXISTS attachment_chunks (
+        attachment_id TEXT NOT NULL REFERENCES attachments(id) ON DELETE CASCADE,
+        chunk_index INTEGER NOT NULL,
+        chunk_hash BLOB NOT NULL REFERENCES attachment_blobs(chunk_hash),
+        encrypted_ref BLOB NOT NULL,
+        PRIMARY KEY (attachment_id, chunk_index)
+    );
     """
 ]
 
 CREATE_INDEXES_SQL = [
     "CREATE INDEX IF NOT EXISTS idx_vault_entries_created_at ON vault_entries(created_at);",
-    "CREATE INDEX IF NOT EXISTS idx_vault_entries_updated_at ON vault_entries(updated_at);",
+    "CREATE INDEX IF NOT EXISTS idx_vault_entries_updated_at_id ON vault_entries(updated_at, id);",
     "CREATE INDEX IF NOT EXISTS idx_vault_entries_tags ON vault_entries(tags);",
 
     "CREATE INDEX IF NOT EXISTS idx_deleted_entries_deleted_at ON deleted_entries(deleted_at);",
@@ -67,5 +113,8 @@ CREATE_INDEXES_SQL = [
 
     "CREATE INDEX IF NOT EXISTS idx_audit_entry_id ON audit_log(entry_id);",
     "CREATE INDEX IF NOT EXISTS idx_settings_key ON settings(setting_key);",
-    "CREATE INDEX IF NOT EXISTS idx_key_store_type ON key_store(key_type);"
+    "CREATE INDEX IF NOT EXISTS idx_key_store_type ON key_store(key_type);",
+
+    "CREATE INDEX IF NOT EXISTS idx_attachments_entry_id ON attachments(entry_id);",
+    "CREATE INDEX IF NOT EXISTS idx_attachment_chunks_hash ON attachment_chunks(chunk_hash);"
 ]
\ No newline at end of file
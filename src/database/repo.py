@@ -1,15 +1,80 @@
-from datetime import datetime
-
-from src.core.vault.encryption_service import AESGCMEncryptionService
-from src.core.crypto.placeholder import zero_bytes
+import json
+import sqlite3
+import threading
+
+from src.core.config import ConfigManager
+from src.core.crypto.cipher_suites import (
+    AUTO_CIPHER_SUITE,
+    DEFAULT_CIPHER_SUITE,
+    available_cipher_suites,
+    get_cipher_suite,
+    resolve_cipher_suite,
+)
+from src.core.crypto.kdf_calibration import KdfProfile
+from src.core.crypto.unlock_worker import UnlockWorker
+from src.core.events import EventBus
 from src.core.key_manager import KeyManager
-from src.core.crypto.placeholder import AES256Placeholder, zero_bytes
+from src.core.vault.encryption_service import AESGCMEncryptionService
+from src.core.vault.entry_manager import EntryManager
+from src.core.vault.reencryption import ReencryptionEngine
 
 class VaultRepository:
-    def __init__(self, db):
+    # Тонкая обёртка для GUI: операции с записями выполняет EntryManager,
+    # смену пароля и перешифрование - ReencryptionEngine.
+    #
+    # Шифр новых записей хранится в settings (CIPHER_SUITE_SETTING).
+    # При создании хранилища (в key_store ещё нет мастер-ключа) он берётся
+    # из cipher_suite или EncryptionSettings.scheme; режим "auto" выбирает
+    # шифр замером только в этот момент. Открытие существующего хранилища
+    # замер не запускает и settings не меняет, если шифр не задан явно.
+
+    #
+    # Откалиброванные параметры KDF (KdfProfile) хранятся в settings
+    # (KDF_PROFILE_SETTING) и задают политику KeyManager при каждом
+    # открытии: иначе вход с настройками по умолчанию счёл бы их слабыми
+    # и пересчитал бы KDF с меньшим объёмом памяти.
+
+    CIPHER_SUITE_SETTING = "encryption_cipher_suite"
+    KDF_PROFILE_SETTING = "kdf_profile"
+
+    def __init__(
+        self,
+        db,
+        event_bus: EventBus | None = None,
+        kdf_profile: KdfProfile | None = None,
+        kdf_worker: UnlockWorker | None = None,
+        cipher_suite: str | None = None,
+    ):
         self.db = db
-        self.crypto = AESGCMEncryptionService()
-        self.key_manager = KeyManager()
+        self.crypto = AESGCMEncryptionService(
+            cipher_suite=self._load_cipher_suite(cipher_suite),
+        )
+
+        # откалиброванные параметры KDF применяются при создании хранилища
+        # и попадают в key_store.params
+        kdf_profile = self._load_kdf_profile(kdf_profile)
+
+        if kdf_profile is not None:
+            self.key_manager = KeyManager(
+                argon2_settings=kdf_profile.argon2,
+                pbkdf2_settings=kdf_profile.pbkdf2,
+                kdf_worker=kdf_worker,
+            )
+        else:
+            self.key_manager = KeyManager(kdf_worker=kdf_worker)
+
+        self.entry_manager = EntryManager(
+            db=db,
+            key_manager=self.key_manager,
+            event_bus=event_bus,
+            encryption_service=self.crypto,
+        )
+        self.reencryption = ReencryptionEngine(
+            db,
+            self.key_manager,
+            event_bus=event_bus,
+            encryption_service=self.crypto,
+        )
 
     def count_entries(self) -> int:
         cursor = self.db.execute("SELECT COUNT(*) FROM vault_entries;")
@@ -20,7 +85,6 @@ class VaultRepository:
             return
 
         self.key_manager.unlock_with_password(self.db, master_password)
-        now = datetime.now().isoformat()
 
         samples = [
             {
@@ -50,28 +114,17 @@ class VaultRepository:
         ]
 
         for item in samples:
-            encrypted_password = self.crypto.encrypt(
-                item["password"].encode("utf-8"),
-                self.key_manager,
-            )
+            item["tags"] = self._split_tags(item["tags"])
 
-            self.db.execute(
-                """
-                INSERT INTO vault_entries
-                (title, username, encrypted_password, url, notes, tags, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?);
-                """,
-                (
-                    item["title"],
-                    item["username"],
-                    encrypted_password,
-                    item["url"],
-                    item["notes"],
-                    item["tags"],
-                    now,
-                    now,
-                ),
-            )
+        self.entry_manager.create_entries(samples)
+
+    def import_entries(self, entries: list[dict]) -> list[dict]:
+        # массовый импорт без fsync на каждую порцию, затем checkpoint WAL
+        if not hasattr(self.db, "bulk_import"):
+            return self.entry_manager.create_entries(entries)
+
+        with self.db.bulk_import():
+            return self.entry_manager.create_entries(entries)
 
     def add_entry(
         self,
@@ -85,67 +138,32 @@ class VaultRepository:
     ) -> None:
         self.key_manager.unlock_with_password(self.db, master_password)
 
-        encrypted_password = self.crypto.encrypt(
-            password.encode("utf-8"),
-            self.key_manager,
-        )
-
-        now = datetime.now().isoformat()
-
-        self.db.execute(
-            """
-            INSERT INTO vault_entries
-            (title, username, encrypted_password, url, notes, tags, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?);
-            """,
-            (
-                title,
-                username,
-                encrypted_password,
-                url,
-                notes,
-                tags,
-                now,
-                now,
-            ),
+        self.entry_manager.create_entry(
+            {
+                "title": title,
+                "username": username,
+                "password": password,
+                "url": url,
+                "notes": notes,
+                "tags": self._split_tags(tags),
+            }
         )
 
     def get_entries_for_table(self):
-        cursor = self.db.execute(
-            """
-            SELECT id, title, username, url
-            FROM vault_entries
-            ORDER BY id;
-            """
-        )
-        return cursor.fetchall()
-
-    def delete_entry(self, entry_id: int) -> bool:
-        cursor = self.db.execute(
-            """
-            DELETE FROM vault_entries
-            WHERE id = ?;
-            """,
-            (entry_id,),
-        )
-
-        return cursor.rowcount > 0
+        return [
+            (entry["id"], entry["title"], entry["username"], entry["url"])
+            for entry in self.entry_manager.iter_entries_metadata()
+        ]
 
-    def get_entry_by_id(self, entry_id: int):
-        cursor = self.db.execute(
-            """
-            SELECT id, title, username, encrypted_password, url, notes, tags
-            FROM vault_entries
-            WHERE id = ?;
-            """,
-            (entry_id,),
-        )
+    def delete_entry(self, entry_id: str) -> bool:
+        return self.entry_manager.delete_entry(entry_id)
 
-        return cursor.fetchone()
+    def get_entry_by_id(self, entry_id: str):
+        return self.entry_manager.get_entry(entry_id)
 
     def update_entry(
         self,
-        entry_id: int,
+        entry_id: str,
         master_password: str,
         title: str,
         username: str,
@@ -156,112 +174,150 @@ class VaultRepository:
     ) -> bool:
         self.key_manager.unlock_with_password(self.db, master_password)
 
-        encrypted_password = self.crypto.encrypt(
-            password.encode("utf-8"),
-            self.key_manager,
-        )
+        if self.entry_manager.get_entry(entry_id) is None:
+            return False
 
-        now = datetime.now().isoformat()
-
-        cursor = self.db.execute(
-            """
-            UPDATE vault_entries
-            SET title = ?,
-                username = ?,
-                encrypted_password = ?,
-                url = ?,
-                notes = ?,
-                tags = ?,
-                updated_at = ?
-            WHERE id = ?;
-            """,
-            (
-                title,
-                username,
-                encrypted_password,
-                url,
-                notes,
-                tags,
-                now,
-                entry_id,
-            ),
+        self.entry_manager.update_entry(
+            entry_id,
+            {
+                "title": title,
+                "username": username,
+                "password": password,
+                "url": url,
+                "notes": notes,
+                "tags": self._split_tags(tags),
+            },
         )
 
-        return cursor.rowcount > 0
+        return True
 
     def change_master_password(
         self,
         old_password: str,
         new_password: str,
+        drop_key_slots: bool = False,
     ) -> bool:
-        self.key_manager.unlock_with_password(self.db, old_password)
-
-        cursor = self.db.execute(
-            """
-            SELECT id, encrypted_password
-            FROM vault_entries
-            ORDER BY id;
-            """
+        # при случайном ключе данных перешифровывается только его обёртка;
+        # ключ, полученный из старого пароля, заменяется с перешифрованием
+        # всех записей порциями с контрольными точками (KeySlotsError,
+        # если при этом пропадут дополнительные слоты)
+        self.reencryption.change_master_password(
+            old_password,
+            new_password,
+            drop_key_slots=drop_key_slots,
         )
-        rows = cursor.fetchall()
-
-        decrypted_entries = []
-
-        for entry_id, encrypted_password in rows:
-            decrypted_password = bytearray(
-                self.crypto.decrypt(
-                    encrypted_password,
-                    self.key_manager,
-                )
+        return True
+
+    def resume_reencryption(self) -> int:
+        return self.reencryption.resume()
+
+    def rotate_worn_data_key(self) -> bool:
+        # ключ данных, достигший порога использования, заменяется без пароля;
+        # старые записи переписываются постепенно (drain_retired_keys_step)
+        if not self.key_manager.needs_data_key_rotation(self.db):
+            return False
+
+        try:
+            self.key_manager.rotate_data_key_lazily(self.db)
+        except RuntimeError:
+            return False
+
+        return True
+
+    def drain_retired_keys_step(self) -> int:
+        return self.reencryption.drain_step()
+
+    def upgrade_kdf_in_background(self, password: str) -> threading.Thread | None:
+        # пересчёт KDF занимает столько же, сколько вход, поэтому не блокирует GUI;
+        # вызывается после успешного входа и завершения ротации
+        if not self.key_manager.needs_kdf_upgrade(self.db):
+            return None
+
+        thread = threading.Thread(
+            target=self._upgrade_kdf,
+            args=(password,),
+            name="vault-kdf-upgrade",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _upgrade_kdf(self, password: str) -> None:
+        try:
+            self.key_manager.upgrade_kdf_params(self.db, password)
+        except (RuntimeError, ValueError, sqlite3.Error):
+            # хранилище заблокировано или закрыто во время пересчёта:
+            # обновление будет повторено при следующем входе
+            pass
+
+    def _load_cipher_suite(self, requested: str | None) -> str:
+        row = self.db.execute(
+            "SELECT setting_value FROM settings WHERE setting_key = ?;",
+            (self.CIPHER_SUITE_SETTING,)
+        ).fetchone()
+
+        # шифр, недоступный в этой сборке cryptography, не используется
+        stored = row[0] if row is not None and row[0] in available_cipher_suites() else None
+
+        if requested is None and stored is not None:
+            return stored
+
+        if self._vault_exists():
+            if requested is None or requested.lower() == AUTO_CIPHER_SUITE:
+                # хранилища до выбора шифра зашифрованы AES-256-GCM
+                return stored or DEFAULT_CIPHER_SUITE
+
+            suite = get_cipher_suite(requested).name
+        else:
+            suite = resolve_cipher_suite(
+                requested or ConfigManager().load().encryption.scheme
             )
 
-            decrypted_entries.append((entry_id, decrypted_password))
-
-        new_salt = self.key_manager.generate_salt()
-        new_auth_hash = self.key_manager.create_auth_hash(new_password).hash
-        new_key = self.key_manager.derive_key(new_password, new_salt)
-
-        self.key_manager.clear_active_key()
-        self.key_manager._active_salt = new_salt
-        self.key_manager._active_key = new_key
-        self.key_manager.store_key()
-
-        for entry_id, decrypted_password in decrypted_entries:
-            new_encrypted_password = self.crypto.encrypt(
-                bytes(decrypted_password),
-                self.key_manager,
+        if suite != stored:
+            self.db.execute(
+                """
+                INSERT INTO settings (setting_key, setting_value, encrypted)
+                VALUES (?, ?, 0)
+                ON CONFLICT(setting_key) DO UPDATE SET setting_value = excluded.setting_value;
+                """,
+                (self.CIPHER_SUITE_SETTING, suite)
             )
 
-            zero_bytes(decrypted_password)
+        return suite
 
+    def _load_kdf_profile(self, requested: KdfProfile | None) -> KdfProfile | None:
+        if requested is not None:
             self.db.execute(
                 """
-                UPDATE vault_entries
-                SET encrypted_password = ?,
-                    updated_at = ?
-                WHERE id = ?;
+                INSERT INTO settings (setting_key, setting_value, encrypted)
+                VALUES (?, ?, 0)
+                ON CONFLICT(setting_key) DO UPDATE SET setting_value = excluded.setting_value;
                 """,
-                (
-                    new_encrypted_password,
-                    datetime.now().isoformat(),
-                    entry_id,
-                ),
+                (self.KDF_PROFILE_SETTING, json.dumps(requested.to_dict()))
             )
+            return requested
 
-        self.db.execute(
-            """
-            UPDATE key_store
-            SET salt = ?,
-                hash = ?,
-                params = ?
-            WHERE key_type = ?;
-            """,
-            (
-                new_salt,
-                new_auth_hash,
-                self.key_manager._build_key_params(),
-                "master",
-            ),
-        )
+        row = self.db.execute(
+            "SELECT setting_value FROM settings WHERE setting_key = ?;",
+            (self.KDF_PROFILE_SETTING,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        # повреждённый профиль не мешает входу: действуют настройки по умолчанию
+        try:
+            return KdfProfile.from_dict(json.loads(row[0]))
+        except ValueError:
+            return None
+
+    def _vault_exists(self) -> bool:
+        row = self.db.execute(
+            "SELECT 1 FROM key_store WHERE key_type = ?;",
+            ("master",)
+        ).fetchone()
+
+        return row is not None
 
-        return True
\ No newline at end of file
+    def _split_tags(self, tags: str) -> list[str]:
+        return [tag.strip() for tag in (tags or "").split(",") if tag.strip()]
@@ -1,6 +1,12 @@
-﻿import customtkinter as ctk
+﻿import queue
+import sqlite3
+import threading
+
+import customtkinter as ctk
 
 from src.core.config import ConfigManager
+from src.core.key_manager import KeySlotsError
+from src.core.crypto.unlock_worker import UnlockCancelled, UnlockWorker
 from src.gui.widgets.secure_table import SecureTable
 from src.gui.widgets.audit_log_viewer import AuditLogViewer
 from src.gui.widgets.custom_dialog import CustomDialog
@@ -16,7 +22,8 @@ from src.gui.edit_entry_dialog import EditEntryDialog
 from src.gui.change_password_dialog import ChangePasswordDialog
 from src.gui.settings_dialog import SettingsDialog
 from src.gui.widgets.app_menu_bar import AppMenuBar
-from src.core.vault.entry_manager import EntryManager, EntryManagerError
+from src.core.vault.entry_manager import EntryManagerError
+from src.core.vault.reencryption import ReencryptionError, ReencryptionProgress
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -24,6 +31,9 @@ ctk.set_default_color_theme("blue")
 PINK = "#d98ca3"
 PINK_HOVER = "#c97c93"
 
+# пауза между порциями перешифрования данных прежних версий ключа
+KEY_DRAIN_INTERVAL_MS = 1500
+
 class MainWindow(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -38,9 +48,16 @@ class MainWindow(ctk.CTk):
         self.lock_overlay = None
         self.auth_dialog_open = False
 
+        # KDF выполняется в отдельном процессе, этапы приходят через очередь
+        self.unlock_progress = queue.Queue()
+        self.unlock_worker = UnlockWorker(on_progress=self.unlock_progress.put)
+
         self.state_manager = StateManager(on_auto_lock=self._handle_auto_lock)
         self.auth_service = AuthenticationService()
         self.event_bus = EventBus()
+        # перешифрование после входа идёт в потоке разблокировки,
+        # его ход показывается в строке состояния через ту же очередь
+        self.event_bus.subscribe(ReencryptionProgress, self._queue_reencryption_progress)
 
         self.title("CryptoSafe Manager")
         self.geometry("1100x700")
@@ -249,7 +266,16 @@ class MainWindow(ctk.CTk):
             anchor="w",
             font=ctk.CTkFont(size=13)
         )
-        self.status.pack(fill="x", padx=14, pady=8)
+        self.status.pack(side="left", fill="x", expand=True, padx=14, pady=8)
+
+        # показывается только на время разблокировки
+        self.cancel_unlock_button = ctk.CTkButton(
+            self.status_frame,
+            text="Cancel",
+            width=90,
+            height=28,
+            command=self._cancel_unlock
+        )
 
     # Auth flow
 
@@ -261,7 +287,7 @@ class MainWindow(ctk.CTk):
             return
 
         try:
-            db = Database(default_db_path)
+            db = self._create_database(default_db_path)
             db.connect()
 
             cursor = db.execute(
@@ -296,19 +322,20 @@ class MainWindow(ctk.CTk):
 
         r = wiz.result
 
-        self.db = Database(r.db_path)
+        self.db = self._create_database(r.db_path)
         self.db.connect()
 
         self.master_password = r.master_password
 
-        self.repo = VaultRepository(self.db)
-        self.audit_repo = AuditRepository(self.db)
-
-        self.entry_manager = EntryManager(
-            db=self.db,
-            key_manager=self.repo.key_manager,
+        self.repo = VaultRepository(
+            self.db,
             event_bus=self.event_bus,
+            kdf_profile=r.kdf_profile,
+            kdf_worker=self.unlock_worker,
+            cipher_suite=r.enc_scheme,
         )
+        self.audit_repo = AuditRepository(self.db)
+        self.entry_manager = self.repo.entry_manager
 
         self.table.set_rows([])
 
@@ -324,7 +351,7 @@ class MainWindow(ctk.CTk):
         )
 
         self.status.configure(
-            text=f"Status: Unlocked | DB: {r.db_path} | ENC: {r.enc_scheme}"
+            text=f"Status: Unlocked | DB: {r.db_path} | ENC: {self.repo.crypto.cipher_suite.name}"
         )
 
     def _show_login_dialog(self, db_path):
@@ -343,52 +370,160 @@ class MainWindow(ctk.CTk):
             self.status.configure(text="Status: Locked | Login cancelled")
             return
 
-        self.db = Database(db_path)
+        self.db = self._create_database(db_path)
         self.db.connect()
 
-        self.repo = VaultRepository(self.db)
+        self.repo = VaultRepository(
+            self.db,
+            event_bus=self.event_bus,
+            kdf_worker=self.unlock_worker,
+        )
         self.audit_repo = AuditRepository(self.db)
+        self.entry_manager = self.repo.entry_manager
 
-        self.entry_manager = EntryManager(
-            db=self.db,
-            key_manager=self.repo.key_manager,
-            event_bus=self.event_bus,
+        self._start_unlock(db_path, login.result.master_password)
+
+    def _create_database(self, db_path):
+        # профиль соединения SQLite (WAL, synchronous, кэш) из настроек
+        return Database(db_path, profile=ConfigManager().load().database.profile)
+
+    def _start_unlock(self, db_path, password):
+        # разблокировка не блокирует Tk: поток ждёт процесс KDF,
+        # окно опрашивает его через after()
+        outcome = {}
+
+        def unlock():
+            try:
+                self.repo.key_manager.unlock_with_password(self.db, password)
+            except Exception as exc:
+                outcome["error"] = exc
+                return
+
+            # прерванная ротация ключа данных завершается до открытия
+            # записей; после неё отменять уже нечего
+            outcome["unlocked"] = True
+
+            try:
+                self.repo.resume_reencryption()
+            except Exception as exc:
+                outcome["reencryption_error"] = exc
+
+        self.unlock_worker.reset()
+        self.status.configure(text="Status: Unlocking...")
+        self.cancel_unlock_button.configure(state="normal")
+        self.cancel_unlock_button.pack(side="right", padx=(0, 14), pady=8)
+
+        thread = threading.Thread(target=unlock, name="vault-unlock", daemon=True)
+        thread.start()
+
+        self.after(50, lambda: self._poll_unlock(thread, outcome, db_path, password))
+
+    def _poll_unlock(self, thread, outcome, db_path, password):
+        while not self.unlock_progress.empty():
+            stage = self.unlock_progress.get_nowait()
+            self.status.configure(text=f"Status: Unlocking... ({stage})")
+
+        if outcome.get("unlocked"):
+            self.cancel_unlock_button.pack_forget()
+
+        if thread.is_alive():
+            self.after(50, lambda: self._poll_unlock(thread, outcome, db_path, password))
+            return
+
+        self.cancel_unlock_button.pack_forget()
+        error = outcome.get("error")
+        reencryption_error = outcome.get("reencryption_error")
+
+        if reencryption_error is not None:
+            # перешифрование продолжится с контрольной точки при следующем входе
+            self.repo.key_manager.lock()
+            self._show_error("Login error", f"Vault re-encryption failed: {reencryption_error}")
+            self._reset_session_objects()
+            self._show_lock_overlay()
+            self.status.configure(text="Status: Locked | Re-encryption failed")
+        elif error is None:
+            self._complete_login(db_path, password)
+        elif isinstance(error, ValueError):
+            self._handle_failed_login(db_path)
+        elif isinstance(error, UnlockCancelled):
+            self._reset_session_objects()
+            self._show_lock_overlay()
+            self.status.configure(text="Status: Locked | Unlock cancelled")
+        else:
+            self._show_error("Login error", str(error))
+            self._reset_session_objects()
+            self._show_lock_overlay()
+            self.status.configure(text="Status: Locked | Unlock failed")
+
+    def _cancel_unlock(self):
+        # прерывает процесс KDF; поток получает UnlockCancelled
+        self.cancel_unlock_button.configure(state="disabled")
+        self.unlock_worker.cancel()
+
+    def _queue_reencryption_progress(self, event):
+        # вызывается в потоке разблокировки
+        self.unlock_progress.put(
+            f"re-encrypting {event.table}: {event.processed}/{event.total}"
         )
 
+    def _schedule_key_drain(self):
+        # данные прежних версий ключа переписываются небольшими порциями
+        # в потоке Tk между действиями пользователя: соединение sqlite
+        # и ключи не используются из других потоков
+        self.after(KEY_DRAIN_INTERVAL_MS, self._drain_retired_keys)
+
+    def _drain_retired_keys(self):
+        repo = self.repo
+
+        if repo is None or not repo.key_manager.has_active_key():
+            return
+
         try:
-            self.repo.key_manager.unlock_with_password(
-                self.db,
-                login.result.master_password
-            )
+            processed = repo.drain_retired_keys_step()
+        except (ReencryptionError, RuntimeError, sqlite3.Error):
+            # повторится после следующего входа
+            return
 
-        except ValueError:
-            attempts = self.auth_service.register_failed_attempt()
-            delay = self.auth_service.get_backoff_delay()
+        if processed:
+            self._schedule_key_drain()
 
-            if self.audit_repo is not None:
-                self.audit_repo.add_log(
-                    action="failed_login",
-                    details=f"Failed login attempt #{attempts}"
-                )
+    def _reset_session_objects(self):
+        if self.db is not None:
+            self.db.close()
 
-            self._show_error(
-                "Login error",
-                f"Invalid master password.\n"
-                f"Attempt: {attempts}\n"
-                f"Next attempt will be available in {delay} sec."
+        self.db = None
+        self.repo = None
+        self.entry_manager = None
+        self.audit_repo = None
+
+    def _handle_failed_login(self, db_path):
+        attempts = self.auth_service.register_failed_attempt()
+        delay = self.auth_service.get_backoff_delay()
+
+        if self.audit_repo is not None:
+            self.audit_repo.add_log(
+                action="failed_login",
+                details=f"Failed login attempt #{attempts}"
             )
 
-            self.auth_service.apply_backoff_delay()
+        self._show_error(
+            "Login error",
+            f"Invalid master password.\n"
+            f"Attempt: {attempts}\n"
+            f"Next attempt will be available in {delay} sec."
+        )
 
-            self.db.close()
-            self.db = None
-            self.repo = None
-            self.entry_manager = None
-            self.audit_repo = None
+        self.auth_service.apply_backoff_delay()
 
-            self._show_lock_overlay()
-            self.after(100, lambda: self._show_login_dialog(db_path))
-            return
+        self._reset_session_objects()
+
+        self._show_lock_overlay()
+        self.after(100, lambda: self._show_login_dialog(db_path))
+
+    def _complete_login(self, db_path, password):
+        self.repo.rotate_worn_data_key()
+        self.repo.upgrade_kdf_in_background(password)
+        self._schedule_key_drain()
 
         self.auth_service.login("local_user")
 
@@ -405,7 +540,7 @@ class MainWindow(ctk.CTk):
             )
         )
 
-        self.master_password = login.result.master_password
+        self.master_password = password
 
         self.table.set_rows([])
         self._hide_lock_overlay()
@@ -527,10 +662,26 @@ class MainWindow(ctk.CTk):
         new_password = dialog.result["new_password"]
 
         try:
-            self.repo.change_master_password(
-                old_password=old_password,
-                new_password=new_password,
-            )
+            try:
+                self.repo.change_master_password(
+                    old_password=old_password,
+                    new_password=new_password,
+                )
+
+            except KeySlotsError as exc:
+                if not self._ask_yes_no(
+                    "Change password",
+                    "Changing the password replaces the vault data key. "
+                    f"{len(exc.slot_ids)} additional key slot(s) and quick "
+                    "unlock will be removed. Continue?"
+                ):
+                    return
+
+                self.repo.change_master_password(
+                    old_password=old_password,
+                    new_password=new_password,
+                    drop_key_slots=True,
+                )
 
         except ValueError:
             self._show_error(
@@ -543,7 +694,7 @@ class MainWindow(ctk.CTk):
 
         self.audit_repo.add_log(
             action="change_master_password",
-            details="Master password changed and vault re-encrypted"
+            details="Master password changed and data key re-wrapped"
         )
 
         self._show_info(
@@ -599,6 +750,9 @@ class MainWindow(ctk.CTk):
     def _clear_sensitive_data(self):
         self.master_password = None
 
+        if self.entry_manager is not None:
+            self.entry_manager.close()
+
         if self.repo is not None:
             self.repo.key_manager.lock()
 
@@ -615,6 +769,10 @@ class MainWindow(ctk.CTk):
         self._clear_sensitive_data()
         self.state_manager.stop_timers()
 
+        # незавершённая разблокировка прерывается вместе с процессом KDF
+        self.unlock_worker.cancel()
+        self.unlock_worker.close()
+
         if self.db is not None:
             self.db.close()
             self.db = None
@@ -1,7 +1,10 @@
-﻿from dataclasses import dataclass
+﻿import threading
+from dataclasses import dataclass
 from pathlib import Path
 from tkinter import filedialog, messagebox
 from src.core.config import ConfigManager
+from src.core.crypto.cipher_suites import AUTO_CIPHER_SUITE, available_cipher_suites
+from src.core.crypto.kdf_calibration import DEFAULT_TARGET_MS, KdfProfile, calibrate_kdf
 from src.core.crypto.key_derivation import validate_password, get_password_rule_status
 import customtkinter as ctk
 
@@ -15,6 +18,7 @@ class SetupResult:
     master_password: str
     db_path: Path
     enc_scheme: str
+    kdf_profile: KdfProfile | None = None
 
 @dataclass(frozen=True)
 class LoginResult:
@@ -195,10 +199,10 @@ class SetupWizard(ctk.CTkToplevel):
         ).pack(anchor="w", pady=(10, 20))
 
         ctk.CTkLabel(self.content, text="Encryption scheme").pack(anchor="w", pady=(0, 5))
-        self.enc_var = ctk.StringVar(value="XOR_PLACEHOLDER")
+        self.enc_var = ctk.StringVar(value=AUTO_CIPHER_SUITE)
         self.enc_menu = ctk.CTkOptionMenu(
             self.content,
-            values=["XOR_PLACEHOLDER"],
+            values=[AUTO_CIPHER_SUITE, *available_cipher_suites()],
             variable=self.enc_var,
             fg_color=PINK,
             button_color=PINK,
@@ -209,10 +213,23 @@ class SetupWizard(ctk.CTkToplevel):
 
         ctk.CTkLabel(
             self.content,
-            text="Sprint 1 placeholder. AES-GCM will be added later.",
+            text="auto: при создании хранилища выбирается самый быстрый шифр\n"
+                 "(без AES-NI обычно ChaCha20-Poly1305).",
             text_color="gray"
         ).pack(anchor="w", pady=(20, 0))
 
+        self.calibrate_var = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(
+            self.content,
+            text=f"Подобрать параметры KDF под этот компьютер (~{DEFAULT_TARGET_MS} мс на вход)",
+            variable=self.calibrate_var,
+            fg_color=PINK,
+            hover_color=PINK_HOVER
+        ).pack(anchor="w", pady=(20, 0))
+
+        self.calibration_label = ctk.CTkLabel(self.content, text="", text_color="gray")
+        self.calibration_label.pack(anchor="w", pady=(8, 0))
+
     def _next(self):
         if self._step == 1 and not self._validate_password_step():
             return
@@ -265,10 +282,55 @@ class SetupWizard(ctk.CTkToplevel):
             self.db_var.set(filename)
 
     def _finish(self):
+        if not self.calibrate_var.get():
+            self._complete_setup(None)
+            return
+
+        # замер занимает несколько секунд: он идёт в потоке,
+        # окно опрашивает его через after() и остаётся отзывчивым
+        outcome = {}
+
+        def calibrate():
+            try:
+                outcome["profile"] = calibrate_kdf(include_pbkdf2=False)
+            except Exception as exc:
+                outcome["error"] = exc
+
+        self.calibration_label.configure(text="Калибровка KDF...")
+        self.next_button.configure(state="disabled")
+        self.back_button.configure(state="disabled")
+
+        thread = threading.Thread(target=calibrate, name="kdf-calibration", daemon=True)
+        thread.start()
+
+        self.after(50, lambda: self._poll_calibration(thread, outcome))
+
+    def _poll_calibration(self, thread, outcome):
+        # окно могли закрыть кнопкой Cancel во время замера
+        if not self.winfo_exists():
+            return
+
+        if thread.is_alive():
+            self.after(50, lambda: self._poll_calibration(thread, outcome))
+            return
+
+        error = outcome.get("error")
+
+        if error is not None:
+            self.calibration_label.configure(text="")
+            self.next_button.configure(state="normal")
+            self.back_button.configure(state="normal")
+            messagebox.showerror("Ошибка", f"Не удалось подобрать параметры KDF: {error}")
+            return
+
+        self._complete_setup(outcome["profile"])
+
+    def _complete_setup(self, kdf_profile):
         self._result = SetupResult(
             master_password=self.pw1.get(),
             db_path=Path(self.db_var.get().strip()),
-            enc_scheme=self.enc_var.get()
+            enc_scheme=self.enc_var.get(),
+            kdf_profile=kdf_profile
         )
         self.destroy()
 
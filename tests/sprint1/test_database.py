@@ -1,4 +1,10 @@
-﻿def test_tables_created(test_db):
+﻿import threading
+
+import pytest
+
+from src.database.db import Database
+
+def test_tables_created(test_db):
     cursor = test_db.execute(
         "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';"
     )
@@ -39,4 +45,226 @@ def test_default_settings_created(test_db):
     assert "password_policy_require_lowercase" in settings
     assert "password_policy_require_digit" in settings
     assert "password_policy_require_special" in settings
-    assert "kdf_params_version" in settings
\ No newline at end of file
+    assert "kdf_params_version" in settings
+
+def _count_audit_rows(db) -> int:
+    return db.execute("SELECT COUNT(*) FROM audit_log;").fetchone()[0]
+
+
+def _insert_audit_row(db, action: str) -> None:
+    db.execute(
+        "INSERT INTO audit_log (action, timestamp) VALUES (?, datetime('now'));",
+        (action,),
+    )
+
+
+def test_transaction_commits_once_on_success(test_db):
+    with test_db.transaction():
+        _insert_audit_row(test_db, "first")
+        _insert_audit_row(test_db, "second")
+
+        assert test_db.in_transaction is True
+
+    assert test_db.in_transaction is False
+    assert _count_audit_rows(test_db) == 2
+
+
+def test_transaction_rolls_back_all_changes_on_error(test_db):
+    try:
+        with test_db.transaction():
+            _insert_audit_row(test_db, "first")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    assert _count_audit_rows(test_db) == 0
+
+
+def test_nested_transaction_rolls_back_only_savepoint(test_db):
+    with test_db.transaction():
+        _insert_audit_row(test_db, "outer")
+
+        try:
+            with test_db.transaction():
+                _insert_audit_row(test_db, "inner")
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+
+    rows = test_db.execute("SELECT action FROM audit_log;").fetchall()
+
+    assert [row[0] for row in rows] == ["outer"]
+
+
+def test_deferred_commit_mode_waits_for_commit(test_db):
+    test_db.autocommit = False
+
+    _insert_audit_row(test_db, "pending")
+    test_db.rollback()
+
+    assert _count_audit_rows(test_db) == 0
+
+    _insert_audit_row(test_db, "kept")
+    test_db.commit()
+    test_db.autocommit = True
+
+    assert _count_audit_rows(test_db) == 1
+
+
+def test_executemany_is_atomic(test_db):
+    try:
+        test_db.executemany(
+            "INSERT INTO settings (setting_key, setting_value, encrypted) VALUES (?, ?, ?);",
+            [("batch_a", "1", 0), ("batch_a", "2", 0)],
+        )
+    except Exception:
+        pass
+
+    cursor = test_db.execute(
+        "SELECT COUNT(*) FROM settings WHERE setting_key = ?;",
+        ("batch_a",),
+    )
+
+    assert cursor.fetchone()[0] == 0
+
+
+def _pragma(db, name):
+    return db.execute(f"PRAGMA {name};").fetchone()[0]
+
+
+def test_default_profile_uses_wal_and_tuned_pragmas(test_db):
+    assert test_db.profile.name == "balanced"
+    assert test_db.journal_mode == "wal"
+    assert _pragma(test_db, "journal_mode") == "wal"
+    assert _pragma(test_db, "synchronous") == 1
+    assert _pragma(test_db, "cache_size") == -16 * 1024
+    assert _pragma(test_db, "busy_timeout") == 5000
+    assert _pragma(test_db, "temp_store") == 2
+
+
+def test_profile_selected_by_name(tmp_path):
+    db = Database(tmp_path / "durable.db", profile="durable")
+    db.connect()
+
+    try:
+        assert _pragma(db, "synchronous") == 2
+        assert _pragma(db, "mmap_size") == 0
+    finally:
+        db.close()
+
+    with pytest.raises(ValueError):
+        Database(tmp_path / "unknown.db", profile="fastest")
+
+
+def test_bulk_import_relaxes_durability_and_checkpoints(test_db):
+    with test_db.bulk_import():
+        assert _pragma(test_db, "synchronous") == 0
+
+        test_db.executemany(
+            "INSERT INTO settings (setting_key, setting_value, encrypted) VALUES (?, ?, 0);",
+            [(f"bulk_{i}", str(i)) for i in range(100)],
+        )
+
+    assert _pragma(test_db, "synchronous") == 1
+    assert _pragma(test_db, "cache_size") == -16 * 1024
+
+    wal = test_db.path.with_name(test_db.path.name + "-wal")
+    assert not wal.exists() or wal.stat().st_size == 0
+
+    with test_db.transaction():
+        with pytest.raises(RuntimeError):
+            with test_db.bulk_import():
+                pass
+
+
+def test_bulk_import_relaxes_only_its_own_thread(test_db):
+    seen = {}
+
+    def background_write():
+        # фоновые задачи не ждут конца импорта и пишут с fsync
+        with test_db.transaction():
+            seen["background"] = _pragma(test_db, "synchronous")
+            test_db.execute(
+                "INSERT INTO settings (setting_key, setting_value, encrypted) VALUES ('bg', '1', 0);"
+            )
+
+    with test_db.bulk_import():
+        worker = threading.Thread(target=background_write)
+        worker.start()
+        worker.join(timeout=5)
+
+        assert not worker.is_alive()
+
+        with test_db.transaction():
+            seen["bulk"] = _pragma(test_db, "synchronous")
+
+        with test_db.transaction(durable=True):
+            seen["durable"] = _pragma(test_db, "synchronous")
+
+        with pytest.raises(RuntimeError):
+            with test_db.bulk_import():
+                pass
+
+    assert seen == {"background": 1, "bulk": 0, "durable": 1}
+    assert _pragma(test_db, "synchronous") == 1
+
+
+def _query_plan(db, query, params=()):
+    return " | ".join(row[3] for row in db.execute("EXPLAIN QUERY PLAN " + query, params).fetchall())
+
+
+def test_keyset_page_query_uses_updated_at_id_index(test_db):
+    # запросы страниц EntryManager.iter_entries()
+    first_page = _query_plan(
+        test_db,
+        """
+        SELECT id, encrypted_data, created_at, updated_at, tags, encrypted_header
+        FROM vault_entries
+        ORDER BY updated_at DESC, id DESC
+        LIMIT ?;
+        """,
+        (100,),
+    )
+    next_page = _query_plan(
+        test_db,
+        """
+        SELECT id, encrypted_data, created_at, updated_at, tags, encrypted_header
+        FROM vault_entries
+        WHERE updated_at <= ?
+          AND (updated_at < ? OR id < ?)
+        ORDER BY updated_at DESC, id DESC
+        LIMIT ?;
+        """,
+        ("2026-01-01", "2026-01-01", "id", 100),
+    )
+
+    for plan in (first_page, next_page):
+        assert "idx_vault_entries_updated_at_id" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_migration_replaces_updated_at_index(tmp_path):
+    path = tmp_path / "v6.db"
+    db = Database(path)
+    db.connect()
+    db.execute("DROP INDEX idx_vault_entries_updated_at_id;")
+    db.execute("CREATE INDEX idx_vault_entries_updated_at ON vault_entries(updated_at);")
+    db.execute("PRAGMA user_version = 6;")
+    db.close()
+
+    db = Database(path)
+    db.connect()
+
+    try:
+        indexes = {
+            row[0]
+            for row in db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'vault_entries';"
+            ).fetchall()
+        }
+
+        assert "idx_vault_entries_updated_at_id" in indexes
+        assert "idx_vault_entries_updated_at" not in indexes
+        assert _pragma(db, "user_version") == 7
+    finally:
+        db.close()
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from src.core.crypto.kdf_calibration import (
+    MIN_ARGON2_MEMORY_KIB,
+    MIN_PBKDF2_ITERATIONS,
+    KdfCalibrator,
+    KdfProfile,
+)
+from src.core.key_manager import KeyManager
+
+
+class ModelCalibrator(KdfCalibrator):
+    # время KDF задаётся моделью вместо замера
+    def __init__(self, argon2_ms_per_mib_pass, pbkdf2_ms_per_1000, **kwargs):
+        super().__init__(**kwargs)
+        self.argon2_ms_per_mib_pass = argon2_ms_per_mib_pass
+        self.pbkdf2_ms_per_1000 = pbkdf2_ms_per_1000
+
+    def _measure_argon2(self, settings):
+        return settings.memory_cost / 1024 * settings.time_cost * self.argon2_ms_per_mib_pass
+
+    def _measure_pbkdf2(self, iterations):
+        return iterations / 1000 * self.pbkdf2_ms_per_1000
+
+
+def test_fast_machine_gets_stronger_parameters():
+    calibrator = ModelCalibrator(0.5, 0.5, target_ms=500, cpu_count=16)
+
+    argon2, argon2_ms = calibrator.calibrate_argon2()
+    pbkdf2, pbkdf2_ms = calibrator.calibrate_pbkdf2()
+
+    assert argon2.memory_cost == 512 * 1024
+    assert argon2.time_cost == 1
+    assert argon2.parallelism == 8
+    assert argon2_ms <= 500
+    assert pbkdf2.iterations == 1_000_000
+    assert pbkdf2_ms <= 500
+
+
+def test_large_memory_limit_adds_passes_after_memory_cap():
+    calibrator = ModelCalibrator(1.0, 1.0, target_ms=500, max_memory_kib=128 * 1024, cpu_count=2)
+
+    argon2, argon2_ms = calibrator.calibrate_argon2()
+
+    assert argon2.memory_cost == 128 * 1024
+    assert argon2.time_cost == 3
+    assert argon2.parallelism == 2
+    assert argon2_ms <= 500
+
+
+def test_slow_machine_keeps_minimum_parameters():
+    calibrator = ModelCalibrator(100.0, 100.0, target_ms=500, cpu_count=1)
+
+    profile = calibrator.calibrate()
+
+    assert profile.argon2.memory_cost == MIN_ARGON2_MEMORY_KIB
+    assert profile.argon2.time_cost == 1
+    assert profile.pbkdf2.iterations == MIN_PBKDF2_ITERATIONS
+
+
+def test_pbkdf2_calibration_can_be_skipped():
+    class ArgonOnlyCalibrator(ModelCalibrator):
+        def _measure_pbkdf2(self, iterations):
+            raise AssertionError("PBKDF2 must not be measured")
+
+    profile = ArgonOnlyCalibrator(1.0, 1.0, target_ms=500, cpu_count=1).calibrate(include_pbkdf2=False)
+
+    assert profile.argon2_ms <= 500
+    assert profile.pbkdf2_ms == 0.0
+
+
+def test_profile_round_trip_and_key_params(test_db):
+    profile = ModelCalibrator(1.0, 1.0, target_ms=100, cpu_count=1).calibrate()
+
+    assert KdfProfile.from_dict(json.loads(json.dumps(profile.to_dict()))) == profile
+
+    with pytest.raises(ValueError):
+        KdfProfile.from_dict({"argon2": {}})
+
+    key_manager = KeyManager(argon2_settings=profile.argon2, pbkdf2_settings=profile.pbkdf2)
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    params = json.loads(test_db.execute("SELECT params FROM key_store;").fetchone()[0])
+
+    assert params["kdf"]["memory_cost"] == profile.argon2.memory_cost
+    assert params["kdf"]["time_cost"] == profile.argon2.time_cost
+    assert params["kdf"]["parallelism"] == profile.argon2.parallelism
@@ -151,4 +151,25 @@ def test_named_key_requires_purpose():
             "StrongPass123!",
             salt,
             ""
-        )
\ No newline at end of file
+        )
+def test_named_key_legacy_scheme_matches_old_derivation():
+    from src.core.key_manager import KeyManager
+
+    manager = KeyManager()
+
+    salt = manager.generate_salt()
+
+    legacy_key = manager.derive_named_key(
+        "StrongPass123!",
+        salt,
+        "vault",
+        scheme=KeyManager.NAMED_KEY_SCHEME_LEGACY
+    )
+
+    assert legacy_key == manager.derive_key("vault:StrongPass123!", salt)
+    assert legacy_key != manager.derive_named_key("StrongPass123!", salt, "vault")
+
+    import pytest
+
+    with pytest.raises(ValueError):
+        manager.derive_named_key("StrongPass123!", salt, "vault", scheme="unknown")
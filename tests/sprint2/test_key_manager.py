@@ -0,0 +1,428 @@
+import json
+
+import pytest
+
+from src.core.crypto.key_derivation import Argon2Settings, PBKDF2Settings
+from src.core.key_manager import KeyManager
+from src.core.vault.encryption_service import AESGCMEncryptionService
+
+
+def create_key_manager():
+    return KeyManager(
+        argon2_settings=Argon2Settings(time_cost=1, memory_cost=8192, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=1000),
+    )
+
+
+def load_params(test_db):
+    row = test_db.execute(
+        "SELECT params FROM key_store WHERE key_type = ?;",
+        ("master",),
+    ).fetchone()
+    return json.loads(row[0])
+
+
+def test_new_vault_uses_random_data_key(test_db):
+    key_manager = create_key_manager()
+
+    # ключ не возвращается копией bytes, он остаётся в KeyStorage
+    assert key_manager.unlock_with_password(test_db, "OldPassword123!") is None
+
+    data_key = key_manager.get_active_key()
+    params = load_params(test_db)
+    salt = test_db.execute("SELECT salt FROM key_store;").fetchone()[0]
+
+    assert len(data_key) == 32
+    assert data_key != key_manager.derive_key("OldPassword123!", salt)
+    assert params["version"] == KeyManager.KEY_PARAMS_VERSION
+    assert params["data_key"]["version"] == KeyManager.DATA_KEY_VERSION
+    assert params["data_key"]["derived_from_password"] is False
+
+
+def test_password_change_keeps_data_key(test_db):
+    key_manager = create_key_manager()
+    service = AESGCMEncryptionService()
+
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    data_key = key_manager.get_active_key()
+    encrypted = service.encrypt(b"secret", key_manager)
+
+    key_manager.change_master_password(test_db, "OldPassword123!", "NewPassword456!")
+    key_manager.lock()
+
+    key_manager.unlock_with_password(test_db, "NewPassword456!")
+
+    assert key_manager.get_active_key() == data_key
+    assert service.decrypt(encrypted, key_manager) == b"secret"
+
+    key_manager.lock()
+
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+
+def test_password_change_rejects_wrong_old_password(test_db):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+    params_before = load_params(test_db)
+
+    with pytest.raises(ValueError):
+        key_manager.change_master_password(test_db, "WrongPassword1!", "NewPassword456!")
+
+    assert load_params(test_db) == params_before
+
+
+def test_legacy_vault_is_migrated_without_reencryption(test_db):
+    key_manager = create_key_manager()
+    salt = key_manager.generate_salt()
+    legacy_key = key_manager.derive_key("OldPassword123!", salt)
+
+    test_db.execute(
+        """
+        INSERT INTO key_store (key_type, salt, hash, params)
+        VALUES (?, ?, ?, ?);
+        """,
+        (
+            "master",
+            salt,
+            key_manager.create_auth_hash("OldPassword123!").hash,
+            key_manager._build_key_params(),
+        ),
+    )
+
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    data_key = key_manager.get_active_key()
+    params = load_params(test_db)
+
+    assert data_key == legacy_key
+    assert params["data_key"]["derived_from_password"] is True
+
+    key_manager.change_master_password(test_db, "OldPassword123!", "NewPassword456!")
+    key_manager.lock()
+
+    key_manager.unlock_with_password(test_db, "NewPassword456!")
+
+    assert key_manager.get_active_key() == legacy_key
+
+
+def test_damaged_wrapped_key_is_rejected(test_db):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    params = load_params(test_db)
+    params["data_key"]["wrapped_key"] = "AAAA" + params["data_key"]["wrapped_key"][4:]
+    test_db.execute(
+        "UPDATE key_store SET params = ? WHERE key_type = ?;",
+        (json.dumps(params), "master"),
+    )
+    key_manager.lock()
+
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+
+def test_new_vault_unlocks_with_single_kdf_pass(test_db, monkeypatch):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+    data_key = key_manager.get_active_key()
+    params = load_params(test_db)
+    key_manager.lock()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("legacy KDF must not be used")
+
+    monkeypatch.setattr(key_manager._kdf, "derive_encryption_key", fail)
+    monkeypatch.setattr(key_manager._kdf, "verify_password", fail)
+
+    assert params["kdf"]["scheme"] == KeyManager.KDF_SCHEME
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+    assert key_manager.get_active_key() == data_key
+
+    key_manager.lock()
+
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_password(test_db, "WrongPassword1!")
+
+
+def test_legacy_kdf_scheme_is_upgraded_after_unlock(test_db):
+    key_manager = create_key_manager()
+    salt = key_manager.generate_salt()
+    data_key = b"k" * 32
+
+    test_db.execute(
+        """
+        INSERT INTO key_store (key_type, salt, hash, params)
+        VALUES (?, ?, ?, ?);
+        """,
+        (
+            "master",
+            salt,
+            key_manager.create_auth_hash("OldPassword123!").hash,
+            key_manager._build_key_params(
+                key_manager._wrap_data_key(
+                    key_manager.derive_key("OldPassword123!", salt),
+                    data_key,
+                    key_id="legacy-key",
+                )
+            ),
+        ),
+    )
+
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    assert key_manager.get_active_key() == data_key
+    assert key_manager.needs_kdf_upgrade(test_db) is True
+    assert key_manager.upgrade_kdf_params(test_db, "OldPassword123!") is True
+    assert key_manager.needs_kdf_upgrade(test_db) is False
+
+    params = load_params(test_db)
+    stored_hash = test_db.execute("SELECT hash FROM key_store;").fetchone()[0]
+
+    assert params["version"] == KeyManager.KEY_PARAMS_VERSION
+    assert params["kdf"]["scheme"] == KeyManager.KDF_SCHEME
+    assert params["data_key"]["key_id"] == "legacy-key"
+    assert stored_hash.startswith(KeyManager.VERIFIER_PREFIX)
+
+    key_manager.lock()
+
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    assert key_manager.get_active_key() == data_key
+
+
+def test_subkeys_are_derived_once_per_session(test_db, monkeypatch):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    calls = []
+    derive_subkey = key_manager._kdf.derive_subkey
+
+    def counting_derive_subkey(master_key, purpose):
+        calls.append(purpose)
+        return derive_subkey(master_key, purpose)
+
+    monkeypatch.setattr(key_manager._kdf, "derive_subkey", counting_derive_subkey)
+
+    audit_key = key_manager.get_subkey("audit")
+
+    assert key_manager.get_subkey("audit") == audit_key
+    assert key_manager.get_subkey("search") != audit_key
+    assert calls == ["audit", "search"]
+
+    key_manager.lock()
+
+    with pytest.raises(RuntimeError):
+        key_manager.get_subkey("audit")
+
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    assert key_manager.get_subkey("audit") == audit_key
+    assert calls == ["audit", "search", "audit"]
+
+
+def load_setting(test_db, key):
+    return test_db.execute(
+        "SELECT setting_value FROM settings WHERE setting_key = ?;",
+        (key,),
+    ).fetchone()[0]
+
+
+def test_unlock_uses_stored_kdf_params(test_db):
+    weak = create_key_manager()
+    weak.unlock_with_password(test_db, "OldPassword123!")
+    data_key = weak.get_active_key()
+
+    stronger = KeyManager(
+        argon2_settings=Argon2Settings(time_cost=2, memory_cost=16384, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=2000),
+    )
+
+    stronger.unlock_with_password(test_db, "OldPassword123!")
+
+    assert stronger.get_active_key() == data_key
+    assert stronger.needs_kdf_upgrade(test_db) is True
+    assert weak.needs_kdf_upgrade(test_db) is False
+
+    assert stronger.upgrade_kdf_params(test_db, "OldPassword123!") is True
+
+    params = load_params(test_db)
+    assert params["kdf"]["time_cost"] == 2
+    assert params["kdf"]["memory_cost"] == 16384
+    assert stronger.needs_kdf_upgrade(test_db) is False
+
+    # более слабые настройки не понижают параметры хранилища
+    weak.lock()
+    weak.unlock_with_password(test_db, "OldPassword123!")
+    assert weak.get_active_key() == data_key
+    assert weak.needs_kdf_upgrade(test_db) is False
+
+
+def test_legacy_unlock_uses_stored_pbkdf2_iterations(test_db):
+    creator = create_key_manager()
+    salt = creator.generate_salt()
+    legacy_key = creator.derive_key("OldPassword123!", salt)
+
+    test_db.execute(
+        "INSERT INTO key_store (key_type, salt, hash, params) VALUES (?, ?, ?, ?);",
+        (
+            "master",
+            salt,
+            creator.create_auth_hash("OldPassword123!").hash,
+            creator._build_key_params(),
+        ),
+    )
+
+    other = KeyManager(
+        argon2_settings=Argon2Settings(time_cost=1, memory_cost=8192, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=3000),
+    )
+
+    other.unlock_with_password(test_db, "OldPassword123!")
+
+    assert other.get_active_key() == legacy_key
+    assert load_params(test_db)["encryption"]["iterations"] == 1000
+
+    other.lock()
+    other.unlock_with_password(test_db, "OldPassword123!")
+    assert other.get_active_key() == legacy_key
+
+
+def test_upgrade_rejects_wrong_password(test_db):
+    weak = create_key_manager()
+    weak.unlock_with_password(test_db, "OldPassword123!")
+
+    stronger = KeyManager(
+        argon2_settings=Argon2Settings(time_cost=2, memory_cost=8192, parallelism=1),
+    )
+    stronger.unlock_with_password(test_db, "OldPassword123!")
+    params_before = load_params(test_db)
+
+    with pytest.raises(ValueError):
+        stronger.upgrade_kdf_params(test_db, "WrongPassword1!")
+
+    assert load_params(test_db) == params_before
+
+
+def test_kdf_params_version_setting_follows_key_store(test_db):
+    key_manager = create_key_manager()
+
+    assert load_setting(test_db, KeyManager.KDF_PARAMS_VERSION_SETTING) == "1"
+
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    assert load_setting(test_db, KeyManager.KDF_PARAMS_VERSION_SETTING) == str(
+        KeyManager.KEY_PARAMS_VERSION
+    )
+
+
+def insert_legacy_vault(test_db, key_manager, password):
+    salt = key_manager.generate_salt()
+
+    test_db.execute(
+        "INSERT INTO key_store (key_type, salt, hash, params) VALUES (?, ?, ?, ?);",
+        (
+            "master",
+            salt,
+            key_manager.create_auth_hash(password).hash,
+            key_manager._build_key_params(),
+        ),
+    )
+
+    return key_manager.derive_key(password, salt)
+
+
+def test_concurrent_legacy_unlock_matches_sequential(test_db):
+    sequential = KeyManager(
+        argon2_settings=Argon2Settings(time_cost=1, memory_cost=8192, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=1000),
+        concurrent_unlock=False,
+    )
+    legacy_key = insert_legacy_vault(test_db, sequential, "OldPassword123!")
+
+    concurrent = create_key_manager()
+
+    concurrent.unlock_with_password(test_db, "OldPassword123!")
+
+    assert concurrent.get_active_key() == legacy_key
+    assert concurrent.last_unlock_timing.scheme == "legacy"
+    assert concurrent.last_unlock_timing.concurrent is True
+    assert concurrent.last_unlock_timing.total_ms >= concurrent.last_unlock_timing.kdf_ms
+
+    sequential.unlock_with_password(test_db, "OldPassword123!")
+
+    assert sequential.get_active_key() == legacy_key
+    assert sequential.last_unlock_timing.concurrent is False
+
+
+def test_concurrent_legacy_unlock_rejects_wrong_password(test_db):
+    key_manager = create_key_manager()
+    insert_legacy_vault(test_db, key_manager, "OldPassword123!")
+
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_password(test_db, "WrongPassword1!")
+
+    assert key_manager.has_active_key() is False
+
+
+def test_encryption_borrows_key_without_copies(test_db, monkeypatch):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+    service = AESGCMEncryptionService()
+
+    def fail():
+        raise AssertionError("key copy must not be requested")
+
+    monkeypatch.setattr(key_manager, "get_active_key", fail)
+
+    encrypted = service.encrypt(b"secret", key_manager)
+
+    assert service.decrypt(encrypted, key_manager) == b"secret"
+
+
+def test_cipher_subkey_is_derived_once_per_data_key(test_db, monkeypatch):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+    service = AESGCMEncryptionService()
+
+    calls = []
+    derive_subkey = key_manager._kdf.derive_subkey
+
+    def counting_derive_subkey(master_key, purpose):
+        calls.append(purpose)
+        return derive_subkey(master_key, purpose)
+
+    monkeypatch.setattr(key_manager._kdf, "derive_subkey", counting_derive_subkey)
+
+    encrypted = [service.encrypt(b"secret", key_manager) for _ in range(3)]
+
+    assert [service.decrypt(item, key_manager) for item in encrypted] == [b"secret"] * 3
+    assert calls == ["cipher-suite|1"]
+
+    key_manager.lock()
+    key_manager.unlock_with_password(test_db, "OldPassword123!")
+
+    assert service.decrypt(encrypted[0], key_manager) == b"secret"
+    assert calls == ["cipher-suite|1", "cipher-suite|1"]
+
+
+def test_upgrade_never_lowers_memory_cost(test_db):
+    calibrated = KeyManager(
+        argon2_settings=Argon2Settings(time_cost=1, memory_cost=32768, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=1000),
+    )
+    calibrated.unlock_with_password(test_db, "OldPassword123!")
+
+    more_passes = KeyManager(
+        argon2_settings=Argon2Settings(time_cost=3, memory_cost=16384, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=1000),
+    )
+    more_memory = KeyManager(
+        argon2_settings=Argon2Settings(time_cost=1, memory_cost=65536, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=1000),
+    )
+
+    assert more_passes.needs_kdf_upgrade(test_db) is False
+    assert more_memory.needs_kdf_upgrade(test_db) is True
+
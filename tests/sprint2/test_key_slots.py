@@ -0,0 +1,140 @@
+import pytest
+
+from src.core.crypto.key_derivation import Argon2Settings, PBKDF2Settings
+from src.core.events import EventBus
+from src.core.key_manager import KeyManager, KeySlotsError
+from src.core.vault.reencryption import KeySlotsRemoved, ReencryptionEngine
+
+
+def create_key_manager():
+    return KeyManager(
+        argon2_settings=Argon2Settings(time_cost=1, memory_cost=8192, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=1000),
+    )
+
+
+def test_second_password_slot_unlocks_same_data_key(test_db):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+    data_key = key_manager.get_active_key()
+
+    slot = key_manager.add_key_slot(test_db, "SecondPassword2!", hint="Office laptop")
+    key_manager.lock()
+
+    key_manager.unlock_with_slot(test_db, slot.slot_id, "SecondPassword2!")
+
+    assert key_manager.get_active_key() == data_key
+
+    key_manager.lock()
+
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_slot(test_db, slot.slot_id, "MasterPassword1!")
+
+    # слот мастер-пароля не принимает пароль другого слота
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_password(test_db, "SecondPassword2!")
+
+    slots = key_manager.list_key_slots(test_db)
+
+    assert [(s.slot_id, s.kind, s.hint) for s in slots] == [
+        ("master", "master", ""),
+        (slot.slot_id, "password", "Office laptop"),
+    ]
+
+
+def test_recovery_key_skips_password_stretching(test_db, monkeypatch):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+    data_key = key_manager.get_active_key()
+
+    slot, recovery_key = key_manager.add_recovery_key(test_db, hint="Printed 2026-10")
+    key_manager.lock()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("recovery slot must not run Argon2")
+
+    monkeypatch.setattr(key_manager._kdf, "derive_master_secret", fail)
+
+    typed = recovery_key.lower().replace("-", " ")
+
+    key_manager.unlock_with_slot(test_db, slot.slot_id, typed)
+
+    assert key_manager.get_active_key() == data_key
+    assert slot.kind == "recovery"
+
+
+def test_remove_key_slot(test_db):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+
+    slot = key_manager.add_key_slot(test_db, "EscrowSecret123!", kind="escrow")
+    key_manager.remove_key_slot(test_db, slot.slot_id)
+
+    assert [s.slot_id for s in key_manager.list_key_slots(test_db)] == ["master"]
+
+    with pytest.raises(ValueError):
+        key_manager.remove_key_slot(test_db, slot.slot_id)
+
+    with pytest.raises(ValueError):
+        key_manager.remove_key_slot(test_db, "master")
+
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_slot(test_db, slot.slot_id, "EscrowSecret123!")
+
+
+def test_data_key_rotation_requires_consent_to_drop_slots(test_db):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+    slot, recovery_key = key_manager.add_recovery_key(test_db)
+
+    event_bus = EventBus()
+    removed = []
+    event_bus.subscribe(KeySlotsRemoved, removed.append)
+    engine = ReencryptionEngine(test_db, key_manager, event_bus=event_bus)
+
+    with pytest.raises(KeySlotsError) as error:
+        engine.rotate_data_key("MasterPassword1!")
+
+    # отказ ничего не меняет: ротация не начата, слот работает
+    assert error.value.slot_ids == [slot.slot_id]
+    assert not engine.has_pending()
+    key_manager.lock()
+    key_manager.unlock_with_slot(test_db, slot.slot_id, recovery_key)
+
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+    engine.rotate_data_key("MasterPassword1!", drop_key_slots=True)
+
+    assert [s.slot_id for s in key_manager.list_key_slots(test_db)] == ["master"]
+    assert [event.slot_ids for event in removed] == [[slot.slot_id]]
+
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_slot(test_db, slot.slot_id, recovery_key)
+
+
+def test_password_change_with_key_from_password_keeps_slots_by_default(test_db):
+    key_manager = create_key_manager()
+
+    # хранилище до конвертного шифрования: ключ данных получен из пароля
+    test_db.execute(
+        "INSERT INTO key_store (key_type, salt, hash, params) VALUES (?, ?, ?, ?);",
+        (
+            "master",
+            key_manager.generate_salt(),
+            key_manager.create_auth_hash("MasterPassword1!").hash,
+            key_manager._build_key_params(),
+        )
+    )
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+    slot = key_manager.add_key_slot(test_db, "SecondPassword2!")
+    engine = ReencryptionEngine(test_db, key_manager)
+
+    with pytest.raises(KeySlotsError):
+        engine.change_master_password("MasterPassword1!", "NewPassword3!")
+
+    key_manager.unlock_with_slot(test_db, slot.slot_id, "SecondPassword2!")
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+
+    engine.change_master_password("MasterPassword1!", "NewPassword3!", drop_key_slots=True)
+
+    assert [s.slot_id for s in key_manager.list_key_slots(test_db)] == ["master"]
+    key_manager.unlock_with_password(test_db, "NewPassword3!")
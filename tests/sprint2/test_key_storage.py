@@ -1,3 +1,4 @@
+import threading
 import time
 import pytest
 from src.core.crypto.key_storage import KeyStorage
@@ -47,4 +48,72 @@ def test_key_storage_clear_removes_key_before_ttl():
     assert storage.has_key() is False
 
     with pytest.raises(RuntimeError):
-        storage.load()
\ No newline at end of file
+        storage.load()
+
+def test_key_storage_subkeys_are_cleared_with_key():
+    storage = KeyStorage()
+
+    storage.save(b"a" * 32)
+    storage.save_subkey("audit", b"b" * 32)
+
+    assert storage.load_subkey("audit") == b"b" * 32
+    assert storage.load_subkey("export") is None
+
+    storage.clear()
+
+    assert storage.load_subkey("audit") is None
+
+def test_key_storage_subkey_requires_key():
+    storage = KeyStorage()
+
+    with pytest.raises(RuntimeError):
+        storage.save_subkey("audit", b"b" * 32)
+
+def test_key_storage_borrow_yields_read_only_view():
+    storage = KeyStorage()
+    storage.save(b"a" * 32)
+
+    with storage.borrow() as key:
+        assert isinstance(key, memoryview)
+        assert key.readonly is True
+        assert bytes(key) == b"a" * 32
+
+    storage.clear()
+
+    with pytest.raises(ValueError):
+        key.tobytes()
+
+    with pytest.raises(RuntimeError):
+        with storage.borrow():
+            pass
+
+def test_key_storage_clear_waits_for_borrow():
+    storage = KeyStorage()
+    storage.save(b"a" * 32)
+    borrowed = threading.Event()
+    release = threading.Event()
+    seen = []
+
+    def use_key():
+        with storage.borrow() as key:
+            borrowed.set()
+            release.wait(5)
+            seen.append(bytes(key))
+
+    worker = threading.Thread(target=use_key)
+    worker.start()
+    borrowed.wait(5)
+
+    clearing = threading.Thread(target=storage.clear)
+    clearing.start()
+    clearing.join(0.2)
+
+    # ключ не затирается, пока другой поток его использует
+    assert clearing.is_alive()
+
+    release.set()
+    worker.join(5)
+    clearing.join(5)
+
+    assert seen == [b"a" * 32]
+    assert not storage.has_key()
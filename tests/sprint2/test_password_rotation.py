@@ -1,23 +1,15 @@
 from pathlib import Path
 
+from src.core.crypto.kdf_calibration import KdfProfile
+from src.core.crypto.key_derivation import Argon2Settings, PBKDF2Settings
 from src.database.db import Database
 from src.database.repo import VaultRepository
 
 
-def test_password_change_reencrypts_vault_entries(tmp_path: Path):
-    db_path = tmp_path / "test_rotation.db"
-
-    db = Database(db_path)
-    db.connect()
-
-    repo = VaultRepository(db)
-
-    old_password = "OldPassword123!"
-    new_password = "NewPassword456!"
-
-    for i in range(10):
+def add_entries(repo, password, count=10):
+    for i in range(count):
         repo.add_entry(
-            master_password=old_password,
+            master_password=password,
             title=f"Service {i}",
             username=f"user{i}",
             password=f"secret-password-{i}",
@@ -26,45 +18,169 @@ def test_password_change_reencrypts_vault_entries(tmp_path: Path):
             tags="test"
         )
 
-    assert repo.count_entries() == 10
 
-    before_rows = db.execute(
+def select_rows(db):
+    return db.execute(
         """
-        SELECT id, encrypted_password
+        SELECT id, encrypted_data, encrypted_header
         FROM vault_entries
         ORDER BY id;
         """
     ).fetchall()
 
+
+def check_passwords(repo, db, old_password, new_password):
+    repo.key_manager.lock()
+    repo.key_manager.unlock_with_password(db, new_password)
+
+    rows = repo.get_entries_for_table()
+    assert len(rows) == 10
+
+    for entry_id, title, _, _ in rows:
+        entry = repo.get_entry_by_id(entry_id)
+        assert entry["password"] == f"secret-password-{title.split()[-1]}"
+
+    repo.key_manager.lock()
+
+    try:
+        repo.key_manager.unlock_with_password(db, old_password)
+        assert False, "Old password should not unlock vault after rotation"
+    except ValueError:
+        pass
+
+
+def test_password_change_rewraps_data_key_only(tmp_path: Path):
+    db = Database(tmp_path / "test_rotation.db")
+    db.connect()
+
+    repo = VaultRepository(db)
+
+    old_password = "OldPassword123!"
+    new_password = "NewPassword456!"
+
+    add_entries(repo, old_password)
+    assert repo.count_entries() == 10
+
+    before_rows = select_rows(db)
+
     changed = repo.change_master_password(
         old_password=old_password,
         new_password=new_password,
     )
 
     assert changed is True
+    assert select_rows(db) == before_rows
 
-    after_rows = db.execute(
-        """
-        SELECT id, encrypted_password
-        FROM vault_entries
-        ORDER BY id;
+    check_passwords(repo, db, old_password, new_password)
+
+    db.close()
+
+
+def test_password_change_reencrypts_vault_entries(tmp_path: Path):
+    db = Database(tmp_path / "test_rotation.db")
+    db.connect()
+
+    repo = VaultRepository(db)
+
+    old_password = "OldPassword123!"
+    new_password = "NewPassword456!"
+
+    # хранилище до конвертного шифрования: ключ данных получен из пароля
+    db.execute(
         """
-    ).fetchall()
+        INSERT INTO key_store (key_type, salt, hash, params)
+        VALUES (?, ?, ?, ?);
+        """,
+        (
+            "master",
+            repo.key_manager.generate_salt(),
+            repo.key_manager.create_auth_hash(old_password).hash,
+            repo.key_manager._build_key_params(),
+        )
+    )
+
+    add_entries(repo, old_password)
+    assert repo.key_manager.is_data_key_derived_from_password(db)
+    assert repo.key_manager.legacy_key_version == 1
+
+    before_rows = select_rows(db)
+
+    changed = repo.change_master_password(
+        old_password=old_password,
+        new_password=new_password,
+    )
+
+    assert changed is True
+
+    after_rows = select_rows(db)
 
+    assert [row[0] for row in after_rows] == [row[0] for row in before_rows]
     assert before_rows != after_rows
+    assert not repo.key_manager.is_data_key_derived_from_password(db)
+    assert repo.key_manager.legacy_key_version is None
 
-    repo.key_manager.lock()
-    repo.key_manager.unlock_with_password(db, new_password)
+    check_passwords(repo, db, old_password, new_password)
 
-    rows = repo.get_entries_for_table()
-    assert len(rows) == 10
+    db.close()
+
+
+def test_legacy_kdf_is_upgraded_in_background(tmp_path: Path):
+    db = Database(tmp_path / "test_rotation.db")
+    db.connect()
+
+    repo = VaultRepository(db)
+    password = "OldPassword123!"
+
+    db.execute(
+        """
+        INSERT INTO key_store (key_type, salt, hash, params)
+        VALUES (?, ?, ?, ?);
+        """,
+        (
+            "master",
+            repo.key_manager.generate_salt(),
+            repo.key_manager.create_auth_hash(password).hash,
+            repo.key_manager._build_key_params(),
+        )
+    )
+
+    add_entries(repo, password)
+
+    thread = repo.upgrade_kdf_in_background(password)
+    assert thread is not None
+    thread.join(timeout=30)
+
+    assert not repo.key_manager.needs_kdf_upgrade(db)
+    assert repo.upgrade_kdf_in_background(password) is None
 
     repo.key_manager.lock()
+    repo.key_manager.unlock_with_password(db, password)
+    assert len(repo.get_entries_for_table()) == 10
 
-    try:
-        repo.key_manager.unlock_with_password(db, old_password)
-        assert False, "Old password should not unlock vault after rotation"
-    except ValueError:
-        pass
+    db.close()
+
+
+def test_calibrated_kdf_is_kept_after_login_with_default_repo(tmp_path: Path):
+    db = Database(tmp_path / "test_rotation.db")
+    db.connect()
+
+    password = "OldPassword123!"
+    # меньше проходов, но больше памяти, чем настройки по умолчанию
+    profile = KdfProfile(
+        argon2=Argon2Settings(time_cost=1, memory_cost=128 * 1024, parallelism=1),
+        pbkdf2=PBKDF2Settings(iterations=1000),
+        target_ms=500,
+        argon2_ms=0.0,
+        pbkdf2_ms=0.0,
+    )
+
+    VaultRepository(db, kdf_profile=profile).key_manager.unlock_with_password(db, password)
+
+    repo = VaultRepository(db)
+    repo.key_manager.unlock_with_password(db, password)
+
+    assert repo.key_manager._kdf.argon2_settings == profile.argon2
+    assert not repo.key_manager.needs_kdf_upgrade(db)
+    assert repo.upgrade_kdf_in_background(password) is None
 
-    db.close()
\ No newline at end of file
+    db.close()
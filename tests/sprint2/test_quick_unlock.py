@@ -0,0 +1,163 @@
+import time
+
+import pytest
+from keyring.backend import KeyringBackend
+from keyring.errors import PasswordDeleteError
+
+from src.core.crypto.key_derivation import Argon2Settings, PBKDF2Settings
+from src.core.key_manager import KeyManager
+from src.core.os_keychain import OSKeychain
+from src.core.vault.reencryption import ReencryptionEngine
+
+
+class MemoryKeyring(KeyringBackend):
+    priority = 1
+
+    def __init__(self):
+        super().__init__()
+        self.secrets = {}
+
+    def set_password(self, service, username, password):
+        self.secrets[(service, username)] = password
+
+    def get_password(self, service, username):
+        return self.secrets.get((service, username))
+
+    def delete_password(self, service, username):
+        if self.secrets.pop((service, username), None) is None:
+            raise PasswordDeleteError(username)
+
+
+def create_key_manager(keyring, **kwargs):
+    return KeyManager(
+        argon2_settings=Argon2Settings(time_cost=1, memory_cost=8192, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=1000),
+        keychain=OSKeychain(backend=keyring),
+        **kwargs,
+    )
+
+
+def unlocked_with_pin(test_db, keyring, pin="4821", **kwargs):
+    key_manager = create_key_manager(keyring, **kwargs)
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+    data_key = key_manager.get_active_key()
+    key_manager.enable_quick_unlock(test_db, pin)
+    key_manager.lock()
+    return key_manager, data_key
+
+
+def test_pin_unlocks_after_lock_without_password_kdf(test_db, monkeypatch):
+    keyring = MemoryKeyring()
+    key_manager, data_key = unlocked_with_pin(test_db, keyring)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("quick unlock must not run Argon2")
+
+    monkeypatch.setattr(key_manager._kdf, "derive_master_secret", fail)
+
+    assert key_manager.is_quick_unlock_available(test_db)
+    key_manager.unlock_with_pin(test_db, "4821")
+    assert key_manager.get_active_key() == data_key
+    assert key_manager.has_active_key()
+
+
+def test_pin_requires_keychain_secret(test_db):
+    keyring = MemoryKeyring()
+    key_manager, _ = unlocked_with_pin(test_db, keyring)
+
+    keyring.secrets.clear()
+
+    assert not key_manager.is_quick_unlock_available(test_db)
+
+    with pytest.raises(RuntimeError):
+        key_manager.unlock_with_pin(test_db, "4821")
+
+
+def test_wrong_pins_disable_quick_unlock(test_db):
+    keyring = MemoryKeyring()
+    key_manager, data_key = unlocked_with_pin(test_db, keyring, quick_unlock_max_attempts=3)
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            key_manager.unlock_with_pin(test_db, "0000")
+
+    # неудачные попытки переживают перезапуск приложения
+    restarted = create_key_manager(keyring, quick_unlock_max_attempts=3)
+
+    with pytest.raises(RuntimeError):
+        restarted.unlock_with_pin(test_db, "0000")
+
+    assert not restarted.is_quick_unlock_available(test_db)
+    assert keyring.secrets == {}
+
+    with pytest.raises(RuntimeError):
+        restarted.unlock_with_pin(test_db, "4821")
+
+    restarted.unlock_with_password(test_db, "MasterPassword1!")
+
+    assert restarted.get_active_key() == data_key
+
+
+def test_successful_pin_resets_attempts(test_db):
+    keyring = MemoryKeyring()
+    key_manager, data_key = unlocked_with_pin(test_db, keyring, quick_unlock_max_attempts=2)
+
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_pin(test_db, "0000")
+
+    key_manager.unlock_with_pin(test_db, "4821")
+
+    assert key_manager.get_active_key() == data_key
+    key_manager.lock()
+
+    with pytest.raises(ValueError):
+        key_manager.unlock_with_pin(test_db, "0000")
+
+    key_manager.unlock_with_pin(test_db, "4821")
+
+    assert key_manager.get_active_key() == data_key
+
+
+def test_quick_unlock_expires(test_db, monkeypatch):
+    keyring = MemoryKeyring()
+    key_manager, _ = unlocked_with_pin(test_db, keyring, quick_unlock_max_age_seconds=60)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+
+    assert not key_manager.is_quick_unlock_available(test_db)
+
+    with pytest.raises(RuntimeError):
+        key_manager.unlock_with_pin(test_db, "4821")
+
+    assert keyring.secrets == {}
+
+
+def test_short_pin_and_disable(test_db):
+    keyring = MemoryKeyring()
+    key_manager = create_key_manager(keyring)
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+
+    with pytest.raises(ValueError):
+        key_manager.enable_quick_unlock(test_db, "123")
+
+    key_manager.enable_quick_unlock(test_db, "4821")
+    key_manager.disable_quick_unlock(test_db)
+
+    assert not key_manager.is_quick_unlock_available(test_db)
+    assert keyring.secrets == {}
+
+
+def test_data_key_rotation_disables_quick_unlock(test_db):
+    keyring = MemoryKeyring()
+    key_manager = create_key_manager(keyring)
+    key_manager.unlock_with_password(test_db, "MasterPassword1!")
+    key_manager.enable_quick_unlock(test_db, "4821")
+
+    ReencryptionEngine(test_db, key_manager).rotate_data_key(
+        "MasterPassword1!",
+        drop_key_slots=True,
+    )
+
+    assert not key_manager.is_quick_unlock_available(test_db)
+    assert keyring.secrets == {}
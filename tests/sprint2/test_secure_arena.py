@@ -0,0 +1,77 @@
+import pytest
+
+from src.core.crypto.key_storage import KeyStorage
+from src.core.crypto.secure_arena import SecureArena
+
+
+def test_arena_slot_round_trip_and_zeroing():
+    arena = SecureArena(slot_size=64, slot_count=4)
+
+    slot = arena.allocate(b"k" * 32)
+    raw = arena._slot_view(slot._index)
+
+    assert slot.tobytes() == b"k" * 32
+    assert bytes(slot.view) == b"k" * 32
+    assert arena.stats().in_use == 1
+
+    slot.release()
+
+    assert bytes(raw) == bytes(64)
+    assert slot.released is True
+    assert arena.stats().in_use == 0
+    assert arena.stats().peak_in_use == 1
+
+    with pytest.raises(RuntimeError):
+        slot.view
+
+    raw.release()
+    arena.close()
+
+
+def test_arena_limits():
+    arena = SecureArena(slot_size=16, slot_count=2)
+
+    with pytest.raises(ValueError):
+        arena.allocate(b"x" * 17)
+
+    first = arena.allocate(b"a")
+    second = arena.allocate(b"b")
+
+    with pytest.raises(MemoryError):
+        arena.allocate(b"c")
+
+    with pytest.raises(RuntimeError):
+        arena.close()
+
+    first.release()
+
+    with arena.allocate(b"d") as third:
+        assert third.tobytes() == b"d"
+
+    second.release()
+    arena.close()
+
+    assert arena.closed is True
+    assert arena.stats().allocations == 3
+
+    with pytest.raises(RuntimeError):
+        arena.allocate(b"e")
+
+
+def test_key_storage_keeps_keys_in_arena():
+    storage = KeyStorage()
+
+    storage.save(b"a" * 32)
+    storage.save_subkey("audit", b"b" * 32)
+
+    with storage.store_secret(b"decrypted password") as secret:
+        assert secret.tobytes() == b"decrypted password"
+        assert storage.arena_stats().in_use == 3
+
+    assert storage.arena_stats().in_use == 2
+
+    storage.clear()
+
+    stats = storage.arena_stats()
+    assert stats.in_use == 0
+    assert stats.allocations == 3
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from src.core.crypto.key_derivation import Argon2Settings, KeyDerivationService, PBKDF2Settings
+from src.core.crypto.unlock_worker import UnlockCancelled, UnlockWorker
+from src.core.key_manager import KeyManager
+
+FAST_ARGON2 = Argon2Settings(time_cost=1, memory_cost=8192, parallelism=1)
+FAST_PBKDF2 = PBKDF2Settings(iterations=1000)
+
+
+def test_worker_matches_in_process_kdf():
+    service = KeyDerivationService(FAST_ARGON2, FAST_PBKDF2)
+    salt = service.generate_salt()
+    stages = []
+
+    with UnlockWorker(persistent=True, on_progress=stages.append) as worker:
+        assert worker.derive_master_secret("StrongPass123!", salt, FAST_ARGON2) == (
+            service.derive_master_secret("StrongPass123!", salt)
+        )
+        process = worker._persistent_process
+
+        assert worker.derive_encryption_key("StrongPass123!", salt, FAST_PBKDF2) == (
+            service.derive_encryption_key("StrongPass123!", salt)
+        )
+        assert worker._persistent_process is process
+
+        stored_hash = service.create_auth_hash("StrongPass123!").hash
+        assert worker.verify_password("StrongPass123!", stored_hash) is True
+        assert worker.verify_password("WrongPass123!", stored_hash) is False
+
+    assert stages[:2] == ["derive_master_secret", "done"]
+    assert process.is_alive() is False
+
+
+def test_worker_cancel_interrupts_kdf():
+    worker = UnlockWorker()
+    slow = Argon2Settings(time_cost=50, memory_cost=65536, parallelism=1)
+    outcome = {}
+
+    def run():
+        try:
+            worker.derive_master_secret("StrongPass123!", b"s" * 16, slow)
+        except Exception as exc:
+            outcome["error"] = exc
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    time.sleep(0.5)
+
+    worker.cancel()
+    thread.join(timeout=10)
+
+    assert isinstance(outcome.get("error"), UnlockCancelled)
+
+    with pytest.raises(UnlockCancelled):
+        worker.verify_password("StrongPass123!", "hash")
+
+    worker.reset()
+    assert worker.verify_password("StrongPass123!", "not-a-hash") is False
+
+
+def test_key_manager_unlocks_through_worker(test_db):
+    local = KeyManager(argon2_settings=FAST_ARGON2, pbkdf2_settings=FAST_PBKDF2)
+    local.unlock_with_password(test_db, "OldPassword123!")
+    data_key = local.get_active_key()
+
+    with UnlockWorker(persistent=True) as worker:
+        remote = KeyManager(
+            argon2_settings=FAST_ARGON2,
+            pbkdf2_settings=FAST_PBKDF2,
+            kdf_worker=worker,
+        )
+
+        remote.unlock_with_password(test_db, "OldPassword123!")
+
+        assert remote.get_active_key() == data_key
+
+        remote.lock()
+
+        with pytest.raises(ValueError):
+            remote.unlock_with_password(test_db, "WrongPassword1!")
@@ -0,0 +1,59 @@
+import pytest
+
+from src.core.crypto.cipher_suites import (
+    AUTO_CIPHER_SUITE,
+    available_cipher_suites,
+    benchmark_cipher_suites,
+    get_cipher_suite,
+    resolve_cipher_suite,
+)
+from src.database.repo import VaultRepository
+
+
+def test_registry_contains_builtin_suites():
+    names = available_cipher_suites()
+
+    assert names[:2] == ["AES-256-GCM", "CHACHA20-POLY1305"]
+    assert get_cipher_suite("chacha20-poly1305").suite_id == 2
+
+    with pytest.raises(ValueError):
+        get_cipher_suite("XOR_PLACEHOLDER")
+
+
+def test_auto_mode_picks_fastest_suite():
+    results = benchmark_cipher_suites(payload_size=4096, rounds=2)
+
+    assert set(results) == set(available_cipher_suites())
+    assert resolve_cipher_suite(AUTO_CIPHER_SUITE) in results
+
+
+def test_repository_keeps_cipher_suite_of_first_run(test_db):
+    repo = VaultRepository(test_db, cipher_suite="CHACHA20-POLY1305")
+
+    assert repo.crypto.cipher_suite.name == "CHACHA20-POLY1305"
+
+    reopened = VaultRepository(test_db)
+
+    assert reopened.crypto.cipher_suite.name == "CHACHA20-POLY1305"
+
+
+def test_auto_cipher_suite_is_resolved_only_at_creation(test_db, monkeypatch):
+    repo = VaultRepository(test_db, cipher_suite="AES-256-GCM")
+    repo.key_manager.unlock_with_password(test_db, "MasterPassword1!")
+    test_db.execute(
+        "DELETE FROM settings WHERE setting_key = ?;",
+        (VaultRepository.CIPHER_SUITE_SETTING,),
+    )
+
+    def fail(**kwargs):
+        raise AssertionError("existing vault must not run the benchmark")
+
+    monkeypatch.setattr("src.core.crypto.cipher_suites.select_cipher_suite", fail)
+
+    reopened = VaultRepository(test_db, cipher_suite=AUTO_CIPHER_SUITE)
+
+    assert reopened.crypto.cipher_suite.name == "AES-256-GCM"
+    assert test_db.execute(
+        "SELECT COUNT(*) FROM settings WHERE setting_key = ?;",
+        (VaultRepository.CIPHER_SUITE_SETTING,),
+    ).fetchone()[0] == 0
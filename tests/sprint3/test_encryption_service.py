@@ -1,15 +1,23 @@
+import io
+import os
+
 import pytest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 from src.core.vault.encryption_service import (
     AESGCMEncryptionService,
+    BinaryPayloadCodec,
+    JsonPayloadCodec,
     VaultEncryptionError,
 )
 
 class FakeKeyManager:
     def __init__(self, key: bytes | None = None):
         self.key = key or (b"A" * 32)
+        self.calls = 0
 
     def get_active_key(self) -> bytes:
+        self.calls += 1
         return self.key
 
 def test_encrypt_decrypt_entry_success():
@@ -165,4 +173,366 @@ def test_too_short_encrypted_data_raises_error():
     key_manager = FakeKeyManager()
 
     with pytest.raises(VaultEncryptionError):
-        service.decrypt(b"short", key_manager)
\ No newline at end of file
+        service.decrypt(b"short", key_manager)
+def test_entry_parts_roundtrip_and_header_has_no_secrets():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+
+    entry_data = {
+        "title": "GitHub",
+        "username": "user@example.com",
+        "password": "StrongPassword123!",
+        "url": "https://github.com",
+        "notes": "main account",
+        "category": "Work",
+    }
+
+    encrypted_header, encrypted_body = service.encrypt_entry_parts(
+        entry_data,
+        key_manager,
+        associated_data=b"entry-id-1",
+    )
+
+    header = service.decrypt_entry_header(
+        encrypted_header,
+        key_manager,
+        associated_data=b"entry-id-1",
+    )
+    payload = service.decrypt_entry_parts(
+        encrypted_header,
+        encrypted_body,
+        key_manager,
+        associated_data=b"entry-id-1",
+    )
+
+    assert header["title"] == "GitHub"
+    assert "password" not in header
+    assert "notes" not in header
+    assert payload["password"] == "StrongPassword123!"
+    assert payload["notes"] == "main account"
+
+def test_swapped_entry_parts_fail_authentication():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+
+    encrypted_header, encrypted_body = service.encrypt_entry_parts(
+        {"title": "GitHub", "password": "StrongPassword123!"},
+        key_manager,
+        associated_data=b"entry-id-1",
+    )
+
+    with pytest.raises(VaultEncryptionError):
+        service.decrypt_entry_header(
+            encrypted_body,
+            key_manager,
+            associated_data=b"entry-id-1",
+        )
+
+def test_encrypt_many_fetches_key_once_and_roundtrips():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+
+    items = [f"item-{i}".encode("utf-8") for i in range(10)]
+    associated = [f"id-{i}".encode("utf-8") for i in range(10)]
+
+    encrypted = service.encrypt_many(items, key_manager, associated_data=associated)
+    results = service.decrypt_many(encrypted, key_manager, associated_data=associated)
+
+    assert key_manager.calls == 2
+    assert [result.value for result in results] == items
+    assert len({blob[:service.NONCE_SIZE] for blob in encrypted}) == 10
+
+def test_decrypt_many_reports_errors_per_item():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+
+    encrypted = service.encrypt_entries(
+        [
+            {"title": "First", "password": "FirstPassword123!"},
+            {"title": "Second", "password": "SecondPassword123!"},
+        ],
+        key_manager,
+    )
+
+    tampered = bytearray(encrypted[0])
+    tampered[-1] ^= 1
+
+    results = service.decrypt_entries(
+        [bytes(tampered), encrypted[1], b"short"],
+        key_manager,
+    )
+
+    assert results[0].ok is False
+    assert isinstance(results[0].error, VaultEncryptionError)
+    assert results[1].ok is True
+    assert results[1].value["title"] == "Second"
+    assert results[2].ok is False
+
+def test_batch_associated_data_must_match_items():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+
+    with pytest.raises(ValueError):
+        service.encrypt_many([b"a", b"b"], key_manager, associated_data=[b"id"])
+
+def test_version_1_payload_is_still_readable():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+
+    legacy_payload = (
+        b'{"version": 1, "title": "Legacy", "username": "old", '
+        b'"password": "OldPassword1!", "url": "", "notes": "", '
+        b'"category": "", "tags": [], "created_at": "2024-01-01T00:00:00"}'
+    )
+    encrypted = service.encrypt(legacy_payload, key_manager)
+
+    decrypted = service.decrypt_entry(encrypted, key_manager)
+
+    assert decrypted["title"] == "Legacy"
+    assert decrypted["password"] == "OldPassword1!"
+
+def test_long_payload_is_compressed():
+    service = AESGCMEncryptionService()
+    uncompressed_service = AESGCMEncryptionService(compression=False)
+    key_manager = FakeKeyManager()
+
+    entry_data = {
+        "title": "Server",
+        "username": "root",
+        "password": "StrongPassword123!",
+        "notes": "-----BEGIN CERTIFICATE-----\n" + "MIIDdzCCAl+gAwIBAgIE\n" * 200,
+    }
+
+    encrypted = service.encrypt_entry(entry_data, key_manager)
+    plain = uncompressed_service.encrypt_entry(entry_data, key_manager)
+    payload = service.decrypt(encrypted, key_manager)
+
+    assert payload[0] == service.PAYLOAD_VERSION
+    assert payload[1] == service.CODEC_ZLIB
+    assert len(encrypted) < len(plain)
+    assert service.decrypt_entry(encrypted, key_manager)["notes"] == entry_data["notes"]
+    assert service.decrypt_entry(plain, key_manager)["notes"] == entry_data["notes"]
+
+def test_tiny_payload_is_not_compressed():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+
+    header, body = service.encrypt_entry_parts(
+        {"title": "A", "password": "B"},
+        key_manager,
+        associated_data=b"entry-1",
+    )
+    payload = service.decrypt(
+        body,
+        key_manager,
+        associated_data=b"entry-1" + service.BODY_AAD_LABEL,
+    )
+
+    assert payload[0] == service.PAYLOAD_VERSION
+    assert payload[1] == service.CODEC_NONE
+    assert service.decrypt_entry_body(body, key_manager, b"entry-1")["password"] == "B"
+
+def test_binary_codec_roundtrip_is_smaller_than_json():
+    service = AESGCMEncryptionService()
+    json_service = AESGCMEncryptionService(codec=JsonPayloadCodec())
+
+    entry_data = {
+        "title": "Почта",
+        "username": "user@example.com",
+        "password": "Пароль-123!",
+        "url": "https://mail.example.com",
+        "notes": "",
+        "category": "Personal",
+        "tags": ["mail", "", "личное"],
+        "created_at": "2024-01-01T00:00:00+00:00",
+    }
+
+    binary_bytes = service.serialize_entry(entry_data)
+    json_bytes = json_service.serialize_entry(entry_data)
+
+    assert binary_bytes[0] == BinaryPayloadCodec.codec_id
+    assert len(binary_bytes) < len(json_bytes)
+    assert service.deserialize_entry(binary_bytes) == json_service.deserialize_entry(json_bytes)
+    assert service.deserialize_entry(bytearray(binary_bytes))["tags"] == entry_data["tags"]
+
+def test_json_and_binary_payloads_coexist():
+    key_manager = FakeKeyManager()
+    service = AESGCMEncryptionService()
+    json_service = AESGCMEncryptionService(codec=JsonPayloadCodec())
+
+    entry_data = {"title": "GitHub", "password": "StrongPassword123!"}
+
+    encrypted_json = json_service.encrypt_entry(entry_data, key_manager)
+    encrypted_binary = service.encrypt_entry(entry_data, key_manager)
+
+    assert service.decrypt_entry(encrypted_json, key_manager)["title"] == "GitHub"
+    assert json_service.decrypt_entry(encrypted_binary, key_manager)["title"] == "GitHub"
+
+def test_version_2_payload_is_still_readable():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+
+    payload = bytes((2, service.CODEC_NONE)) + (
+        b'{"version": 1, "title": "V2", "username": "", "password": "p", '
+        b'"url": "", "notes": "", "created_at": "2024-01-01T00:00:00"}'
+    )
+    encrypted = service.encrypt(payload, key_manager)
+
+    assert service.decrypt_entry(encrypted, key_manager)["title"] == "V2"
+
+def test_unsupported_payload_falls_back_to_json():
+    service = AESGCMEncryptionService()
+
+    payload_bytes = service.serialize_entry({"title": "A", "tags": [1, 2]})
+
+    assert payload_bytes[0] == JsonPayloadCodec.codec_id
+    assert service.deserialize_entry(payload_bytes)["tags"] == [1, 2]
+
+def test_truncated_binary_payload_raises_error():
+    service = AESGCMEncryptionService()
+
+    payload_bytes = service.serialize_entry({"title": "GitHub", "password": "secret"})
+
+    with pytest.raises(VaultEncryptionError):
+        service.deserialize_entry(payload_bytes[:-3])
+
+    with pytest.raises(VaultEncryptionError):
+        service.deserialize_entry(payload_bytes[:3])
+
+def test_encrypt_stream_roundtrip():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+    content = os.urandom(100_000)
+
+    encrypted = io.BytesIO()
+    written = service.encrypt_stream(
+        io.BytesIO(content),
+        encrypted,
+        key_manager,
+        associated_data=b"file-1",
+        chunk_size=4096,
+    )
+
+    output = io.BytesIO()
+    encrypted.seek(0)
+    read = service.decrypt_stream(encrypted, output, key_manager, associated_data=b"file-1")
+
+    assert written == read == len(content)
+    assert output.getvalue() == content
+
+def test_each_stream_gets_its_own_key():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+    first, second = service.new_stream_nonce(), service.new_stream_nonce()
+
+    assert len(first) == service.STREAM_SALT_SIZE
+    assert first != second
+
+    # одинаковые данные и номер куска, но разные ключи потоков
+    chunks = [
+        service.encrypt_stream_chunk(b"data", key_manager, salt, 0, True)
+        for salt in (first, second)
+    ]
+    assert chunks[0] != chunks[1]
+
+    with pytest.raises(VaultEncryptionError):
+        service.decrypt_stream_chunk(chunks[0], key_manager, second, 0, True)
+
+    with pytest.raises(VaultEncryptionError):
+        service.decrypt_stream_chunk(chunks[0], key_manager, b"short", 0, True)
+
+    assert service.decrypt_stream_chunk(chunks[0], key_manager, first, 0, True) == b"data"
+
+def test_truncated_stream_is_detected():
+    service = AESGCMEncryptionService()
+    key_manager = FakeKeyManager()
+
+    encrypted = io.BytesIO()
+    service.encrypt_stream(io.BytesIO(b"x" * 10_000), encrypted, key_manager, chunk_size=4096)
+
+    # убираем последний кусок: 4 байта длины + 10000 - 2 * 4096 байт данных + тег
+    last_record_size = 4 + (10_000 - 2 * 4096) + service.TAG_SIZE
+    truncated = io.BytesIO(encrypted.getvalue()[:-last_record_size])
+
+    with pytest.raises(VaultEncryptionError):
+        service.decrypt_stream(truncated, io.BytesIO(), key_manager)
+
+def legacy_encrypt(key: bytes, data: bytes, nonce: bytes | None = None) -> bytes:
+    # формат до появления заголовка шифра: nonce + AES-GCM
+    nonce = nonce or os.urandom(12)
+    return nonce + AESGCM(key).encrypt(nonce, data, None)
+
+def test_chacha20_entries_coexist_with_aes_gcm():
+    key_manager = FakeKeyManager()
+    aes_service = AESGCMEncryptionService()
+    chacha_service = AESGCMEncryptionService(cipher_suite="CHACHA20-POLY1305")
+
+    entry_data = {"title": "GitHub", "password": "StrongPassword123!"}
+
+    aes_blob = aes_service.encrypt_entry(entry_data, key_manager)
+    chacha_blob = chacha_service.encrypt_entry(entry_data, key_manager)
+
+    assert aes_blob[:4] == bytes((0xC6, 1, 0, 1))
+    assert chacha_blob[:4] == bytes((0xC6, 2, 0, 1))
+
+    for blob in (aes_blob, chacha_blob):
+        assert aes_service.decrypt_entry(blob, key_manager)["password"] == "StrongPassword123!"
+        assert chacha_service.decrypt_entry(blob, key_manager)["password"] == "StrongPassword123!"
+
+def test_legacy_blobs_without_suite_header_are_readable():
+    key_manager = FakeKeyManager()
+    service = AESGCMEncryptionService(cipher_suite="CHACHA20-POLY1305")
+
+    plain = legacy_encrypt(key_manager.key, b"legacy")
+    # nonce старой записи случайно совпал с заголовком шифра
+    colliding = legacy_encrypt(key_manager.key, b"collision", bytes((0xC6, 2, 0, 1)) + os.urandom(8))
+
+    results = service.decrypt_many([plain, colliding], key_manager)
+
+    assert [result.value for result in results] == [b"legacy", b"collision"]
+
+def test_wrong_key_is_checked_once_without_legacy_data():
+    service = AESGCMEncryptionService()
+    encrypted = service.encrypt(b"secret", FakeKeyManager())
+
+    key_manager = FakeKeyManager(b"B" * 32)
+    key_manager.legacy_key_version = None
+
+    with pytest.raises(VaultEncryptionError):
+        service.decrypt(encrypted, key_manager)
+
+    # старый формат не проверяется: ключ запрошен один раз
+    assert key_manager.calls == 1
+
+    with pytest.raises(VaultEncryptionError):
+        service.decrypt(legacy_encrypt(key_manager.key, b"legacy"), key_manager)
+
+def test_chacha20_stream_roundtrip():
+    key_manager = FakeKeyManager()
+    service = AESGCMEncryptionService(cipher_suite="CHACHA20-POLY1305")
+    content = os.urandom(50_000)
+
+    encrypted = io.BytesIO()
+    service.encrypt_stream(io.BytesIO(content), encrypted, key_manager, chunk_size=4096)
+    encrypted.seek(0)
+
+    output = io.BytesIO()
+    AESGCMEncryptionService().decrypt_stream(encrypted, output, key_manager)
+
+    assert output.getvalue() == content
+
+def test_header_is_bound_and_suites_use_separate_keys():
+    key_manager = FakeKeyManager()
+    aes = AESGCMEncryptionService()
+    encrypted = aes.encrypt(b"secret", key_manager)
+
+    # шифр не вскрывается самим ключом данных
+    with pytest.raises(Exception):
+        AESGCM(key_manager.key).decrypt(encrypted[4:16], encrypted[16:], None)
+
+    # подмена версии ключа в заголовке обнаруживается тегом
+    forged = encrypted[:3] + b"\x02" + encrypted[4:]
+    key_manager.active_key_version = 2
+
+    with pytest.raises(VaultEncryptionError):
+        aes.decrypt(forged, key_manager)
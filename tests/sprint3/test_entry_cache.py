@@ -0,0 +1,140 @@
+from src.core.key_manager import KeyManager
+from src.core.vault.entry_cache import DecryptedEntryCache
+from src.core.vault.entry_manager import EntryManager
+from tests.sprint3.test_entry_manager import FakeDatabase
+
+
+def decode(payload):
+    return bytes(payload)
+
+
+def create_manager(entry_cache=None):
+    db = FakeDatabase()
+
+    key_manager = KeyManager()
+    key_manager._active_key = b"A" * 32
+    key_manager.store_key()
+
+    manager = EntryManager(
+        db=db,
+        key_manager=key_manager,
+        entry_cache=entry_cache,
+    )
+    return manager, db
+
+
+def test_cache_hit_and_miss_counters():
+    cache = DecryptedEntryCache()
+
+    assert cache.get("id-1", "t1", decode) is None
+
+    cache.put("id-1", "t1", b"payload")
+
+    assert cache.get("id-1", "t1", decode) == b"payload"
+
+    stats = cache.stats()
+
+    assert stats.hits == 1
+    assert stats.misses == 1
+    assert stats.entries == 1
+    assert stats.size_bytes == len(b"payload")
+
+
+def test_cache_misses_on_stale_updated_at():
+    cache = DecryptedEntryCache()
+
+    cache.put("id-1", "t1", b"old")
+
+    assert cache.get("id-1", "t2", decode) is None
+    assert len(cache) == 0
+
+
+def test_cache_evicts_least_recently_used_by_count_and_bytes():
+    cache = DecryptedEntryCache(max_entries=2, max_bytes=10)
+
+    cache.put("a", "t", b"1234")
+    cache.put("b", "t", b"1234")
+    cache.get("a", "t", decode)
+    cache.put("c", "t", b"1234")
+
+    assert cache.get("b", "t", decode) is None
+    assert cache.get("a", "t", decode) == b"1234"
+
+    cache.put("d", "t", b"123456789")
+
+    assert cache.stats().size_bytes <= 10
+    assert cache.stats().evictions >= 2
+
+
+def test_cache_clear_wipes_buffers():
+    cache = DecryptedEntryCache()
+    cache.put("a", "t", b"secret")
+
+    buffer = cache.get("a", "t", lambda payload: payload)
+    cache.clear()
+
+    assert buffer == bytearray(len(b"secret"))
+    assert len(cache) == 0
+
+
+def test_entry_manager_reads_created_entry_from_cache():
+    manager, db = create_manager()
+
+    created = manager.create_entry(
+        {"title": "Cached", "password": "CachedPassword123!"}
+    )
+
+    assert manager.get_entry(created["id"]) == created
+    assert manager.entry_cache.stats().hits >= 2
+
+    db.close()
+
+
+def test_key_manager_lock_clears_entry_cache():
+    manager, db = create_manager()
+
+    manager.create_entry(
+        {"title": "Cached", "password": "CachedPassword123!"}
+    )
+
+    assert len(manager.entry_cache) == 1
+
+    manager.key_manager.lock()
+
+    assert len(manager.entry_cache) == 0
+
+    db.close()
+
+
+def test_expired_key_clears_entry_cache():
+    manager, db = create_manager()
+
+    created = manager.create_entry(
+        {"title": "Cached", "password": "CachedPassword123!"}
+    )
+
+    manager.key_manager._storage._last_access_at -= 3601
+
+    try:
+        manager.get_entry(created["id"])
+        assert False, "Expired key should not serve cached entries"
+    except RuntimeError:
+        pass
+
+    assert len(manager.entry_cache) == 0
+
+    db.close()
+
+
+def test_closed_entry_manager_is_not_kept_by_key_manager():
+    manager, db = create_manager()
+
+    manager.create_entry(
+        {"title": "Cached", "password": "CachedPassword123!"}
+    )
+    manager.close()
+
+    assert len(manager.entry_cache) == 0
+    assert manager._on_key_cleared not in manager.key_manager._storage._clear_listeners
+
+    db.close()
@@ -3,7 +3,11 @@ import sqlite3
 import pytest
 
 from src.core.events import EventBus
-from src.core.vault.entry_manager import EntryManager, EntryManagerError
+from src.core.vault.entry_manager import (
+    EntriesCreated,
+    EntryManager,
+    EntryManagerError,
+)
 from src.database.models import CREATE_TABLES_SQL
 
 
@@ -365,4 +369,266 @@ def test_soft_delete_moves_entry_to_deleted_entries():
     assert deleted_row["deleted_at"] is not None
     assert deleted_row["expires_at"] is not None
 
-    db.close()
\ No newline at end of file
+    db.close()
+def test_create_entries_returns_entries_and_publishes_one_event():
+    manager, db = create_manager()
+
+    events = []
+    manager.event_bus.subscribe(EntriesCreated, events.append)
+
+    entries = manager.create_entries(
+        [
+            {
+                "title": f"Service {i}",
+                "username": f"user{i}",
+                "password": f"Password{i}!",
+                "tags": ["batch"],
+            }
+            for i in range(5)
+        ]
+    )
+
+    assert len(entries) == 5
+    assert len(events) == 1
+    assert events[0].entry_ids == [entry["id"] for entry in entries]
+
+    for entry in entries:
+        assert manager.get_entry(entry["id"]) == entry
+
+    db.close()
+
+
+def test_create_entries_is_all_or_nothing():
+    manager, db = create_manager()
+
+    with pytest.raises(EntryManagerError):
+        manager.create_entries(
+            [
+                {"title": "Valid", "password": "ValidPassword123!"},
+                {"title": "", "password": "NoTitle123!"},
+            ]
+        )
+
+    assert manager.get_all_entries() == []
+
+    db.close()
+
+
+def test_update_entries_success():
+    manager, db = create_manager()
+
+    created = manager.create_entries(
+        [
+            {"title": "First", "password": "FirstPassword123!"},
+            {"title": "Second", "password": "SecondPassword123!"},
+        ]
+    )
+
+    updated = manager.update_entries(
+        [
+            {"id": created[0]["id"], "title": "First updated"},
+            {"id": created[1]["id"], "password": "NewPassword123!"},
+        ]
+    )
+
+    assert updated[0]["title"] == "First updated"
+    assert updated[1]["password"] == "NewPassword123!"
+    assert manager.get_entry(created[0]["id"]) == updated[0]
+    assert manager.get_entry(created[1]["id"]) == updated[1]
+
+    db.close()
+
+
+def test_update_entries_with_missing_id_changes_nothing():
+    manager, db = create_manager()
+
+    created = manager.create_entry(
+        {"title": "Keep me", "password": "KeepPassword123!"}
+    )
+
+    with pytest.raises(EntryManagerError):
+        manager.update_entries(
+            [
+                {"id": created["id"], "title": "Changed"},
+                {"id": "missing-id", "title": "Missing"},
+            ]
+        )
+
+    assert manager.get_entry(created["id"])["title"] == "Keep me"
+
+    db.close()
+
+
+def test_delete_entries_soft_delete():
+    manager, db = create_manager()
+
+    created = manager.create_entries(
+        [
+            {"title": "First", "password": "FirstPassword123!"},
+            {"title": "Second", "password": "SecondPassword123!"},
+        ]
+    )
+
+    deleted = manager.delete_entries(
+        [created[0]["id"], created[1]["id"], "missing-id"]
+    )
+
+    cursor = db.execute("SELECT COUNT(*) FROM deleted_entries;")
+
+    assert deleted == [created[0]["id"], created[1]["id"]]
+    assert manager.get_all_entries() == []
+    assert cursor.fetchone()[0] == 2
+
+    db.close()
+
+
+def test_iter_entries_pages_in_updated_at_order():
+    manager, db = create_manager()
+
+    manager.create_entries(
+        [
+            {"title": f"Entry {i}", "password": f"Password{i}!"}
+            for i in range(7)
+        ]
+    )
+
+    streamed = list(manager.iter_entries(page_size=3))
+    expected = sorted(
+        streamed,
+        key=lambda entry: (entry["updated_at"], entry["id"]),
+        reverse=True,
+    )
+
+    assert len(streamed) == 7
+    assert streamed == expected
+    assert manager.get_all_entries() == streamed
+
+    db.close()
+
+
+def test_iter_entries_resumes_after_position():
+    manager, db = create_manager()
+
+    manager.create_entries(
+        [
+            {"title": f"Entry {i}", "password": f"Password{i}!"}
+            for i in range(5)
+        ]
+    )
+
+    all_entries = list(manager.iter_entries(page_size=2))
+    last_seen = all_entries[1]
+
+    rest = list(
+        manager.iter_entries(
+            page_size=2,
+            after=(last_seen["updated_at"], last_seen["id"]),
+        )
+    )
+
+    assert rest == all_entries[2:]
+
+    db.close()
+
+
+def test_entries_metadata_does_not_contain_secrets():
+    manager, db = create_manager()
+
+    created = manager.create_entry(
+        {
+            "title": "GitHub",
+            "username": "user@example.com",
+            "password": "StrongPassword123!",
+            "url": "https://github.com",
+            "notes": "long private notes",
+            "category": "Work",
+            "tags": ["git"],
+        }
+    )
+
+    metadata = manager.get_entries_metadata()
+
+    assert len(metadata) == 1
+    assert metadata[0]["id"] == created["id"]
+    assert metadata[0]["title"] == "GitHub"
+    assert metadata[0]["username"] == "user@example.com"
+    assert metadata[0]["url"] == "https://github.com"
+    assert metadata[0]["category"] == "Work"
+    assert metadata[0]["tags"] == ["git"]
+    assert "password" not in metadata[0]
+    assert "notes" not in metadata[0]
+
+    db.close()
+
+
+def test_legacy_entry_is_migrated_to_split_format_on_read():
+    manager, db = create_manager()
+
+    entry_id = "legacy-entry"
+    timestamp = "2025-01-01T00:00:00+00:00"
+
+    encrypted_data = manager.encryption_service.encrypt_entry(
+        {
+            "title": "Legacy",
+            "username": "legacy_user",
+            "password": "LegacyPassword123!",
+            "notes": "legacy notes",
+            "created_at": timestamp,
+        },
+        manager.key_manager,
+        associated_data=entry_id.encode("utf-8"),
+    )
+
+    db.execute(
+        """
+        INSERT INTO vault_entries (id, encrypted_data, created_at, updated_at, tags)
+        VALUES (?, ?, ?, ?, ?);
+        """,
+        (entry_id, encrypted_data, timestamp, timestamp, "[]"),
+    )
+
+    metadata = manager.get_entries_metadata()
+
+    row = db.execute(
+        "SELECT encrypted_header, updated_at FROM vault_entries WHERE id = ?;",
+        (entry_id,),
+    ).fetchone()
+
+    assert metadata[0]["title"] == "Legacy"
+    assert row["encrypted_header"] is not None
+    assert row["updated_at"] == timestamp
+
+    manager.entry_cache.clear()
+    loaded = manager.get_entry(entry_id)
+
+    assert loaded["password"] == "LegacyPassword123!"
+    assert loaded["notes"] == "legacy notes"
+
+    db.close()
+
+
+def test_parallel_decrypt_keeps_page_order():
+    db = FakeDatabase()
+    parallel = EntryManager(
+        db=db,
+        key_manager=FakeKeyManager(),
+        decrypt_workers=4,
+        parallel_decrypt_threshold=2,
+    )
+    serial = EntryManager(
+        db=db,
+        key_manager=FakeKeyManager(),
+        decrypt_workers=1,
+    )
+
+    parallel.create_entries(
+        [
+            {"title": f"Entry {i}", "password": f"Password{i}!"}
+            for i in range(30)
+        ]
+    )
+
+    assert list(parallel.iter_entries(page_size=10)) == serial.get_all_entries()
+
+    parallel.close()
+    db.close()
@@ -0,0 +1,235 @@
+import io
+
+import pytest
+
+from src.core.crypto.key_derivation import Argon2Settings, PBKDF2Settings
+from src.core.key_manager import KeyManager
+from src.core.vault.attachment_manager import AttachmentManager
+from src.core.vault.encryption_service import AESGCMEncryptionService, VaultEncryptionError
+from src.core.vault.entry_manager import EntryManager
+from src.core.vault.reencryption import ReencryptionEngine
+
+PASSWORD = "OldPassword123!"
+
+
+def create_key_manager(**kwargs):
+    return KeyManager(
+        argon2_settings=Argon2Settings(time_cost=1, memory_cost=8192, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=1000),
+        **kwargs,
+    )
+
+
+def fill_vault(test_db, key_manager, count=5):
+    key_manager.unlock_with_password(test_db, PASSWORD)
+
+    entry_manager = EntryManager(db=test_db, key_manager=key_manager)
+    entries = entry_manager.create_entries(
+        [{"title": f"Service {i}", "password": f"secret-{i}"} for i in range(count)]
+    )
+
+    attachment = AttachmentManager(db=test_db, key_manager=key_manager, chunk_size=8).add_attachment(
+        entries[0]["id"],
+        io.BytesIO(b"certificate-data-" * 3),
+        "cert.pem",
+    )
+
+    return entries, attachment["id"]
+
+
+def blob_versions(test_db):
+    service = AESGCMEncryptionService()
+    rows = test_db.execute(
+        "SELECT encrypted_header, encrypted_data FROM vault_entries;"
+    ).fetchall()
+
+    return {service.blob_key_version(blob) for row in rows for blob in row}
+
+
+def test_key_usage_is_counted_and_persisted(test_db):
+    key_manager = create_key_manager(data_key_rotation_threshold=10)
+    fill_vault(test_db, key_manager, count=3)
+
+    # 3 записи по две части + имя, кусок, ссылка на кусок вложения
+    usage = key_manager.data_key_usage(test_db)
+    assert usage >= 6
+
+    restarted = create_key_manager(data_key_rotation_threshold=10)
+    restarted.unlock_with_password(test_db, PASSWORD)
+
+    assert restarted.data_key_usage(test_db) == usage
+    assert restarted.needs_data_key_rotation(test_db)
+
+
+def stored_usage(test_db, key_id):
+    row = test_db.execute(
+        "SELECT setting_value FROM settings WHERE setting_key = ?;",
+        ("data_key_usage:" + key_id,),
+    ).fetchone()
+
+    return int(row[0]) if row else 0
+
+
+def test_key_usage_survives_rollback_and_is_flushed_on_lock(test_db):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, PASSWORD)
+    key_id = key_manager.active_key_id
+    entry_manager = EntryManager(db=test_db, key_manager=key_manager)
+
+    with pytest.raises(RuntimeError):
+        with test_db.transaction():
+            entry_manager.create_entry({"title": "Draft", "password": "secret"})
+            raise RuntimeError("abort")
+
+    # запись откатилась, но шифрования ключом уже выполнены
+    assert stored_usage(test_db, key_id) == 0
+    assert key_manager.data_key_usage(test_db) == 2
+
+    key_manager.lock()
+
+    assert stored_usage(test_db, key_id) == 2
+
+
+def test_key_usage_is_written_in_the_same_transaction(test_db, monkeypatch):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, PASSWORD)
+    key_id = key_manager.active_key_id
+    entry_manager = EntryManager(db=test_db, key_manager=key_manager)
+
+    def fail(db):
+        raise AssertionError("usage must not need a separate commit")
+
+    monkeypatch.setattr(key_manager, "flush_key_usage", fail)
+
+    entry_manager.create_entry({"title": "GitHub", "password": "secret"})
+
+    assert stored_usage(test_db, key_id) == 2
+    assert key_manager.data_key_usage(test_db) == 2
+
+
+def test_lazy_rotation_keeps_old_data_readable(test_db):
+    key_manager = create_key_manager()
+    entries, attachment_id = fill_vault(test_db, key_manager)
+    old_key_id = key_manager.active_key_id
+
+    assert key_manager.rotate_data_key_lazily(test_db) == 2
+    assert key_manager.active_key_version == 2
+    assert key_manager.active_key_id != old_key_id
+    assert key_manager.retired_key_versions() == [1]
+
+    entry_manager = EntryManager(db=test_db, key_manager=key_manager)
+    created = entry_manager.create_entry({"title": "New", "password": "fresh"})
+    row = test_db.execute(
+        "SELECT encrypted_data FROM vault_entries WHERE id = ?;",
+        (created["id"],),
+    ).fetchone()
+    assert AESGCMEncryptionService().blob_key_version(row[0]) == 2
+
+    # после повторного входа доступны обе версии
+    restarted = create_key_manager()
+    restarted.unlock_with_password(test_db, PASSWORD)
+
+    assert restarted.active_key_version == 2
+    assert len(EntryManager(db=test_db, key_manager=restarted).get_all_entries()) == 6
+
+    output = io.BytesIO()
+    AttachmentManager(db=test_db, key_manager=restarted).read_attachment(attachment_id, output)
+    assert output.getvalue() == b"certificate-data-" * 3
+
+
+def test_reading_entry_rewrites_it_with_active_key(test_db):
+    key_manager = create_key_manager()
+    entries, _ = fill_vault(test_db, key_manager)
+    key_manager.rotate_data_key_lazily(test_db)
+
+    entry_manager = EntryManager(db=test_db, key_manager=key_manager)
+    assert entry_manager.get_entry(entries[1]["id"])["password"] == "secret-1"
+
+    row = test_db.execute(
+        "SELECT encrypted_header, encrypted_data FROM vault_entries WHERE id = ?;",
+        (entries[1]["id"],),
+    ).fetchone()
+    service = AESGCMEncryptionService()
+    assert [service.blob_key_version(blob) for blob in row] == [2, 2]
+
+    # список переписывает только заголовки
+    list(entry_manager.iter_entries_metadata())
+    assert {
+        service.blob_key_version(header)
+        for (header,) in test_db.execute("SELECT encrypted_header FROM vault_entries;")
+    } == {2}
+    assert blob_versions(test_db) == {1, 2}
+
+
+def test_drain_reencrypts_remaining_data_and_drops_old_versions(test_db):
+    key_manager = create_key_manager()
+    entries, attachment_id = fill_vault(test_db, key_manager)
+    key_manager.rotate_data_key_lazily(test_db)
+    key_manager.rotate_data_key_lazily(test_db)
+
+    engine = ReencryptionEngine(test_db, key_manager)
+    steps = []
+
+    while True:
+        processed = engine.drain_step(batch_size=2)
+        steps.append(processed)
+
+        if not processed:
+            break
+
+    assert steps == [2, 2, 1, 1, 0]
+    assert blob_versions(test_db) == {3}
+    assert key_manager.retired_key_versions() == []
+    assert engine.drain_step() == 0
+
+    restarted = create_key_manager()
+    restarted.unlock_with_password(test_db, PASSWORD)
+
+    assert restarted.retired_key_versions() == []
+    assert sorted(
+        entry["password"]
+        for entry in EntryManager(db=test_db, key_manager=restarted).get_all_entries()
+    ) == sorted(entry["password"] for entry in entries)
+
+    output = io.BytesIO()
+    AttachmentManager(db=test_db, key_manager=restarted).read_attachment(attachment_id, output)
+    assert output.getvalue() == b"certificate-data-" * 3
+
+    # прежняя версия удалена, её данные больше не читаются
+    with pytest.raises(ValueError):
+        restarted.borrow_key(2)
+
+
+def test_slots_and_eager_rotation_work_after_lazy_rotation(test_db):
+    key_manager = create_key_manager()
+    fill_vault(test_db, key_manager)
+    slot, recovery_key = key_manager.add_recovery_key(test_db)
+    key_manager.rotate_data_key_lazily(test_db)
+    EntryManager(db=test_db, key_manager=key_manager).create_entry(
+        {"title": "New", "password": "fresh"}
+    )
+
+    restarted = create_key_manager()
+    restarted.unlock_with_slot(test_db, slot.slot_id, recovery_key)
+    assert restarted.active_key_version == 2
+    assert len(EntryManager(db=test_db, key_manager=restarted).get_all_entries()) == 6
+
+    restarted.unlock_with_password(test_db, PASSWORD)
+    ReencryptionEngine(test_db, restarted).rotate_data_key(PASSWORD, drop_key_slots=True)
+
+    assert restarted.active_key_version == 3
+    assert restarted.retired_key_versions() == []
+    assert blob_versions(test_db) == {3}
+    assert len(EntryManager(db=test_db, key_manager=restarted).get_all_entries()) == 6
+
+
+def test_unknown_key_version_is_rejected(test_db):
+    key_manager = create_key_manager()
+    fill_vault(test_db, key_manager)
+    service = AESGCMEncryptionService()
+
+    blob = service.encrypt(b"data", key_manager)
+    forged = blob[:2] + b"\x00\x09" + blob[4:]
+
+    with pytest.raises(VaultEncryptionError, match="version 9"):
+        service.decrypt(forged, key_manager)
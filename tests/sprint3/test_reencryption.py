@@ -0,0 +1,143 @@
+import io
+
+import pytest
+
+from src.core.crypto.key_derivation import Argon2Settings, PBKDF2Settings
+from src.core.events import EventBus
+from src.core.key_manager import KeyManager
+from src.core.vault.attachment_manager import AttachmentManager
+from src.core.vault.encryption_service import AESGCMEncryptionService
+from src.core.vault.entry_manager import EntryManager
+from src.core.vault.reencryption import (
+    ReencryptionCompleted,
+    ReencryptionEngine,
+    ReencryptionProgress,
+)
+
+PASSWORD = "OldPassword123!"
+
+
+def create_key_manager():
+    return KeyManager(
+        argon2_settings=Argon2Settings(time_cost=1, memory_cost=8192, parallelism=1),
+        pbkdf2_settings=PBKDF2Settings(iterations=1000),
+    )
+
+
+def fill_vault(test_db, key_manager, count=7):
+    key_manager.unlock_with_password(test_db, PASSWORD)
+
+    entry_manager = EntryManager(db=test_db, key_manager=key_manager)
+    entries = entry_manager.create_entries(
+        [{"title": f"Service {i}", "password": f"secret-{i}"} for i in range(count)]
+    )
+    entry_manager.delete_entry(entries[0]["id"])
+
+    attachment_manager = AttachmentManager(db=test_db, key_manager=key_manager, chunk_size=8)
+    attachment = attachment_manager.add_attachment(
+        entries[1]["id"],
+        io.BytesIO(b"certificate-data-" * 3),
+        "cert.pem",
+    )
+
+    return entries, attachment["id"]
+
+
+def read_vault(test_db, key_manager, attachment_id):
+    entry_manager = EntryManager(db=test_db, key_manager=key_manager)
+    passwords = sorted(entry["password"] for entry in entry_manager.get_all_entries())
+
+    output = io.BytesIO()
+    AttachmentManager(db=test_db, key_manager=key_manager).read_attachment(
+        attachment_id,
+        output,
+    )
+
+    return passwords, output.getvalue()
+
+
+def test_rotate_data_key_reencrypts_everything(test_db):
+    key_manager = create_key_manager()
+    _, attachment_id = fill_vault(test_db, key_manager)
+    old_key = key_manager.get_active_key()
+    expected = read_vault(test_db, key_manager, attachment_id)
+
+    event_bus = EventBus()
+    events = []
+    event_bus.subscribe(ReencryptionProgress, events.append)
+    event_bus.subscribe(ReencryptionCompleted, events.append)
+
+    engine = ReencryptionEngine(test_db, key_manager, event_bus=event_bus, batch_size=2)
+    processed = engine.rotate_data_key(PASSWORD)
+
+    assert processed == 8
+    assert key_manager.get_active_key() != old_key
+    assert not engine.has_pending()
+    assert isinstance(events[-1], ReencryptionCompleted)
+    assert any(
+        isinstance(event, ReencryptionProgress) and event.table == "vault_entries"
+        for event in events
+    )
+
+    key_manager.lock()
+    key_manager.unlock_with_password(test_db, PASSWORD)
+
+    assert read_vault(test_db, key_manager, attachment_id) == expected
+    assert test_db.execute(
+        "SELECT COUNT(*) FROM settings WHERE setting_key = ?;",
+        (ReencryptionEngine.CHECKPOINT_SETTING,),
+    ).fetchone()[0] == 0
+
+
+def test_interrupted_rotation_resumes_from_checkpoint(test_db):
+    key_manager = create_key_manager()
+    _, attachment_id = fill_vault(test_db, key_manager)
+    expected = read_vault(test_db, key_manager, attachment_id)
+
+    class CrashingService(AESGCMEncryptionService):
+        calls = 0
+
+        def encrypt_many(self, *args, **kwargs):
+            CrashingService.calls += 1
+
+            if CrashingService.calls == 2:
+                raise RuntimeError("simulated crash")
+
+            return super().encrypt_many(*args, **kwargs)
+
+    engine = ReencryptionEngine(
+        test_db,
+        key_manager,
+        target_encryption_service=CrashingService(),
+        batch_size=2,
+    )
+
+    with pytest.raises(RuntimeError):
+        engine.rotate_data_key(PASSWORD, new_password="NewPassword456!")
+
+    # до завершения ротации действует старый пароль
+    restarted = create_key_manager()
+    restarted.unlock_with_password(test_db, PASSWORD)
+
+    resumed = ReencryptionEngine(test_db, restarted, batch_size=2)
+
+    assert resumed.has_pending()
+    assert resumed.resume() == 6
+
+    restarted.lock()
+
+    with pytest.raises(ValueError):
+        restarted.unlock_with_password(test_db, PASSWORD)
+
+    restarted.unlock_with_password(test_db, "NewPassword456!")
+
+    assert read_vault(test_db, restarted, attachment_id) == expected
+
+
+def test_resume_without_pending_rotation_does_nothing(test_db):
+    key_manager = create_key_manager()
+    key_manager.unlock_with_password(test_db, PASSWORD)
+
+    engine = ReencryptionEngine(test_db, key_manager)
+
+    assert engine.resume() == 0